@@ -0,0 +1,305 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+
+POOL_SIZE = 8 # Maximum connections open at the same time
+POOL_TIMEOUT = 30.0 # Maximum seconds to wait for a free connection
+ITERSIZE = 2000 # Rows fetched at a time by server-side cursors
+
+
+class PoolTimeout(Exception):
+    ''' Raised when no connection is freed in time. '''
+
+
+class ConnectionPool(object):
+    '''
+    A thread-safe pool of PostgreSQL connections. Threads take a connection
+    for as long as they need it, and wait for one to be given back when all
+    of them are in use:
+
+        with pool.connection() as db:
+            with db.transaction():
+                db.query(...)
+
+    Keeps metrics of the time spent waiting, and of connections reused.
+    '''
+
+    def __init__(self, size=POOL_SIZE, timeout=POOL_TIMEOUT, **connect_args):
+        '''
+        Requires:
+            - self: an object of the ConnectionPool class;
+            - size (int - optional): maximum number of connections;
+            - timeout (float - optional): maximum seconds to wait for a free
+            connection;
+            - connect_args: arguments of psycopg2.connect (dbname, user,
+            password, host, port...).
+        '''
+        self.size = size
+        self.timeout = timeout
+        self._connect_args = connect_args
+        self._idle = []
+        self._open = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._stats = {
+            'acquired': 0, 'created': 0, 'reused': 0, 'discarded': 0,
+            'waits': 0, 'wait_seconds': 0.0, 'max_wait_seconds': 0.0,
+        }
+
+    def acquire(self):
+        '''
+        Takes a connection out of the pool, opening a new one if there are
+        less than `size`, or else waiting for one to be released.
+
+        Requires: self: an object of the ConnectionPool class.
+        Ensures:
+            Returns a psycopg2 connection, not in a transaction.
+            Raises PoolTimeout after waiting `timeout` seconds, or the
+            psycopg2 error if the database can't be reached.
+        '''
+        start = time.monotonic()
+        waited = False
+        with self._condition:
+            while not self._idle and self._open >= self.size:
+                if self._closed:
+                    raise PoolTimeout('The connection pool is closed.')
+                waited = True
+                remaining = self.timeout - (time.monotonic() - start)
+                if remaining <= 0 or not self._condition.wait(remaining):
+                    raise PoolTimeout(
+                        'No database connection free after %.1fs.'
+                        % self.timeout
+                    )
+            if self._closed:
+                raise PoolTimeout('The connection pool is closed.')
+            connection = self._idle.pop() if self._idle else None
+            if connection is None:
+                self._open += 1
+            self._record(time.monotonic() - start, waited, connection)
+
+        if connection is None:
+            try:
+                connection = psycopg2.connect(**self._connect_args)
+            except Exception:
+                self._forget()
+                raise
+        return connection
+
+    def release(self, connection):
+        '''
+        Gives a connection back to the pool, after cancelling any transaction
+        left open. Broken connections are closed instead.
+
+        Requires:
+            - self: an object of the ConnectionPool class;
+            - connection: a connection taken with acquire.
+        '''
+        try:
+            if not connection.closed:
+                status = connection.get_transaction_status()
+                if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    connection.rollback()
+        except psycopg2.Error:
+            logging.exception('Discarding a broken database connection.')
+        if connection.closed or self._closed:
+            connection.close()
+            self._forget(discarded=True)
+            return
+        with self._condition:
+            self._idle.append(connection)
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self):
+        ''' Context manager lending a Database (a pooled connection). '''
+        connection = self.acquire()
+        try:
+            yield Database(connection)
+        finally:
+            self.release(connection)
+
+    def close(self):
+        '''
+        Closes the idle connections; connections in use are closed when
+        released.
+        '''
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._condition.notify_all()
+        for connection in idle:
+            connection.close()
+        logging.info('Database pool closed (%s).' % self.format_stats())
+
+    def stats(self):
+        '''
+        Returns the pool metrics (dict): connections acquired, created, reused
+        and discarded, acquisitions that had to wait, total and maximum
+        seconds waited, and connections open and idle right now.
+        '''
+        with self._condition:
+            stats = dict(self._stats)
+            stats['open'] = self._open
+            stats['idle'] = len(self._idle)
+        return stats
+
+    def format_stats(self):
+        stats = self.stats()
+        return (
+            '%(acquired)d acquired, %(created)d created, %(reused)d reused, '
+            '%(waits)d waits (%(wait_seconds).3fs in total, '
+            '%(max_wait_seconds).3fs at most)' % stats
+        )
+
+    def _record(self, seconds, waited, connection):
+        # Called with the condition held
+        stats = self._stats
+        stats['acquired'] += 1
+        stats['created' if connection is None else 'reused'] += 1
+        if waited:
+            stats['waits'] += 1
+            stats['wait_seconds'] += seconds
+            stats['max_wait_seconds'] = max(stats['max_wait_seconds'], seconds)
+
+    def _forget(self, discarded=False):
+        # A connection slot is free again
+        with self._condition:
+            self._open -= 1
+            if discarded:
+                self._stats['discarded'] += 1
+            self._condition.notify()
+
+
+class Database(object):
+    '''
+    A PostgreSQL connection lent by a ConnectionPool, to be used by a single
+    thread at a time. Changes are applied by transaction(), or by commit().
+    '''
+
+    def __init__(self, connection):
+        '''
+        Requires:
+            - self: an object of the Database class;
+            - connection: a psycopg2 connection.
+        '''
+        self._conn = connection
+        self._cursor = connection.cursor(
+            cursor_factory = psycopg2.extras.DictCursor
+        )
+        self._depth = 0
+        self._streams = 0
+
+    @contextmanager
+    def transaction(self):
+        '''
+        Context manager running its block in a transaction: changes are
+        committed at the end, or rolled back if an exception is raised.
+        Nested blocks are part of the outermost transaction.
+        '''
+        self._depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._depth -= 1
+            if self._depth == 0:
+                self._conn.rollback()
+            raise
+        else:
+            self._depth -= 1
+            if self._depth == 0:
+                self._conn.commit()
+
+    def query(self, query, params):
+        '''
+        Sends a query to the database and executes it.
+
+        Requires:
+            - self: an object of the Database class;
+            - query (str): SQL query to be executed;
+            - params (tuple): parameters specific to the parameterized query
+            provided.
+        Ensures:
+            Returns a database response, and saves results to the cursor.
+        '''
+        return self._cursor.execute(query, params)
+
+    def fetch_one(self):
+        '''
+        Returns the next result of the previous query, or None.
+
+        Requires:
+            - self: an object of the Database class, after a query has been
+            executed.
+        '''
+        return self._cursor.fetchone()
+
+    def fetch_all(self):
+        '''
+        Returns a list with the remaining results of the previous query.
+
+        Requires:
+            - self: an object of the Database class, after a query has been
+            executed.
+        '''
+        return self._cursor.fetchall()
+
+    def query_values(self, query, rows, template=None):
+        '''
+        Sends a query with many rows of values to the database in a single
+        statement, and executes it.
+
+        Requires:
+            - self: an object of the Database class;
+            - query (str): SQL query to be executed, with a single %s
+            placeholder for the values;
+            - rows (list): tuples with the values of each row;
+            - template (str - optional): SQL template for one row.
+        Ensures:
+            All rows are sent to the database, in one statement: the results
+            of its RETURNING clause, if any, can be read with fetch_all.
+        '''
+        psycopg2.extras.execute_values(
+            self._cursor, query, rows, template=template, page_size=len(rows)
+        )
+
+    def stream(self, query, params, itersize=ITERSIZE):
+        '''
+        Reads the results of a query with a named (server-side) cursor, so
+        that only `itersize` rows are held in memory at a time. The rows are
+        read in a transaction of their own, unless already in one.
+
+        Requires:
+            - self: an object of the Database class;
+            - query (str): SQL query to be executed;
+            - params (tuple): parameters of the query;
+            - itersize (int - optional): rows fetched from the server at a
+            time.
+        Ensures:
+            Yields the rows of the results.
+        '''
+        self._streams += 1
+        with self.transaction():
+            cursor = self._conn.cursor(
+                'stream_%d' % self._streams,
+                cursor_factory = psycopg2.extras.DictCursor
+            )
+            cursor.itersize = itersize
+            try:
+                cursor.execute(query, params)
+                yield from cursor
+            finally:
+                cursor.close()
+
+    def commit(self):
+        ''' Applies the changes of the current transaction. '''
+        self._conn.commit()
+
+    def rollback(self):
+        ''' Discards the changes of the current transaction, after an error. '''
+        self._conn.rollback()
@@ -0,0 +1,92 @@
+'''
+Gunicorn settings. The server interface is chosen with SERVER_INTERFACE, along
+with the application module (see the Procfile):
+    - wsgi (default): mobilestore.wsgi, on sync workers - each process serves
+    one request at a time;
+    - asgi: mobilestore.asgi, on uvicorn workers - each process keeps many
+    connections open on an event loop, and runs views in ASGI_THREADS threads.
+The number of processes is WEB_CONCURRENCY (set by Heroku from the dyno's
+memory), or else made from the number of cores: 2 per core plus 1 for sync
+workers, which wait on the database, and 1 per core for uvicorn workers.
+
+The application is loaded once, before the workers are forked (PRELOAD_APP,
+on by default), so that they start at once, and share its memory until they
+write to it. Workers are replaced after MAX_REQUESTS requests (plus up to 10%,
+so that they are not all replaced at once), which bounds any memory growth.
+Each process writes its metrics (see mobilestore.metrics) to files in
+prometheus_multiproc_dir, a temporary directory unless set, emptied on start.
+'''
+import gc
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+SERVER_INTERFACE = os.environ.get('SERVER_INTERFACE', 'wsgi')
+WORKER_CLASSES = {
+    'wsgi': 'sync',
+    'asgi': 'uvicorn.workers.UvicornWorker',
+}
+
+if SERVER_INTERFACE not in WORKER_CLASSES:
+    raise RuntimeError('SERVER_INTERFACE must be one of: %s.' % (
+        ', '.join(sorted(WORKER_CLASSES))
+    ))
+worker_class = WORKER_CLASSES[SERVER_INTERFACE]
+
+CORES = multiprocessing.cpu_count()
+workers = int(os.environ.get('WEB_CONCURRENCY') or (
+    CORES * 2 + 1 if SERVER_INTERFACE == 'wsgi' else CORES
+))
+
+preload_app = os.environ.get('PRELOAD_APP', 'true').lower() != 'false'
+max_requests = int(os.environ.get('MAX_REQUESTS') or 1000)
+max_requests_jitter = max_requests // 10
+# Seconds a connection waits for its next request (uvicorn workers only: sync
+# workers close it after each response)
+keepalive = int(os.environ.get('KEEPALIVE') or 5)
+# As the Heroku router, which gives up on requests after 30s
+timeout = 30
+# Workers' heartbeat files, in memory rather than on a disk that may block
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+# Read by prometheus_client when imported, so it must be set before the
+# application is loaded
+os.environ.setdefault(
+    'prometheus_multiproc_dir',
+    os.path.join(tempfile.gettempdir(), 'mobilestore-metrics')
+)
+# Imported here rather than in child_exit, a signal handler that may run again
+# while it imports
+from prometheus_client import multiprocess  # noqa: E402
+
+
+def on_starting(server):
+    # Metrics of a previous run would be added to the new ones
+    path = os.environ['prometheus_multiproc_dir']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+
+
+def pre_fork(server, worker):
+    if server.cfg.preload_app:
+        # Database connections must not be shared by processes
+        from django.db import connections
+        connections.close_all()
+        # Copy-on-write friendly forking: the objects of the loaded
+        # application are left out of garbage collection, so that the
+        # workers' collections never write to their shared pages
+        gc.freeze()
+
+
+def worker_exit(server, worker):
+    # Persistent database connections (CONN_MAX_AGE) are closed, rather than
+    # dropped with the process
+    from django.db import connections
+    connections.close_all()
+
+
+def child_exit(server, worker):
+    # Drops its live gauges - its counters and histograms still count
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,324 @@
+import logging
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import namedtuple
+
+TIMEOUT = 30 # Seconds
+TTL = 24 * 3600 # Seconds a response is reused for, before asking again
+MAX_SIZE = 256 * 1024 * 1024 # Bytes of responses kept
+
+# A response: final url (after redirects), status (200, or 304 Not Modified
+# for conditional requests), content, validators, and whether it was cached
+Response = namedtuple(
+    'Response', ['url', 'status', 'body', 'etag', 'last_modified', 'cached']
+)
+
+
+class CacheMiss(Exception):
+    ''' Raised in offline mode, for responses that were never cached. '''
+
+
+def fetch(url, headers=None, timeout=TIMEOUT):
+    '''
+    Sends a GET request.
+
+    Requires:
+        - url (str);
+        - headers (dict - optional): request headers, including validators
+        (If-None-Match, If-Modified-Since) for a conditional request;
+        - timeout (float - optional): seconds to wait for the response.
+    Ensures:
+        Returns a Response: with status 304 and no content if the server
+        answers that it did not change. Raises urllib's errors otherwise.
+    '''
+    headers = headers or {}
+    request = urllib.request.Request(url, headers=headers)
+    try:
+        response = urllib.request.urlopen(request, timeout=timeout)
+    except urllib.error.HTTPError as error:
+        if error.code != 304:
+            raise
+        error.close()
+        return Response(
+            url, 304, b'',
+            error.headers.get('ETag') or headers.get('If-None-Match'),
+            error.headers.get('Last-Modified')
+                or headers.get('If-Modified-Since'),
+            False
+        )
+    with response:
+        return Response(
+            response.geturl(), 200, response.read(),
+            response.headers.get('ETag'), response.headers.get('Last-Modified'),
+            False
+        )
+
+
+class HttpCache(object):
+    '''
+    A persistent cache of HTTP responses by url, in a SQLite file, shared by
+    threads (and processes):
+
+        cache = HttpCache('http_cache.sqlite3')
+        page = cache.fetch(url).body
+
+    Responses are reused for `ttl` seconds; after that they are revalidated
+    with a conditional request, when the server gave validators (ETag,
+    Last-Modified). The least recently used responses are evicted once they
+    take more than `max_size` bytes. In offline mode, every cached response
+    is replayed however old, and the network is never used.
+    Links that only a browser can follow (see add_link) are kept too, for
+    `ttl` seconds, or forever in offline mode.
+    '''
+
+    def __init__(self, path, ttl=TTL, max_size=MAX_SIZE, offline=False):
+        '''
+        Requires:
+            - self: an object of the HttpCache class;
+            - path (str): the SQLite file, created if missing;
+            - ttl (float - optional): seconds responses are fresh for;
+            - max_size (int - optional): maximum bytes of responses kept;
+            - offline (bool - optional): only replay cached responses.
+        '''
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.offline = offline
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0, 'misses': 0, 'revalidated': 0, 'stored': 0,
+            'evicted': 0, 'bytes_fetched': 0,
+        }
+        # Autocommit: each statement is its own transaction
+        self._connection = sqlite3.connect(
+            path, timeout=TIMEOUT, isolation_level=None,
+            check_same_thread=False
+        )
+        with self._lock:
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute(
+                '''CREATE TABLE IF NOT EXISTS responses (
+                    url TEXT PRIMARY KEY,
+                    final_url TEXT NOT NULL,
+                    body BLOB NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    size INTEGER NOT NULL,
+                    validated REAL NOT NULL,
+                    used REAL NOT NULL
+                )'''
+            )
+            self._connection.execute(
+                'CREATE INDEX IF NOT EXISTS responses_used ON responses (used)'
+            )
+            self._connection.execute(
+                '''CREATE TABLE IF NOT EXISTS links (
+                    url TEXT PRIMARY KEY,
+                    target TEXT NOT NULL,
+                    validated REAL NOT NULL
+                )'''
+            )
+
+    def fetch(self, url, headers=None, timeout=TIMEOUT, ttl=None):
+        '''
+        Returns the response to a GET request, from the cache when fresh.
+
+        Requires:
+            - self: an object of the HttpCache class;
+            - url (str);
+            - headers (dict - optional): request headers, including validators
+            (If-None-Match, If-Modified-Since) for a conditional request;
+            - timeout (float - optional): seconds to wait for the server;
+            - ttl (float - optional): seconds a cached response is fresh for,
+            instead of the cache's (0 revalidates it every time).
+        Ensures:
+            Returns a Response - with status 304 and no content if the
+            validators given match it. Raises CacheMiss in offline mode when
+            the url was never cached, or urllib's errors (not cached).
+        '''
+        headers = dict(headers or {})
+        etag = headers.pop('If-None-Match', None)
+        last_modified = headers.pop('If-Modified-Since', None)
+        response = self._fetch(
+            url, headers, timeout, self.ttl if ttl is None else ttl,
+            etag, last_modified
+        )
+        if response.status == 200 and (
+                response.etag == etag if etag
+                else last_modified and response.last_modified == last_modified):
+            return response._replace(status=304, body=b'')
+        return response
+
+    def is_fresh(self, url, ttl=None):
+        '''
+        Returns whether fetching a url would be answered by the cache alone
+        (bool).
+        '''
+        entry = self._lookup(url)
+        return entry is not None and (
+            self.offline or self._fresh(entry, self.ttl if ttl is None else ttl)
+        )
+
+    def add_link(self, url, target):
+        '''
+        Records where a url leads, when only a browser can tell - such as a
+        search result rendered by JavaScript.
+
+        Requires:
+            - self: an object of the HttpCache class;
+            - url (str): the page the link was followed from;
+            - target (str): the url of the page it led to.
+        Ensures: get_link returns the target for the url.
+        '''
+        with self._lock:
+            self._connection.execute(
+                '''INSERT OR REPLACE INTO links (url, target, validated)
+                VALUES (?, ?, ?)''', (url, target, time.time())
+            )
+
+    def get_link(self, url):
+        '''
+        Returns where a url was recorded to lead (str - see add_link), or
+        None if it never was, or not within ttl seconds (unless offline).
+        '''
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT target, validated FROM links WHERE url = ?', (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        target, validated = row
+        if not self.offline and time.time() - validated >= self.ttl:
+            return None
+        return target
+
+    def _fetch(self, url, headers, timeout, ttl, etag, last_modified):
+        entry = self._lookup(url)
+        if entry is not None and (self.offline or self._fresh(entry, ttl)):
+            self._count('hits')
+            self._update(url, used=True)
+            return self._response(entry)
+        if self.offline:
+            self._count('misses')
+            raise CacheMiss('Not in the HTTP cache (offline): %s' % url)
+
+        # Revalidate the cached response, or pass the caller's validators on
+        if entry is not None:
+            etag, last_modified = entry['etag'], entry['last_modified']
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        response = fetch(url, headers, timeout)
+        if response.status == 304 and entry is not None:
+            self._count('revalidated')
+            self._update(url, used=True, validated=True)
+            return self._response(entry)
+        self._count('misses')
+        self._count('bytes_fetched', len(response.body))
+        if response.status == 200:
+            self._store(url, response)
+        return response
+
+    def _fresh(self, entry, ttl):
+        return time.time() - entry['validated'] < ttl
+
+    def _response(self, entry):
+        return Response(
+            entry['final_url'], 200, entry['body'], entry['etag'],
+            entry['last_modified'], True
+        )
+
+    def _lookup(self, url):
+        with self._lock:
+            row = self._connection.execute(
+                '''SELECT final_url, body, etag, last_modified, validated
+                FROM responses WHERE url = ?''', (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(
+            ['final_url', 'body', 'etag', 'last_modified', 'validated'], row
+        ))
+
+    def _update(self, url, used=False, validated=False):
+        now = time.time()
+        with self._lock:
+            if validated:
+                self._connection.execute(
+                    'UPDATE responses SET used = ?, validated = ? WHERE url = ?',
+                    (now, now, url)
+                )
+            elif used:
+                self._connection.execute(
+                    'UPDATE responses SET used = ? WHERE url = ?', (now, url)
+                )
+
+    def _store(self, url, response):
+        size = len(response.body)
+        if size > self.max_size:
+            return
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                '''INSERT OR REPLACE INTO responses
+                (url, final_url, body, etag, last_modified, size, validated,
+                used) VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                (url, response.url, response.body, response.etag,
+                response.last_modified, size, now, now)
+            )
+            self._stats['stored'] += 1
+            self._evict()
+
+    def _evict(self):
+        # Called with the lock held: least recently used first
+        total = self._connection.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM responses'
+        ).fetchone()[0]
+        if total <= self.max_size:
+            return
+        evicted = []
+        for url, size in self._connection.execute(
+                'SELECT url, size FROM responses ORDER BY used'):
+            if total <= self.max_size:
+                break
+            evicted.append((url,))
+            total -= size
+        self._connection.executemany(
+            'DELETE FROM responses WHERE url = ?', evicted
+        )
+        self._stats['evicted'] += len(evicted)
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self._stats[name] += value
+
+    def stats(self):
+        '''
+        Returns the cache metrics (dict): responses served from the cache
+        (hits, and revalidated with a 304), fetched (misses), stored and
+        evicted, bytes fetched, and responses and bytes cached right now.
+        '''
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'], stats['bytes'] = self._connection.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses'
+            ).fetchone()
+        return stats
+
+    def format_stats(self):
+        return (
+            '%(hits)d hits, %(revalidated)d revalidated, %(misses)d misses '
+            '(%(bytes_fetched)d bytes fetched), %(evicted)d evicted, '
+            '%(entries)d responses cached (%(bytes)d bytes)' % self.stats()
+        )
+
+    def close(self):
+        ''' Closes the SQLite file, and logs the cache metrics. '''
+        message = 'HTTP cache closed (%s).' % self.format_stats()
+        with self._lock:
+            self._connection.close()
+        logging.info(message)
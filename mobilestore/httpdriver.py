@@ -0,0 +1,332 @@
+import re
+import logging
+
+import lxml.html
+from lxml import etree
+from selenium.common.exceptions import NoSuchElementException
+
+from httpcache import fetch
+
+USER_AGENT = (
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 '
+    '(KHTML, like Gecko) Chrome/73.0.3683.86 Safari/537.36'
+)
+TIMEOUT = 30 # Seconds
+
+# Elements rendered on their own line, as far as element.text is concerned
+BLOCK_TAGS = {
+    'address', 'article', 'aside', 'blockquote', 'dd', 'div', 'dl', 'dt',
+    'fieldset', 'figcaption', 'figure', 'footer', 'form', 'h1', 'h2', 'h3',
+    'h4', 'h5', 'h6', 'header', 'hr', 'li', 'main', 'nav', 'ol', 'p', 'pre',
+    'section', 'table', 'tbody', 'td', 'tfoot', 'th', 'thead', 'tr', 'ul',
+}
+HIDDEN_TAGS = {'head', 'script', 'style', 'noscript', 'template'}
+
+
+def element_text(element):
+    '''
+    Extracts the text of an html element, the way a browser renders it:
+    whitespace collapsed into single spaces, and line breaks only between
+    blocks and at <br> tags.
+
+    Requires: element (lxml.html.HtmlElement).
+    Ensures: Returns the text (str) of the element, trimmed.
+    '''
+    parts = []
+
+    def walk(node):
+        if not isinstance(node.tag, str) or node.tag in HIDDEN_TAGS:
+            return
+        if node.tag == 'br':
+            parts.append('\n')
+            return
+        block = node.tag in BLOCK_TAGS
+        if block:
+            parts.append('\n')
+        if node.text:
+            parts.append(re.sub(r'\s+', ' ', node.text))
+        for child in node:
+            walk(child)
+            if child.tail:
+                parts.append(re.sub(r'\s+', ' ', child.tail))
+        if block:
+            parts.append('\n')
+
+    walk(element)
+    text = re.sub(r' *\n[ \n]*', '\n', ''.join(parts))
+    return re.sub(r' {2,}', ' ', text).strip()
+
+
+class Finder(object):
+    ''' Selenium's find_element(s)_by_* methods, over an lxml tree. '''
+
+    def _root(self):
+        raise NotImplementedError()
+
+    def _find_all(self, method, value):
+        root = self._root()
+        if method == 'class_name':
+            return root.find_class(value)
+        if method == 'tag_name':
+            return root.iterdescendants(value)
+        if method == 'id':
+            return root.xpath('.//*[@id=$value]', value=value)
+        if method == 'partial_link_text':
+            return [
+                a for a in root.iterdescendants('a')
+                if value in element_text(a)
+            ]
+        raise ValueError('Unsupported locator: %s' % method)
+
+    def _element(self, method, value, index, element):
+        return HttpElement(
+            self._driver(), element, self._locator() + [(method, value, index)]
+        )
+
+    def _find_element(self, method, value):
+        for element in self._find_all(method, value):
+            return self._element(method, value, None, element)
+        raise NoSuchElementException(
+            'Unable to locate element: %s=%s' % (method, value)
+        )
+
+    def _find_elements(self, method, value):
+        return [
+            self._element(method, value, index, element)
+            for index, element in enumerate(self._find_all(method, value))
+        ]
+
+    def find_element_by_class_name(self, name):
+        return self._find_element('class_name', name)
+
+    def find_elements_by_class_name(self, name):
+        return self._find_elements('class_name', name)
+
+    def find_element_by_tag_name(self, name):
+        return self._find_element('tag_name', name)
+
+    def find_elements_by_tag_name(self, name):
+        return self._find_elements('tag_name', name)
+
+    def find_element_by_id(self, id_):
+        return self._find_element('id', id_)
+
+    def find_element_by_partial_link_text(self, link_text):
+        return self._find_element('partial_link_text', link_text)
+
+
+class HttpElement(Finder):
+    '''
+    An element of a page loaded by an HttpDriver, with the same interface as
+    a selenium WebElement (for the methods used by the worker).
+    '''
+
+    def __init__(self, driver, element, locator):
+        self._http_driver = driver
+        self._html = element
+        self._path = locator
+
+    def _root(self):
+        return self._html
+
+    def _driver(self):
+        return self._http_driver
+
+    def _locator(self):
+        return self._path
+
+    @property
+    def tag_name(self):
+        return self._html.tag
+
+    @property
+    def text(self):
+        return element_text(self._html)
+
+    def get_attribute(self, name):
+        return self._html.get(name)
+
+    def click(self):
+        '''
+        Follows links. Other clicks need JavaScript, so they are only recorded,
+        to be replayed if the page is handed over to a browser.
+        '''
+        href = self._html.get('href') if self._html.tag == 'a' else None
+        if href and not href.startswith('javascript:'):
+            self._http_driver.get(href)
+        else:
+            self._http_driver._clicks.append(self._path)
+
+
+class HttpDriver(Finder):
+    '''
+    A stand-in for a selenium driver that loads pages over plain HTTP and
+    parses them with lxml, instead of running a browser - for the methods
+    used by the worker.
+    When an element is missing from a page (as it may only be added by
+    JavaScript), the page is handed over to a real browser: it is loaded
+    again in the fallback driver, replaying the clicks made so far, and all
+    calls go to that driver until the next page is loaded.
+    Pages can be loaded through an HttpCache, so that known pages are not
+    requested again (but pages handed over to a browser always are). Links
+    followed in the browser can be recorded in it (see save_link), so that
+    their pages are loaded over HTTP next time.
+    '''
+
+    def __init__(self, fallback=None, timeout=TIMEOUT, cache=None, ttl=None):
+        '''
+        Requires:
+            - self: an object of the HttpDriver class;
+            - fallback (callable - optional): starts a selenium driver, only
+            when first needed;
+            - timeout (float - optional): seconds to wait for each page;
+            - cache (HttpCache - optional): cache pages are loaded through;
+            - ttl (float - optional): seconds cached pages are fresh for,
+            instead of the cache's.
+        '''
+        self.timeout = timeout
+        self.cache = cache
+        self.ttl = ttl
+        self._url = None
+        # Validators of the last page loaded, and whether it was unchanged
+        self.etag = None
+        self.last_modified = None
+        self.not_modified = False
+        self._make_fallback = fallback
+        self._fallback = None
+        self._use_fallback = False
+        self._document = None
+        self._clicks = []
+
+    def _root(self):
+        return self._document
+
+    def _driver(self):
+        return self
+
+    def _locator(self):
+        return []
+
+    def get(self, url, etag=None, last_modified=None):
+        '''
+        Loads a page - unless it is known and did not change, when the
+        validators of a previous load are given (conditional request).
+
+        Requires:
+            - url (str);
+            - etag (str - optional): ETag header of a previous load;
+            - last_modified (str - optional): Last-Modified header of a
+            previous load.
+        Ensures:
+            The page is parsed, and its links made absolute. Its validators
+            are saved (etag and last_modified). If the server (or the cache)
+            answers that it did not change, not_modified is set and no page
+            is loaded.
+        '''
+        self._use_fallback = False
+        self._clicks = []
+        headers = {'User-Agent': USER_AGENT}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        self.not_modified = False
+        if self.cache is None:
+            response = fetch(url, headers, self.timeout)
+        else:
+            response = self.cache.fetch(url, headers, self.timeout, self.ttl)
+        self._url = response.url
+        self.etag = response.etag
+        self.last_modified = response.last_modified
+        if response.status == 304:
+            self.not_modified = True
+            self._document = None
+            return
+        self._document = lxml.html.document_fromstring(
+            response.body, base_url=self.current_url
+        )
+        self._document.make_links_absolute(self.current_url)
+
+    @property
+    def current_url(self):
+        ''' The url of the page loaded - in the browser, if handed over. '''
+        if self._use_fallback:
+            return self._fallback.current_url
+        return self._url
+
+    @property
+    def in_browser(self):
+        ''' Whether the page loaded was handed over to the browser. '''
+        return self._use_fallback
+
+    def link_target(self, url):
+        '''
+        Returns the url a page was seen leading to in the browser (see
+        save_link), or None if unknown (or there is no cache).
+        '''
+        if self.cache is None:
+            return None
+        return self.cache.get_link(url)
+
+    def save_link(self, url):
+        '''
+        Records, in the cache, that a page leads to the one loaded now - such
+        as a search results page (rendered by JavaScript) to the result
+        clicked on, in the browser.
+
+        Requires:
+            - self: an object of the HttpDriver class;
+            - url (str): the page the current one was reached from.
+        Ensures:
+            link_target(url) returns the current url. If the current page was
+            loaded in the browser, it is loaded again over HTTP (through the
+            cache), and calls no longer go to the browser.
+        '''
+        if self.cache is None:
+            return
+        self.cache.add_link(url, self.current_url)
+        if self.in_browser:
+            self.get(self.current_url)
+
+    @property
+    def page_source(self):
+        return etree.tostring(self._document, encoding='unicode')
+
+    def _find_element(self, method, value):
+        if self._use_fallback:
+            return getattr(self._fallback, 'find_element_by_' + method)(value)
+        try:
+            return super()._find_element(method, value)
+        except NoSuchElementException:
+            if self._make_fallback is None:
+                raise
+            self._switch_to_fallback()
+            return self._find_element(method, value)
+
+    def _find_elements(self, method, value):
+        if self._use_fallback:
+            return getattr(self._fallback, 'find_elements_by_' + method)(value)
+        return super()._find_elements(method, value)
+
+    def _switch_to_fallback(self):
+        logging.info('Loading page in a browser (url: %s).' % self.current_url)
+        if self._fallback is None:
+            self._fallback = self._make_fallback()
+        self._fallback.get(self.current_url)
+        for locator in self._clicks:
+            element = self._fallback
+            for method, value, index in locator:
+                if index is None:
+                    find = getattr(element, 'find_element_by_' + method)
+                    element = find(value)
+                else:
+                    find = getattr(element, 'find_elements_by_' + method)
+                    element = find(value)[index]
+            element.click()
+        self._use_fallback = True
+
+    def quit(self):
+        ''' Closes the fallback browser, if it was started. '''
+        if self._fallback is not None:
+            self._fallback.quit()
+            self._fallback = None
@@ -0,0 +1,18 @@
+"""
+ASGI config for mobilestore project.
+
+It exposes the ASGI callable as a module-level variable named ``application``,
+to be served by uvicorn (see gunicorn.conf.py). The handler is in
+mobilestore.asgihandler, as Django 2.1 only ships a WSGI one.
+"""
+
+import os
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mobilestore.settings')
+django.setup(set_prefix=False)
+
+from .asgihandler import ASGIHandler  # noqa: E402 (needs the settings)
+
+application = ASGIHandler()
@@ -0,0 +1,186 @@
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core import signals
+from django.core.handlers import base
+from django.core.handlers.wsgi import WSGIRequest
+from django.urls import Resolver404, get_resolver, set_script_prefix
+from django.utils.module_loading import import_string
+
+
+class ASGIHandler(base.BaseHandler):
+    '''
+    ASGI 3 application running the Django project (Django 2.1 has no ASGI
+    support of its own).
+
+    The event loop reads requests and writes responses, so slow clients only
+    cost a coroutine, while the middleware and views - and their blocking
+    database queries - run in a bounded pool of threads (ASGI_THREADS), each
+    one with its own database connection. Views named in ASYNC_VIEWS are
+    coroutines called on the loop instead, with the request, the handler and
+    the ASGI send callable (see phones.api.serve_catalog).
+    '''
+    request_class = WSGIRequest
+
+    def __init__(self, threads=None):
+        super().__init__()
+        self.load_middleware()
+        self.executor = ThreadPoolExecutor(
+            threads or settings.ASGI_THREADS, thread_name_prefix='asgi'
+        )
+        self.async_views = {
+            name: import_string(path)
+            for name, path in getattr(settings, 'ASYNC_VIEWS', {}).items()
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise ValueError('Unsupported ASGI scope: %s.' % scope['type'])
+
+        body = await self.read_body(receive)
+        if body is None:
+            return # The client went away
+        request = self.request_class(self.get_environ(scope, body))
+        view = self.async_views.get(self.get_view_name(request))
+        if view is None:
+            response = await self.get_response_async(request, send)
+        else:
+            response = await view(request, self, send)
+        if response is not None:
+            await self.send_response(response, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def read_body(self, receive):
+        ''' Returns the request body (bytes), or None on disconnection. '''
+        body = io.BytesIO()
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            body.write(message.get('body', b''))
+            if not message.get('more_body', False):
+                return body.getvalue()
+
+    def get_environ(self, scope, body):
+        ''' Returns the WSGI environ of an ASGI request. '''
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        script_name = scope.get('root_path', '')
+        # WSGI strings are bytes decoded as latin-1
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': script_name.encode().decode('latin-1'),
+            'PATH_INFO': scope['path'].encode().decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': str(server[0]),
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': 'HTTP/%s' % scope.get('http_version', '1.1'),
+            'REMOTE_ADDR': str(client[0]),
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name == 'CONTENT_LENGTH':
+                continue
+            key = name if name == 'CONTENT_TYPE' else 'HTTP_' + name
+            if key in environ:
+                value = environ[key] + ',' + value
+            environ[key] = value
+        return environ
+
+    def get_view_name(self, request):
+        try:
+            return get_resolver().resolve(request.path_info).view_name
+        except Resolver404:
+            return None
+
+    def get_response_in_thread(self, request, send):
+        '''
+        Runs the middleware and view of a request (blocking). Streaming
+        responses are sent from this thread, as their content may keep
+        reading from its database connection.
+
+        Requires:
+            - request (WSGIRequest);
+            - send (callable): sends an ASGI message, blocking until done.
+        Ensures:
+            Returns the response, or None if it was streamed. Responses are
+            closed (request_finished) in this thread.
+        '''
+        set_script_prefix(request.META['SCRIPT_NAME'] or '/')
+        signals.request_started.send(
+            sender=self.__class__, environ=request.META
+        )
+        response = self.get_response(request)
+        if not response.streaming:
+            response.close()
+            return response
+        try:
+            send(self.start_message(response))
+            for chunk in response:
+                if chunk:
+                    send({
+                        'type': 'http.response.body',
+                        'body': chunk,
+                        'more_body': True
+                    })
+            send({'type': 'http.response.body'})
+        finally:
+            response.close()
+
+    async def get_response_async(self, request, send):
+        '''
+        Runs the middleware and view of a request in the pool of threads,
+        without blocking the event loop.
+
+        Ensures: Returns the response, or None if it was streamed.
+        '''
+        loop = asyncio.get_event_loop()
+
+        def send_blocking(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        return await loop.run_in_executor(
+            self.executor, self.get_response_in_thread, request, send_blocking
+        )
+
+    def start_message(self, response):
+        headers = [
+            (name.encode('latin-1'), str(value).encode('latin-1'))
+            for name, value in response.items()
+        ]
+        headers += [
+            (b'Set-Cookie', cookie.output(header='').strip().encode('latin-1'))
+            for cookie in response.cookies.values()
+        ]
+        return {
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': headers,
+        }
+
+    async def send_response(self, response, send):
+        await send(self.start_message(response))
+        await send({'type': 'http.response.body', 'body': response.content})
@@ -0,0 +1,23 @@
+'''
+Settings of the servers started by the concurrency benchmark (see
+phones.benchmarks.servers): the project settings, on the benchmark's test
+database, with no response cache unless BENCHMARK_CACHE is set, and queries
+slowed down by BENCHMARK_DB_LATENCY milliseconds.
+'''
+import os
+
+from mobilestore.settings import *  # noqa: F401,F403
+from mobilestore.settings import DATABASES, MIDDLEWARE
+
+DEBUG = False
+DATABASES['default']['NAME'] = os.environ['BENCHMARK_DATABASE']
+if os.environ.get('BENCHMARK_DB_LATENCY'):
+    MIDDLEWARE = list(MIDDLEWARE) + [
+        'phones.benchmarks.servers.DatabaseLatencyMiddleware'
+    ]
+
+# As phones.benchmarks.NO_CACHE (the apps can't be imported from settings)
+if not os.environ.get('BENCHMARK_CACHE'):
+    CACHES = {
+        'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+    }
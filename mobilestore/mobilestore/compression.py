@@ -0,0 +1,99 @@
+import gzip
+import re
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # Optional - gzip only
+    brotli = None
+
+COMPRESS_TYPES = ['application/json']
+COMPRESS_MIN_SIZE = 1024 # Bytes
+GZIP_LEVEL = 6
+# Quality for responses compressed on every request: the highest ones are
+# only worth it for files compressed ahead of time (see whitenoise)
+BROTLI_QUALITY = 5
+
+ACCEPT_ENCODING_RE = re.compile(
+    r'(?:^|,)\s*(br|gzip)\s*(?:;\s*q=([0-9.]+))?'
+)
+
+
+def accepted_encoding(request):
+    '''
+    Returns the best encoding the client accepts (str): 'br' (if brotli is
+    installed), 'gzip', or None.
+    '''
+    accepted = {}
+    header = request.META.get('HTTP_ACCEPT_ENCODING', '').lower()
+    for match in ACCEPT_ENCODING_RE.finditer(header):
+        try:
+            quality = float(match.group(2) or 1)
+        except ValueError:
+            continue
+        accepted[match.group(1)] = quality
+    for encoding in ['br', 'gzip']:
+        if encoding == 'br' and brotli is None:
+            continue
+        if accepted.get(encoding, 0) > 0:
+            return encoding
+    return None
+
+
+def compress(content, encoding):
+    ''' Returns the content (bytes) compressed with an encoding. '''
+    if encoding == 'br':
+        return brotli.compress(content, quality=BROTLI_QUALITY)
+    return gzip.compress(content, GZIP_LEVEL)
+
+
+class CompressionMiddleware(object):
+    '''
+    Compresses API responses on the fly, with brotli or gzip (whichever the
+    client prefers, brotli first), when their content type is one of
+    COMPRESS_TYPES and they are at least COMPRESS_MIN_SIZE bytes long -
+    smaller ones gain too little for the time spent. Static files are
+    compressed ahead of time instead (see whitenoise), and streaming responses
+    are left as they are.
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.types = getattr(settings, 'COMPRESS_TYPES', COMPRESS_TYPES)
+        self.min_size = getattr(
+            settings, 'COMPRESS_MIN_SIZE', COMPRESS_MIN_SIZE
+        )
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not self.is_compressible(response):
+            return response
+        # Whatever the client accepts, caches must tell responses apart
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < self.min_size:
+            return response
+        encoding = accepted_encoding(request)
+        if encoding is None:
+            return response
+
+        compressed = compress(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # The compressed bytes differ, but the content is the same
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
+
+    def is_compressible(self, response):
+        content_type = response.get('Content-Type', '').split(';')[0].strip()
+        return (
+            not response.streaming
+            and not response.has_header('Content-Encoding')
+            and content_type in self.types
+        )
@@ -0,0 +1,143 @@
+'''
+Request metrics, in Prometheus format (served by metrics_view, at /metrics):
+latency, SQL queries and the time spent in them, and response size of each
+route (the view name), and the hit ratio of the phones response cache.
+
+With several server processes (gunicorn workers), each one writes its metrics
+to files in the `prometheus_multiproc_dir` directory (set up by
+gunicorn.conf.py), and /metrics adds up the metrics of every process.
+'''
+import os
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram,
+    generate_latest, multiprocess
+)
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+REQUESTS = Counter(
+    'http_requests', 'Requests answered, by route, method and status.',
+    ['route', 'method', 'status']
+)
+LATENCY = Histogram(
+    'http_request_duration_seconds',
+    'Time to answer a request (until the response is returned, for '
+    'streaming responses).',
+    ['route', 'method'], buckets=LATENCY_BUCKETS
+)
+DB_QUERIES = Histogram(
+    'http_request_db_queries', 'SQL queries run by a request.',
+    ['route'], buckets=QUERY_BUCKETS
+)
+DB_TIME = Histogram(
+    'http_request_db_duration_seconds', 'Time spent in SQL queries.',
+    ['route'], buckets=LATENCY_BUCKETS
+)
+RESPONSE_SIZE = Histogram(
+    'http_response_size_bytes', 'Size of the response content, as sent.',
+    ['route'], buckets=SIZE_BUCKETS
+)
+CACHE_REQUESTS = Counter(
+    'phones_cache_requests',
+    'Phones API requests looked up in the response cache, by result.',
+    ['result']
+)
+
+
+class QueryTimer(object):
+    '''
+    Execute wrapper counting the SQL queries run, and the time they take, on
+    every database connection of the current thread:
+
+        with QueryTimer() as timer:
+            ...
+        timer.count, timer.seconds
+    '''
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *args):
+        self._stack.close()
+
+
+class MetricsMiddleware(object):
+    '''
+    Records the metrics of each request. Responses are measured as sent, so
+    it goes before the middleware changing them (e.g. compression); static
+    files answered by whitenoise are not counted.
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        with QueryTimer() as queries:
+            response = self.get_response(request)
+        seconds = time.perf_counter() - start
+
+        route = self.get_route(request)
+        REQUESTS.labels(route, request.method, response.status_code).inc()
+        LATENCY.labels(route, request.method).observe(seconds)
+        DB_QUERIES.labels(route).observe(queries.count)
+        DB_TIME.labels(route).observe(queries.seconds)
+        if not response.streaming:
+            RESPONSE_SIZE.labels(route).observe(len(response.content))
+        return response
+
+    def get_route(self, request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return 'unmatched'
+        return match.view_name or match._func_path
+
+
+def get_registry():
+    ''' Returns the registry with the metrics of every server process. '''
+    if 'prometheus_multiproc_dir' not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def metrics_view(request):
+    '''
+    Metrics in Prometheus text format. Scrapers authenticate with a bearer
+    token (METRICS_TOKEN); without one, metrics are only served in DEBUG.
+    '''
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token:
+        if request.META.get('HTTP_AUTHORIZATION') != 'Bearer ' + token:
+            return HttpResponse(status=401)
+    elif not settings.DEBUG:
+        raise Http404()
+    return HttpResponse(
+        generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST
+    )
@@ -0,0 +1,105 @@
+import logging
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+SAVEPOINT_STATEMENTS = (
+    'SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT'
+)
+
+
+class QueryBudgetExceeded(AssertionError):
+    ''' Raised when more SQL queries than allowed are run. '''
+
+
+class query_budget(object):
+    '''
+    Context manager that counts the SQL queries run inside it, on every
+    database connection of the current thread, and complains when they go
+    over a budget - by logging a warning or, if strict, raising an error.
+    Works both around requests (see QueryBudgetMiddleware) and in tests:
+
+        with query_budget(2):
+            self.client.get('/api/phones/')
+
+    A budget of None or 0 only counts the queries.
+    '''
+
+    def __init__(self, budget, strict=True, label='block'):
+        self.budget = budget
+        self.strict = strict
+        self.label = label
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # Savepoints of nested atomic blocks are not queries of their own
+        if not sql.startswith(SAVEPOINT_STATEMENTS):
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stack.close()
+        if exc_type is None and self.exceeded:
+            message = '%s ran %d SQL queries, over its budget of %d.' % (
+                self.label, self.count, self.budget
+            )
+            if self.strict:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+    @property
+    def exceeded(self):
+        return bool(self.budget) and self.count > self.budget
+
+
+class QueryBudgetMiddleware(object):
+    '''
+    Checks the number of SQL queries run by each request against a budget:
+    the `query_budget` attribute of the view (or of its class, for class
+    based views, or given to as_view - such as viewset actions), or else the
+    QUERY_BUDGET setting.
+    When QUERY_BUDGET_STRICT is on, going over the budget is an error;
+    otherwise a warning is logged. Server errors (5xx) are not checked, so
+    that they are reported as they are.
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        budget = query_budget(
+            getattr(settings, 'QUERY_BUDGET', 0),
+            strict=getattr(settings, 'QUERY_BUDGET_STRICT', False),
+            label=request.path
+        )
+        request.query_budget = budget
+        with budget:
+            response = self.get_response(request)
+            if response.status_code >= 500:
+                # Server errors are reported on their own
+                budget.budget = None
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = getattr(view_func, 'cls', view_func)
+        budget = getattr(view_func, 'initkwargs', {}).get(
+            'query_budget', getattr(view, 'query_budget', None)
+        )
+        if budget is not None:
+            request.query_budget.budget = budget
+        # Loading the session and the user (lazily, on first use) is not the
+        # view's work: it's done now, and left out of the count
+        user = getattr(request, 'user', None)
+        if user is not None:
+            count = request.query_budget.count
+            user.is_authenticated
+            request.query_budget.count = count
@@ -41,6 +41,8 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
+    # Static files served by whitenoise in development too
+    'whitenoise.runserver_nostatic',
     'django.contrib.staticfiles',
     'rest_framework',
     'phones',
@@ -49,14 +51,32 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'mobilestore.metrics.MetricsMiddleware',
+    'mobilestore.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'mobilestore.querybudget.QueryBudgetMiddleware',
 ]
 
+# Maximum SQL queries per request, for views without their own budget
+# (0 = no limit). Going over it logs a warning, or raises an error if strict.
+QUERY_BUDGET = int(get_variable('QUERY_BUDGET') or 0)
+QUERY_BUDGET_STRICT = DEBUG
+
+# On the fly compression of API responses (see mobilestore.compression):
+# content types compressed, and minimum size in bytes
+COMPRESS_TYPES = ['application/json']
+COMPRESS_MIN_SIZE = int(get_variable('COMPRESS_MIN_SIZE') or 1024)
+
+# Bearer token of the Prometheus scraper, for /metrics (see
+# mobilestore.metrics) - without one, metrics are only served in DEBUG
+METRICS_TOKEN = get_variable('METRICS_TOKEN')
+
 ROOT_URLCONF = 'mobilestore.urls'
 
 TEMPLATES = [
@@ -77,9 +97,21 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'mobilestore.wsgi.application'
 
+# ASGI mode (see mobilestore.asgi): threads running the middleware and views
+# (each one holds a database connection), and views answered by coroutines
+ASGI_THREADS = int(get_variable('ASGI_THREADS') or 10)
+ASYNC_VIEWS = {
+    'api:phones-list': 'phones.api.serve_catalog',
+    'api:phones-detail': 'phones.api.serve_catalog',
+}
+
 
 # Database
 # https://docs.djangoproject.com/en/2.1/ref/settings/#databases
+# Connections are kept for CONN_MAX_AGE seconds (0: one per request), rather
+# than opened again by every request.
+
+CONN_MAX_AGE = int(get_variable('CONN_MAX_AGE') or 60)
 
 DATABASES = {
     'default': {
@@ -88,10 +120,29 @@ DATABASES = {
         'USER': get_variable('USER'),
         'PASSWORD': get_variable('PASSWORD'),
         'HOST': get_variable('HOST'),
-        'PORT': get_variable('PORT')
+        'PORT': get_variable('PORT'),
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+    }
+}
+
+
+# Caches
+# https://docs.djangoproject.com/en/2.1/topics/cache/
+# Local memory by default (one cache per process). Set REDIS_URL to share it
+# between processes and dynos - requires django-redis.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
+if get_variable('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': get_variable('REDIS_URL'),
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
@@ -130,11 +181,20 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/2.1/howto/static-files/
 
 STATIC_URL = '/static/'
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'assets')
 ]
 
+# Served by whitenoise: collectstatic saves the files under content hash names
+# (styles.3f2a9c0d41b7.css), with gzip and brotli variants built ahead of
+# time; hashed names are served with a far-future, immutable Cache-Control.
+# In development, files are served from the finders as they change.
+STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+WHITENOISE_USE_FINDERS = DEBUG
+WHITENOISE_AUTOREFRESH = DEBUG
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
@@ -146,7 +206,20 @@ if not DEBUG:
     AWS_S3_SIGNATURE_VERSION = 's3v4'
     AWS_S3_REGION_NAME = 'us-east-2'
     AWS_DEFAULT_ACL = None
-    DEFAULT_FILE_STORAGE = 'storages.backends.s3boto3.S3Boto3Storage'
-
-# Activate Django-Heroku.
-django_heroku.settings(locals())
\ No newline at end of file
+    # Sets a long-lived Cache-Control on content hash names only
+    DEFAULT_FILE_STORAGE = 'phones.storage.S3Storage'
+
+# Phones API
+# Pagination: 'offset' (limit/offset, bare list response) or 'keyset' (opaque
+# cursors). Keyset pagination can also be asked for per request.
+PHONES_PAGINATION = get_variable('PHONES_PAGINATION') or 'offset'
+# Response cache: cache alias, and maximum age of responses (in seconds), as
+# writes that skip Django signals (worker.py) can't invalidate it.
+PHONES_CACHE = 'default'
+PHONES_CACHE_TIMEOUT = int(get_variable('PHONES_CACHE_TIMEOUT') or 300)
+
+# Activate Django-Heroku (static files are set up above).
+django_heroku.settings(locals(), staticfiles=False)
+# It sets up the database from DATABASE_URL, if any, with its own connection
+# age.
+DATABASES['default']['CONN_MAX_AGE'] = CONN_MAX_AGE
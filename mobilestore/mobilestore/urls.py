@@ -3,14 +3,15 @@ from django.conf import settings
 from django.conf.urls import url
 from django.conf.urls.static import static
 from django.contrib import admin
-from django.contrib.staticfiles.urls import staticfiles_urlpatterns
-from . import views
+from . import metrics, views
 
 urlpatterns = [
     url(r'^admin/', admin.site.urls, name='admin'),
     url(r'^$', views.homepage, name='home'),
     url(r'^api/', include(('phones.urls', 'api')), name='api'),
+    url(r'^metrics$', metrics.metrics_view, name='metrics'),
 ]
 
-urlpatterns += staticfiles_urlpatterns()
+# Static files are served by whitenoise (see settings), media files by S3 in
+# production
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
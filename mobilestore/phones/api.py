@@ -1,18 +1,197 @@
 from .models import Phone
-from rest_framework import viewsets, permissions
-from .serializers import PhoneListSerializer, PhoneDetailSerializer
+from django.http import StreamingHttpResponse
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from . import stock
+from .cache import (
+    CatalogCacheMixin, get_cache, is_local_cache, response_cache_key
+)
+from .export import EXPORT_COLUMNS, CSVRenderer, NDJSONRenderer, export_rows
+from .filters import PhonesFilter, PhonesSearch
+from .serializers import (
+    PhoneListFastSerializer, PhoneDetailSerializer, CartSerializer
+)
 from .pagination import PhonesPagination
 
-class PhoneViewSet(viewsets.ReadOnlyModelViewSet):
+
+def is_id(value):
+    ''' Whether a value is a phone id: an integer, or its ASCII digits. '''
+    if isinstance(value, str):
+        return value.isascii() and value.isdigit()
+    return type(value) is int and value >= 0
+
+
+class PhoneViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
     ''' Phone Viewset. '''
     queryset = Phone.objects.all()
     permission_classes = [ permissions.IsAuthenticatedOrReadOnly ]
     pagination_class = PhonesPagination
+    filter_backends = [ PhonesFilter, PhonesSearch ]
+    # Maximum SQL queries per request (see mobilestore.querybudget)
+    query_budget = 2
+    # Maximum phones per batch request
+    batch_max_size = 50
     serializers = {
-        'list': PhoneListSerializer,
-        'retrieve': PhoneDetailSerializer
+        'list': PhoneListFastSerializer,
+        'retrieve': PhoneDetailSerializer,
+        'batch': PhoneDetailSerializer,
+        'reserve': CartSerializer,
+        'release': CartSerializer
+    }
+    # Other actions read the columns of the fields sent by their serializer
+    querysets = {
+        'export': (
+            Phone.objects
+            .values_list(*EXPORT_COLUMNS, named=True)
+            .order_by('id')
+        )
     }
-    
+
     def get_serializer_class(self):
         # Overwriting method for viewset to have several serializers
-        return self.serializers.get(self.action)
\ No newline at end of file
+        return self.serializers.get(self.action)
+
+    def get_queryset(self):
+        # Only the columns and relations needed by the fields sent (see
+        # serializers.SparseFieldsMixin)
+        if self.action in self.querysets:
+            return self.querysets[self.action].all()
+        serializer_class = self.get_serializer_class()
+        if serializer_class is None:
+            return self.queryset.all()
+        fields = serializer_class.selected_fields(self.request)
+        if self.action == 'list' and self.reads_summary(fields):
+            return serializer_class.get_summary_queryset(fields)
+        return serializer_class.get_queryset(fields)
+
+    def reads_summary(self, fields):
+        '''
+        Whether the list can be read from the narrow phone_summary table (see
+        PhoneSummary): only if the fields sent, the filters and the search
+        asked for all use its columns.
+        '''
+        summary_fields = self.get_serializer_class().summary_fields
+        return all(name in summary_fields for name in fields) and all(
+            backend().reads_summary(self.request)
+            for backend in self.filter_backends
+        )
+
+    @action(detail=False, renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def export(self, request):
+        '''
+        Streams every phone (filtered like the list) as NDJSON or CSV, read
+        from the database in chunks.
+        '''
+        renderer = request.accepted_renderer
+        rows = export_rows(self.filter_queryset(self.get_queryset()), request)
+        response = StreamingHttpResponse(
+            renderer.stream(rows),
+            content_type='%s; charset=%s' % (
+                renderer.media_type, renderer.charset
+            )
+        )
+        response['Content-Disposition'] = (
+            'attachment; filename="phones.%s"' % renderer.format
+        )
+        return response
+
+    @action(
+        detail=False,
+        methods=['get', 'post'],
+        permission_classes=[permissions.AllowAny]
+    )
+    def batch(self, request):
+        '''
+        Phone details for several ids at once (`ids` query parameter, or POST
+        body), read with a single query, in the order asked for. Missing
+        phones get a 404 item instead of failing the whole batch.
+        '''
+        ids = self.get_batch_ids(request)
+        phones = self.get_queryset().filter(id__in=ids)
+        details = {
+            item['id']: item
+            for item in self.get_serializer(phones, many=True).data
+        }
+        missing = {'status': 404, 'detail': 'Not found.'}
+        return Response([
+            details.get(id_) or dict(id=id_, **missing) for id_ in ids
+        ])
+
+    def get_batch_ids(self, request):
+        ''' Returns the ids asked for, without duplicates, in order. '''
+        data = request.query_params
+        if request.method == 'POST':
+            data = request.data
+        ids = data.get('ids') if hasattr(data, 'get') else None
+        if isinstance(ids, str):
+            ids = [id_.strip() for id_ in ids.split(',') if id_.strip()]
+        if not isinstance(ids, list) or not all(map(is_id, ids)):
+            raise ValidationError({'ids': 'A list of integers is required.'})
+        ids = list(dict.fromkeys(int(id_) for id_ in ids))
+        if not ids:
+            raise ValidationError({'ids': 'At least one id is required.'})
+        if len(ids) > self.batch_max_size:
+            raise ValidationError({
+                'ids': 'At most %d ids are allowed.' % self.batch_max_size
+            })
+        return ids
+
+    # One conditional UPDATE per item, and a lookup when one fails
+    @action(
+        detail=False,
+        methods=['post'],
+        query_budget=CartSerializer.max_items + 1
+    )
+    def reserve(self, request):
+        '''
+        Takes phones out of stock for a cart (`items`: list of `id` and
+        `quantity`), all or nothing - 409 Conflict when a phone has less
+        stock left than asked for.
+        '''
+        return self.update_stock(request, stock.reserve)
+
+    @action(
+        detail=False,
+        methods=['post'],
+        query_budget=CartSerializer.max_items
+    )
+    def release(self, request):
+        ''' Puts phones of a cancelled reservation back in stock. '''
+        return self.update_stock(request, stock.release)
+
+    def update_stock(self, request, update):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data['items']
+        try:
+            update(items)
+        except stock.StockError as error:
+            code = status.HTTP_404_NOT_FOUND
+            if isinstance(error, stock.OutOfStock):
+                code = status.HTTP_409_CONFLICT
+            return Response(
+                {'detail': str(error), 'id': error.phone_id}, status=code
+            )
+        return Response({'items': [
+            {'id': phone_id, 'quantity': quantity}
+            for phone_id, quantity in sorted(items.items())
+        ]})
+
+
+async def serve_catalog(request, handler, send):
+    '''
+    Async handler of the phone list and detail, in ASGI mode (see
+    mobilestore.asgihandler). Responses in a local memory cache are answered
+    right on the event loop, with no thread nor database access; the others
+    are rendered by the viewset in a thread, so queries never block the loop.
+    '''
+    if request.method == 'GET' and is_local_cache():
+        cached = get_cache().get(response_cache_key(request))
+        if cached is not None:
+            request.catalog_cached = cached
+            response = handler.get_response(request)
+            response.close()
+            return response
+    return await handler.get_response_async(request, send)
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class PhonesConfig(AppConfig):
     name = 'phones'
+
+    def ready(self):
+        from . import signals  # noqa: F401 - connects the signal receivers
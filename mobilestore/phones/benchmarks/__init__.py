@@ -0,0 +1,139 @@
+'''
+Benchmarks for the phones API.
+
+They run as Django tests, against a throwaway test database, but are kept out
+of the default test run. Run them with:
+    python manage.py test phones.benchmarks --pattern="bench_*.py"
+'''
+import random
+import time
+
+from phones.models import Phone, Company
+from phones.search import update_search_vector
+
+# Benchmarks measure the database and serialization work, not the response
+# cache, so they run with a cache that stores nothing
+NO_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+}
+
+
+# Pieces of the specs and descriptions of the synthetic phones, with the
+# shape and sizes of the ones scraped by worker.py
+CHIPSETS = [
+    'Qualcomm SDM845 Snapdragon 845 (10 nm)',
+    'Qualcomm SDM670 Snapdragon 670 (10 nm)',
+    'Exynos 9820 Octa (8 nm)',
+    'Apple A12 Bionic (7 nm)',
+    'Mediatek Helio P70 (12 nm)',
+    'Kirin 980 (7 nm)',
+]
+PLATFORMS = ['Android 9.0 (Pie)', 'Android 8.1 (Oreo)', 'iOS 12']
+CAMERA_FEATURES = [
+    'LED flash', 'Dual-LED flash', 'HDR', 'panorama', 'Auto-HDR',
+    'dual-tone flash', 'geo-tagging', 'face detection',
+]
+SENTENCES = [
+    'Staying too far from your loved ones? Video call them for hours on end.',
+    'The weather is romantic? Listen to your playlists all day long.',
+    'Binge watch your favourite series on its expansive bezel-less display.',
+    'Its powerful battery lasts well over a day of heavy use.',
+    'The cameras take sharp, detailed photos even in low light.',
+    'A fast processor keeps games and apps running smoothly.',
+    'The glass and aluminum body feels premium in the hand.',
+    'Unlock it in an instant with the fingerprint sensor.',
+    'Fast charging gets you back to full battery in no time.',
+    'Dust and water resistance lets you use it anywhere.',
+]
+
+
+def phone_specs(random_):
+    ''' Returns the specs of a synthetic phone (about 400 bytes of JSON). '''
+    height = random_.uniform(140, 165)
+    width = random_.uniform(68, 78)
+    depth = random_.uniform(7, 9)
+    inches = random_.choice([5.5, 5.8, 6.1, 6.3, 6.4, 6.5])
+    return {
+        'body': '%.1f x %.1f x %.1f mm (%.2f x %.2f x %.2f in)' % (
+            height, width, depth, height / 25.4, width / 25.4, depth / 25.4
+        ),
+        'display': '%.1f inches, %.1f cm2 (~%d%% screen-to-body ratio)' % (
+            inches, inches * inches * 2.55, random_.randint(70, 90)
+        ),
+        'platform': random_.choice(PLATFORMS),
+        'chipset': random_.choice(CHIPSETS),
+        'memory': '%d GB, %d GB RAM' % (
+            random_.choice([32, 64, 128, 256]), random_.choice([2, 3, 4, 6, 8])
+        ),
+        'camera': {
+            'main': '%.1f MP, f/%.1f, %dmm (wide), PDAF' % (
+                random_.choice([12, 12.2, 16, 48]),
+                random_.uniform(1.5, 2.2), random_.randint(24, 28)
+            ),
+            'selfie': '%d MP, f/%.1f' % (
+                random_.choice([5, 8, 16, 24]), random_.uniform(1.8, 2.4)
+            ),
+            'features': ', '.join(random_.sample(CAMERA_FEATURES, 3)),
+        },
+    }
+
+
+def phone_description(random_):
+    ''' Returns the description of a synthetic phone (300 to 600 chars). '''
+    return ' '.join(random_.sample(SENTENCES, random_.randint(5, 9)))
+
+
+def create_catalog(size, companies=10, batch_size=5000, seed=0):
+    '''
+    Bulk creates a synthetic catalog of phones, with realistic specs and
+    descriptions.
+
+    Requires:
+        - size (int): number of phones created;
+        - companies (int - optional): number of manufacturers;
+        - batch_size (int - optional): phones inserted per query;
+        - seed (int - optional): seed of the random values, so that the same
+        catalog is made each time.
+    Ensures:
+        Returns the list of companies created, after saving all phones (with
+        their search vectors).
+    '''
+    random_ = random.Random(seed)
+    makers = Company.objects.bulk_create(
+        Company(name='Company %d' % i) for i in range(companies)
+    )
+    for start in range(0, size, batch_size):
+        Phone.objects.bulk_create(
+            Phone(
+                model='Phone %d' % i,
+                image='img/default.png',
+                manufacturer=makers[i % companies],
+                price=100 + (i * 7919) % 1900,
+                description=phone_description(random_),
+                specs=phone_specs(random_),
+                stock=i % 100,
+            )
+            for i in range(start, min(start + batch_size, size))
+        )
+    for maker in makers:
+        update_search_vector(maker.phone_set.all(), maker.name)
+    return makers
+
+
+def timed(function, repeat=20):
+    '''
+    Times a function call.
+
+    Requires:
+        - function (callable): called without arguments;
+        - repeat (int - optional): number of calls.
+    Ensures:
+        Returns the median time of a call, in milliseconds.
+    '''
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return times[len(times) // 2]
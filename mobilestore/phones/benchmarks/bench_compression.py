@@ -0,0 +1,99 @@
+import shutil
+import tempfile
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.contrib.staticfiles.views import serve
+from django.core.management import call_command
+from django.test import modify_settings, override_settings
+from django.urls import re_path
+from rest_framework.test import APITestCase
+
+from mobilestore.urls import urlpatterns
+from phones.models import Phone
+from . import NO_CACHE, create_catalog, timed
+
+BROWSER_ENCODINGS = 'gzip, deflate, br'
+WHITENOISE = 'whitenoise.middleware.WhiteNoiseMiddleware'
+
+# Static files served by Django, as staticfiles_urlpatterns() did before
+urlpatterns = urlpatterns + [
+    re_path(r'^static/(?P<path>.*)$', serve, {'insecure': True}),
+]
+
+
+@override_settings(CACHES=NO_CACHE)
+class CompressionBenchmark(APITestCase):
+    '''
+    Bytes sent and latency, without and with compression: JSON responses
+    compressed on the fly (mobilestore.compression), and static files served
+    by Django's staticfiles view (before) or by whitenoise, precompressed
+    (after).
+    '''
+    size = 1000
+    api_urls = [
+        '/api/phones/?limit=20',
+        '/api/phones/?limit=20&fields=model,manufacturer,description,specs',
+        '/api/phones/{id}/',
+        '/api/phones/batch/?ids={ids}',
+    ]
+    static_files = [
+        'styles.css',
+        'rest_framework/css/bootstrap.min.css',
+        'rest_framework/js/jquery-3.3.1.min.js',
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        create_catalog(cls.size)
+
+    def test_api(self):
+        ids = list(Phone.objects.values_list('id', flat=True)[:50])
+        print('\n%-60s %-9s %8s %8s' % ('request', 'encoding', 'bytes', 'ms'))
+        for url in self.api_urls:
+            url = url.format(
+                id=ids[0], ids=','.join(str(id_) for id_ in ids)
+            )
+            for encoding in ['identity', 'gzip', BROWSER_ENCODINGS]:
+                response = self.client.get(url, HTTP_ACCEPT_ENCODING=encoding)
+                self.assertEqual(response.status_code, 200)
+                milliseconds = timed(lambda: self.client.get(
+                    url, HTTP_ACCEPT_ENCODING=encoding
+                ))
+                print('%-60s %-9s %8d %8.2f' % (
+                    url[:60], response.get('Content-Encoding', 'none'),
+                    len(response.content), milliseconds
+                ))
+
+    def fetch(self, url):
+        '''
+        Returns the encoding, bytes and median latency of a static file, on a
+        new client (the middleware of the current settings).
+        '''
+        client = self.client_class()
+        response = client.get(url, HTTP_ACCEPT_ENCODING=BROWSER_ENCODINGS)
+        self.assertEqual(response.status_code, 200)
+        size = len(b''.join(response.streaming_content))
+        milliseconds = timed(lambda: b''.join(client.get(
+            url, HTTP_ACCEPT_ENCODING=BROWSER_ENCODINGS
+        ).streaming_content))
+        return response.get('Content-Encoding', 'none'), size, milliseconds
+
+    def test_static(self):
+        static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_root)
+        with override_settings(STATIC_ROOT=static_root):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            print('\n%-40s %-22s %8s %8s' % (
+                'file', 'served by', 'bytes', 'ms'
+            ))
+            for name in self.static_files:
+                with override_settings(ROOT_URLCONF=__name__), \
+                        modify_settings(MIDDLEWARE={'remove': [WHITENOISE]}):
+                    before = self.fetch('/static/' + name)
+                after = self.fetch(staticfiles_storage.url(name))
+                print('%-40s %-22s %8d %8.2f' % (
+                    (name, 'staticfiles view (%s)' % before[0]) + before[1:]
+                ))
+                print('%-40s %-22s %8d %8.2f' % (
+                    ('', 'whitenoise (%s)' % after[0]) + after[1:]
+                ))
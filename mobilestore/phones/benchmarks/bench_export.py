@@ -0,0 +1,59 @@
+import time
+
+from django.test import TestCase, override_settings
+
+from . import NO_CACHE, create_catalog
+
+
+def rss():
+    ''' Returns the resident memory of the process, in MB (Linux only). '''
+    with open('/proc/self/statm') as statm:
+        pages = int(statm.read().split()[1])
+    return pages * 4096 / 2 ** 20
+
+
+@override_settings(CACHES=NO_CACHE)
+class ExportBenchmark(TestCase):
+    '''
+    Catalog export over 500k phones - the memory of the process must stay
+    flat while the rows are streamed, and the time grow linearly with the
+    number of rows.
+    '''
+    size = 500000
+    max_memory = 64 # MB, growth while streaming the whole catalog
+
+    @classmethod
+    def setUpTestData(cls):
+        create_catalog(cls.size)
+
+    def export(self, fmt, **filters):
+        ''' Returns the rows, bytes, seconds and memory growth of an export. '''
+        start_memory = peak_memory = rss()
+        start = time.perf_counter()
+        response = self.client.get(
+            '/api/phones/export/', dict(filters, format=fmt)
+        )
+        rows = size = 0
+        for chunk in response.streaming_content:
+            rows += chunk.count(b'\n')
+            size += len(chunk)
+            peak_memory = max(peak_memory, rss())
+        seconds = time.perf_counter() - start
+        return rows, size, seconds, peak_memory - start_memory
+
+    def test_export(self):
+        print('\n%8s %10s %10s %10s %12s %12s' % (
+            'format', 'rows', 'MB', 'seconds', 'rows/s', 'memory (MB)'
+        ))
+        for fmt in ['ndjson', 'csv']:
+            # A tenth of the catalog, then all of it
+            small = self.export(fmt, max_price=289)
+            full = self.export(fmt)
+            for rows, size, seconds, memory in [small, full]:
+                print('%8s %10d %10.1f %10.2f %12.0f %12.1f' % (
+                    fmt, rows, size / 2 ** 20, seconds, rows / seconds, memory
+                ))
+            self.assertGreaterEqual(full[0], self.size)
+            self.assertLess(full[3], self.max_memory)
+            # Ten times the rows should take about ten times longer
+            self.assertLess(full[2], small[2] * 10 * 2)
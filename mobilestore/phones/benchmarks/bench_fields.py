@@ -0,0 +1,76 @@
+from django.test import TestCase, override_settings
+
+from phones.models import Phone, Company
+from . import NO_CACHE, timed
+
+DESCRIPTION = (
+    'Staying too far from your loved ones? Video call them for hours on end. '
+    'The weather is romantic? Listen to your favourite playlists all day '
+    'long. Don\'t want to go out this weekend? Then binge watch your '
+    'favourite series on the Internet. The phone ensures that there\'s never '
+    'a dull moment, all thanks to its powerful battery, impressive cameras '
+    'and its expansive bezel-less display.'
+)
+SPECS = {
+    'body': '145.6 x 68.2 x 7.9 mm (5.73 x 2.69 x 0.31 in)',
+    'camera': {
+        'main': '12.2 MP (wide) dual pixel',
+        'selfie': '8 MP (ultrawide), no AF',
+        'features': 'Dual-LED flash, Auto-HDR, panorama',
+    },
+    'memory': '64/128 GB, 4 GB RAM',
+    'battery': 'Non-removable Li-Po 2915 mAh battery',
+    'chipset': 'Qualcomm SDM845 Snapdragon 845 (10 nm)',
+    'display': '5.5 inches, 1080 x 2160 pixels, 18:9 ratio (~443 ppi density)',
+    'features': 'NFC, USB 3.1 Type-C 1.0, fingerprint (rear-mounted), fast '
+        'battery charging, Gorilla Glass 5, aluminum frame, IP68 dust/water '
+        'resistant, Always-on display, HDR',
+    'platform': 'OS Android 9.0 (Pie)',
+}
+
+
+@override_settings(CACHES=NO_CACHE)
+class SparseFieldsBenchmark(TestCase):
+    '''
+    Payload size and latency of the list and detail endpoints for typical
+    field subsets, on phones with full size descriptions and specs.
+    '''
+    size = 1000
+    subsets = [
+        ('/api/phones/?limit=20', ''),
+        ('/api/phones/?limit=20', '&fields=id,model,price'),
+        ('/api/phones/?limit=20', '&fields=model,image_webp,price,stock'),
+        ('/api/phones/?limit=20', '&fields=model,manufacturer,specs'),
+        ('/api/phones/{id}/', ''),
+        ('/api/phones/{id}/', '?exclude=description'),
+        ('/api/phones/{id}/', '?exclude=description,specs'),
+        ('/api/phones/{id}/', '?fields=model,price,stock'),
+        ('/api/phones/batch/?ids={ids}', ''),
+        ('/api/phones/batch/?ids={ids}', '&fields=model,image,price,stock'),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        company = Company.objects.create(name='Google Inc.')
+        Phone.objects.bulk_create(
+            Phone(
+                model='Phone %d' % i, image='img/default.png',
+                manufacturer=company, price=100 + i, description=DESCRIPTION,
+                specs=SPECS, stock=i % 100,
+            )
+            for i in range(cls.size)
+        )
+
+    def test_payload_and_latency(self):
+        ids = list(Phone.objects.values_list('id', flat=True)[:10])
+        print('\n%-56s %8s %8s' % ('request', 'bytes', 'ms'))
+        for path, query in self.subsets:
+            url = path.format(
+                id=ids[0], ids=','.join(str(id_) for id_ in ids)
+            ) + query
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            milliseconds = timed(lambda: self.client.get(url))
+            print('%-56s %8d %8.2f' % (
+                path + query, len(response.content), milliseconds
+            ))
@@ -0,0 +1,91 @@
+import io
+import os
+import shutil
+import tempfile
+
+from django.test import override_settings
+from PIL import Image
+from rest_framework.test import APITestCase
+
+from phones.images import THUMBNAIL_SIZE, build_variants, variant_name
+from phones.models import Phone, Company
+from . import NO_CACHE
+
+
+def create_photo(seed):
+    '''
+    Returns the bytes of a photo-like 600x415 JPEG (the size of the images
+    scraped from allo.ua): a phone shaped gradient, with sensor noise, on a
+    white background.
+    '''
+    noise = Image.effect_noise((180, 360), 24 + seed % 8)
+    body = Image.merge('RGB', [
+        Image.linear_gradient('L').resize((180, 360)),
+        noise,
+        Image.radial_gradient('L').resize((180, 360)),
+    ])
+    photo = Image.new('RGB', (600, 415), 'white')
+    photo.paste(body, (210, 28))
+    output = io.BytesIO()
+    photo.save(output, 'JPEG', quality=90)
+    return output.getvalue()
+
+
+@override_settings(CACHES=NO_CACHE)
+class BytesPerPageBenchmark(APITestCase):
+    '''
+    Bytes downloaded for a page of the phone list - the JSON response and
+    the image of each phone - with the full size images (before the image
+    pipeline), and with the JPEG and WebP thumbnails it now returns.
+    '''
+    page_sizes = [8, 20]
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media = tempfile.mkdtemp()
+        os.mkdir(os.path.join(cls.media, 'img'))
+        cls.settings = override_settings(MEDIA_ROOT=cls.media)
+        cls.settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.settings.disable()
+        shutil.rmtree(cls.media)
+
+    @classmethod
+    def setUpTestData(cls):
+        company = Company.objects.create(name='Company')
+        for i in range(max(cls.page_sizes)):
+            variants = build_variants(create_photo(i))
+            for name, _, data in variants:
+                with open(os.path.join(cls.media, name), 'wb') as file:
+                    file.write(data)
+            Phone.objects.create(
+                model='Phone %d' % i, image=variants[0][0],
+                manufacturer=company, price=100 + i,
+                description='Description of phone %d.' % i,
+                specs={'platform': 'Android'}, stock=10,
+            )
+
+    def file_size(self, name):
+        return os.path.getsize(os.path.join(self.media, name))
+
+    def test_bytes_per_page(self):
+        print('\n%10s %10s %14s %14s %14s' % (
+            'page size', 'json', 'full jpeg', 'thumb jpeg', 'thumb webp'
+        ))
+        for size in self.page_sizes:
+            response = self.client.get('/api/phones/', {'limit': size})
+            json_size = len(response.content)
+            totals = [json_size, json_size, json_size]
+            for phone in Phone.objects.order_by('id')[:size]:
+                name = phone.image.name
+                totals[0] += self.file_size(name)
+                thumbnail = variant_name(name, THUMBNAIL_SIZE)
+                totals[1] += self.file_size(thumbnail)
+                totals[2] += self.file_size(
+                    variant_name(name, THUMBNAIL_SIZE, 'webp')
+                )
+            print('%10d %10d %14d %14d %14d' % (size, json_size, *totals))
@@ -0,0 +1,42 @@
+import time
+
+from phones.models import Phone
+from test_worker import WorkerDatabaseTestCase, json_phone
+import worker
+
+
+class IngestBenchmark(WorkerDatabaseTestCase):
+    '''
+    Rows per second loading a generated JSON catalog, one phone per
+    transaction (worker.readfile) and in batches (worker.readfile_bulk).
+    '''
+    size = 100000
+    row_by_row_size = 2000
+
+    def catalog(self, size):
+        return [
+            json_phone(
+                i, company='Company %d' % (i % 50), info='Lorem ipsum. ' * 40
+            )
+            for i in range(size)
+        ]
+
+    def test_rows_per_second(self):
+        path = self.write_json(self.catalog(self.row_by_row_size))
+        start = time.perf_counter()
+        worker.readfile(path)
+        row_by_row = self.row_by_row_size / (time.perf_counter() - start)
+        Phone.objects.all().delete()
+
+        path = self.write_json(self.catalog(self.size))
+        print('\n%-24s %8s %12s' % ('mode', 'phones', 'rows/s'))
+        print('%-24s %8d %12.0f' % (
+            'readfile', self.row_by_row_size, row_by_row
+        ))
+        for batch_size in [100, 1000, 5000]:
+            Phone.objects.all().delete()
+            total, rate = worker.readfile_bulk(path, batch_size=batch_size)
+            self.assertEqual(Phone.objects.count(), self.size)
+            print('%-24s %8d %12.0f' % (
+                'readfile_bulk (%d)' % batch_size, total, rate
+            ))
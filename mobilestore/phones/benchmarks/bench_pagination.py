@@ -0,0 +1,46 @@
+from django.db import connection
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from phones.models import Phone
+from phones.pagination import PhonesKeysetPagination
+from . import NO_CACHE, create_catalog, timed
+
+
+@override_settings(CACHES=NO_CACHE)
+class PaginationBenchmark(APITestCase):
+    ''' Page latency at growing depths, with offset and keyset pagination. '''
+    size = 110000
+    depths = [0, 10000, 100000]
+
+    @classmethod
+    def setUpTestData(cls):
+        create_catalog(cls.size)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE phones_phone;')
+
+    def keyset_cursor(self, ordering, depth):
+        # Cursor pointing right before the row at the given depth
+        if depth == 0:
+            return ''
+        paginator = PhonesKeysetPagination()
+        paginator.ordering = ordering
+        keys = paginator.orderings[ordering]
+        row = Phone.objects.order_by(*keys)[depth - 1]
+        return paginator.encode_cursor(row)
+
+    def test_page_latency(self):
+        print('\n%-22s %10s %12s' % ('mode', 'offset', 'median (ms)'))
+        for depth in self.depths:
+            url = '/api/phones/?limit=20&offset=%d' % depth
+            ms = timed(lambda: self.client.get(url))
+            print('%-22s %10d %12.2f' % ('offset', depth, ms))
+
+        for ordering in PhonesKeysetPagination.orderings:
+            for depth in self.depths:
+                cursor = self.keyset_cursor(ordering, depth)
+                url = '/api/phones/?limit=20&ordering=%s&cursor=%s' % (
+                    ordering, cursor
+                )
+                ms = timed(lambda: self.client.get(url))
+                print('%-22s %10d %12.2f' % ('keyset ' + ordering, depth, ms))
@@ -0,0 +1,47 @@
+from django.db import connection
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from phones.models import Phone, Company
+from phones.search import search
+from . import NO_CACHE, create_catalog, timed
+
+
+@override_settings(CACHES=NO_CACHE)
+class SearchBenchmark(APITestCase):
+    ''' Full text search relevance and latency on a 100k phones catalog. '''
+    size = 100000
+
+    @classmethod
+    def setUpTestData(cls):
+        create_catalog(cls.size)
+        maker = Company.objects.create(name='Nokia')
+        # A phone named after the words searched, and others only
+        # mentioning them in their description
+        cls.target = Phone.objects.create(
+            model='Lumia Aurora', manufacturer=maker, price=500,
+            description='A phone.', specs={}, stock=1
+        )
+        for i in range(50):
+            Phone.objects.create(
+                model='Other %d' % i, manufacturer=maker, price=500,
+                description='Lighter than the Lumia Aurora.', specs={},
+                stock=1
+            )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE phones_phone;')
+
+    def test_relevance(self):
+        response = self.client.get('/api/phones/', {'q': 'lumia aurora'})
+        self.assertEqual(response.data[0]['id'], self.target.id)
+        self.assertEqual(len(search(Phone.objects, 'lumia aurora')), 51)
+
+    def test_latency(self):
+        print('\n%-28s %12s' % ('query', 'median (ms)'))
+        for text in ['lumia aurora', 'phone 4242', 'company']:
+            ms = timed(lambda: list(search(Phone.objects.all(), text)[:20]))
+            print('%-28s %12.2f' % ('search "%s"' % text, ms))
+            ms = timed(lambda: list(Phone.objects.filter(
+                description__icontains=text
+            )[:20]))
+            print('%-28s %12.2f' % ('icontains "%s"' % text, ms))
@@ -0,0 +1,54 @@
+import time
+
+from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from phones.serializers import PhoneListSerializer, PhoneListFastSerializer
+from . import create_catalog
+
+
+class ListSerializerBenchmark(TestCase):
+    '''
+    Phone list serializations per second - reading a page of rows, serializing
+    and rendering it to JSON - with the model serializer and the fast path.
+    '''
+    page_sizes = [8, 20, 1000]
+    duration = 1.0
+
+    @classmethod
+    def setUpTestData(cls):
+        create_catalog(max(cls.page_sizes))
+
+    def per_second(self, serializer_class, queryset, request):
+        count = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < self.duration:
+            serializer = serializer_class(
+                queryset.all(), many=True, context={'request': request}
+            )
+            JSONRenderer().render(serializer.data)
+            count += 1
+        return count / (time.perf_counter() - start)
+
+    def test_serializations_per_second(self):
+        request = APIRequestFactory().get('/api/phones/')
+        print('\n%10s %14s %14s %8s' % (
+            'page size', 'model (/s)', 'fast (/s)', 'speedup'
+        ))
+        for size in self.page_sizes:
+            model = self.per_second(
+                PhoneListSerializer,
+                PhoneListSerializer.get_queryset(
+                    PhoneListSerializer.Meta.default_fields
+                )[:size],
+                request
+            )
+            fast = self.per_second(
+                PhoneListFastSerializer,
+                PhoneListFastSerializer.get_queryset()[:size],
+                request
+            )
+            print('%10d %14.1f %14.1f %7.2fx' % (
+                size, model, fast, fast / model
+            ))
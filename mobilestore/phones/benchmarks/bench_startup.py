@@ -0,0 +1,130 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+from urllib.error import URLError
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.db import connection
+from django.test import TransactionTestCase
+
+from . import create_catalog
+from .servers import INTERFACES, Server
+
+IMPORTS = [
+    ('python', 'pass'),
+    ('django.setup()', 'import django; django.setup()'),
+    ('mobilestore.wsgi', 'import mobilestore.wsgi'),
+    ('mobilestore.asgi', 'import mobilestore.asgi'),
+]
+
+
+def worker_pids(pid):
+    ''' Returns the ids of the child processes of a process (list). '''
+    pids = []
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open('/proc/%s/stat' % name) as stat:
+                # The name of the command, in brackets, may contain spaces
+                fields = stat.read().rsplit(')', 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if int(fields[1]) == pid:
+            pids.append(int(name))
+    return pids
+
+
+def memory(pid):
+    '''
+    Returns the proportional set size (memory shared with other processes
+    counting in part) and the private memory of a process, in kB.
+    '''
+    sizes = {}
+    with open('/proc/%d/smaps_rollup' % pid) as rollup:
+        for line in rollup:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                sizes[name] = int(value.split()[0]) if value.split() else 0
+    return sizes['Pss'], sizes['Private_Clean'] + sizes['Private_Dirty']
+
+
+class StartupBenchmark(TransactionTestCase):
+    '''
+    Import time of the application, and cold start of gunicorn with the
+    project's configuration (gunicorn.conf.py): time until it listens, and
+    until it answers a first request, and memory of its workers, with the
+    application loaded by each worker or once before forking (PRELOAD_APP).
+    '''
+    size = 1000
+    runs = 5
+    workers = 4
+    url = '/api/phones/?limit=1'
+
+    def setUp(self):
+        create_catalog(self.size)
+        self.env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE='mobilestore.benchmark_settings',
+            BENCHMARK_DATABASE=connection.settings_dict['NAME'],
+        )
+
+    def import_time(self, code):
+        seconds = []
+        for _ in range(self.runs):
+            start = time.perf_counter()
+            subprocess.run(
+                [sys.executable, '-c', code], cwd=settings.BASE_DIR,
+                env=self.env, check=True
+            )
+            seconds.append(time.perf_counter() - start)
+        return statistics.median(seconds)
+
+    def test_imports(self):
+        print('\n%-20s %8s' % ('import', 'ms'))
+        for name, code in IMPORTS:
+            print('%-20s %8.0f' % (name, self.import_time(code) * 1000))
+
+    def first_response(self, server, timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                with urlopen(server.url + self.url) as response:
+                    self.assertEqual(response.status, 200)
+                    return
+            except (URLError, ConnectionError):
+                time.sleep(0.01)
+        self.fail('No response from the %s server.' % server.interface)
+
+    def cold_start(self, interface, preload):
+        start = time.perf_counter()
+        with Server(interface, connection.settings_dict['NAME'],
+                workers=self.workers, preload=preload) as server:
+            listening = time.perf_counter() - start
+            self.first_response(server)
+            answered = time.perf_counter() - start
+            # Until every worker has loaded the application
+            time.sleep(3)
+            pids = worker_pids(server.process.pid)
+            self.assertEqual(len(pids), self.workers)
+            sizes = [memory(pid) for pid in pids]
+        return listening, answered, sizes
+
+    def test_cold_start(self):
+        print('\n%-6s %-8s %8s %10s %12s %12s' % (
+            'server', 'preload', 'ready_ms', 'first_ms', 'pss_kb',
+            'private_kb'
+        ))
+        for interface in INTERFACES:
+            for preload in [False, True]:
+                listening, answered, sizes = self.cold_start(
+                    interface, preload
+                )
+                print('%-6s %-8s %8.0f %10.0f %12d %12d' % (
+                    interface, preload, listening * 1000, answered * 1000,
+                    sum(pss for pss, _ in sizes) / len(sizes),
+                    sum(private for _, private in sizes) / len(sizes)
+                ))
@@ -0,0 +1,98 @@
+import random
+import threading
+import time
+
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test import TransactionTestCase
+
+from phones.models import Phone, Company
+from phones.stock import reserve, OutOfStock
+
+
+def naive_reserve(items):
+    ''' Read-modify-write reservation, for comparison - loses updates. '''
+    with transaction.atomic():
+        phones = Phone.objects.in_bulk(list(items))
+        for phone_id, quantity in sorted(items.items()):
+            phone = phones[phone_id]
+            if phone.stock < quantity:
+                raise OutOfStock('Not enough stock of phone %d.', phone_id)
+            phone.stock -= quantity
+            phone.save(update_fields=['stock'])
+
+
+class StockContentionBenchmark(TransactionTestCase):
+    '''
+    Threads reserving random carts of a few phones until they are sold out:
+    the units reserved must match the initial stock exactly (no overselling),
+    with the conditional updates, while the naive read-modify-write version
+    sells more phones than there are.
+    '''
+    phones = 20
+    stock = 250
+    threads = 16
+
+    def setUp(self):
+        company = Company.objects.create(name='Company')
+        Phone.objects.bulk_create(
+            Phone(
+                model='Phone %d' % i, manufacturer=company, price=100,
+                description='', specs={}, stock=self.stock,
+            )
+            for i in range(self.phones)
+        )
+        self.ids = list(Phone.objects.values_list('id', flat=True))
+
+    def run_threads(self, reserve_cart):
+        ''' Returns the units reserved, carts reserved, and seconds taken. '''
+        units = []
+        carts = []
+
+        def buy(seed):
+            random_ = random.Random(seed)
+            try:
+                failures = 0
+                while failures < 50:
+                    cart = {
+                        phone_id: random_.randint(1, 2)
+                        for phone_id in random_.sample(
+                            self.ids, random_.randint(1, 3)
+                        )
+                    }
+                    try:
+                        reserve_cart(cart)
+                        units.append(sum(cart.values()))
+                        carts.append(1)
+                    except OutOfStock:
+                        failures += 1
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=buy, args=(seed,))
+            for seed in range(self.threads)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return sum(units), len(carts), time.perf_counter() - start
+
+    def test_contention(self):
+        initial = self.phones * self.stock
+        print('\n%-10s %10s %10s %10s %14s' % (
+            'reserve', 'stock', 'sold', 'left', 'carts/s'
+        ))
+        versions = [('atomic', reserve), ('naive', naive_reserve)]
+        for name, reserve_cart in versions:
+            Phone.objects.update(stock=self.stock)
+            sold, carts, seconds = self.run_threads(reserve_cart)
+            left = Phone.objects.aggregate(left=Sum('stock'))['left']
+            print('%-10s %10d %10d %10d %14.0f' % (
+                name, initial, sold, left, carts / seconds
+            ))
+            if reserve_cart is reserve:
+                self.assertEqual(sold + left, initial)
+                self.assertFalse(Phone.objects.filter(stock__lt=0).exists())
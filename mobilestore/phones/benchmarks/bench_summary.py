@@ -0,0 +1,84 @@
+import json
+from unittest import mock
+
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from phones.api import PhoneViewSet
+from phones.pagination import PhonesKeysetPagination
+from phones.models import Phone
+from . import NO_CACHE, create_catalog, timed
+
+
+@override_settings(CACHES=NO_CACHE)
+class SummaryBenchmark(TransactionTestCase):
+    '''
+    Phone list read from the phone_summary read model, against phones_phone:
+    shared buffers touched by its queries (hit in memory, or read), and
+    latency. The tables are vacuumed first, as after autovacuum, so that
+    index only scans are possible.
+    '''
+    size = 100000
+    urls = [
+        '/api/phones/?limit=20',
+        '/api/phones/?limit=20&offset=50000',
+        '/api/phones/?limit=20&ordering=price&cursor=',
+        '/api/phones/?limit=20&ordering=price&cursor={cursor}',
+        '/api/phones/?limit=20&in_stock=1&min_price=1500',
+    ]
+
+    def setUp(self):
+        create_catalog(self.size)
+        with connection.cursor() as cursor:
+            for table in ['phones_phone', 'phone_summary']:
+                cursor.execute('VACUUM ANALYZE %s;' % table)
+
+    def price_cursor(self, depth):
+        paginator = PhonesKeysetPagination()
+        paginator.ordering = 'price'
+        return paginator.encode_cursor(
+            Phone.objects.order_by('price', 'id')[depth - 1]
+        )
+
+    def buffers(self, url):
+        ''' Returns the shared buffers hit and read by a request's queries. '''
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        hit = read = 0
+        with connection.cursor() as cursor:
+            for query in queries:
+                cursor.execute(
+                    'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + query['sql']
+                )
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                hit += plan[0]['Plan']['Shared Hit Blocks']
+                read += plan[0]['Plan']['Shared Read Blocks']
+        return hit, read
+
+    def test_buffers_and_latency(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                '''SELECT relname, pg_relation_size(oid) / 8192
+                FROM pg_class WHERE relname IN ('phones_phone', 'phone_summary')
+                ORDER BY relname;'''
+            )
+            print('\n' + ', '.join(
+                '%s: %d pages' % row for row in cursor.fetchall()
+            ))
+        cursor = self.price_cursor(self.size // 2)
+        print('%-52s %-8s %8s %8s %8s' % (
+            'request', 'table', 'hit', 'read', 'ms'
+        ))
+        for url in self.urls:
+            url = url.format(cursor=cursor)
+            for table, summary in [('phone', False), ('summary', True)]:
+                with mock.patch.object(
+                        PhoneViewSet, 'reads_summary', return_value=summary):
+                    hit, read = self.buffers(url)
+                    milliseconds = timed(lambda: self.client.get(url))
+                print('%-52s %-8s %8d %8d %8.2f' % (
+                    url[:52], table, hit, read, milliseconds
+                ))
@@ -0,0 +1,85 @@
+import os
+import time
+
+import boto3
+from django.test import SimpleTestCase
+
+import s3upload
+from phones import images
+from test_worker import S3Server
+
+
+class UploadBenchmark(SimpleTestCase):
+    '''
+    Images uploaded per second to a local S3 stand-in, with a latency per
+    request as from a host to S3: one put_object at a time, with a new client
+    for each phone (as worker.save_images did before), and with S3Uploader -
+    concurrent uploads on a shared client, then again with every object
+    already in the bucket.
+    '''
+    size = 2000 # Images, 4 per phone (see phones.images.build_variants)
+    sequential_size = 400 # Images uploaded one at a time (slow)
+    image_size = 20 * 1024 # Bytes
+    latency = 0.03 # Seconds
+
+    def setUp(self):
+        self.server = S3Server(self.latency).__enter__()
+        self.addCleanup(self.server.__exit__)
+        self.variants = [
+            ('img/%d.jpg' % i, 'image/jpeg', os.urandom(self.image_size))
+            for i in range(self.size)
+        ]
+
+    def put_objects(self):
+        for start in range(0, self.sequential_size, 4):
+            s3 = boto3.client(
+                's3', endpoint_url=self.server.url, region_name='us-east-1',
+                aws_access_key_id='key', aws_secret_access_key='secret'
+            )
+            for name, content_type, data in self.variants[start:start + 4]:
+                s3.put_object(
+                    Bucket='bucket', Key=name, Body=data,
+                    ContentType=content_type,
+                    CacheControl=images.CACHE_CONTROL
+                )
+
+    def upload(self, workers):
+        uploader = s3upload.S3Uploader(
+            'bucket', self.server.client(workers), workers,
+            cache_control=images.CACHE_CONTROL
+        )
+        for name, content_type, data in self.variants:
+            uploader.upload(name, data, content_type)
+        stats = uploader.close()
+        self.assertEqual(stats['failed'], 0)
+
+    def run_mode(self, mode, upload, size):
+        requests = sum(self.server.requests.values())
+        start = time.perf_counter()
+        upload()
+        seconds = time.perf_counter() - start
+        print('%-36s %8d %10.0f %8.2f %10d' % (
+            mode, size, size / seconds,
+            size * self.image_size / seconds / 1024 / 1024,
+            sum(self.server.requests.values()) - requests
+        ))
+
+    def test_throughput(self):
+        print('\n%-36s %8s %10s %8s %10s' % (
+            'mode', 'images', 'images/s', 'MB/s', 'requests'
+        ))
+        self.run_mode(
+            'put_object, client per phone', self.put_objects,
+            self.sequential_size
+        )
+        for workers in [8, 16, 32]:
+            self.server.objects.clear()
+            self.run_mode(
+                'S3Uploader (%d workers)' % workers,
+                lambda: self.upload(workers), self.size
+            )
+        self.run_mode(
+            'S3Uploader (32 workers), all skipped', lambda: self.upload(32),
+            self.size
+        )
+        self.assertEqual(len(self.server.objects), self.size)
@@ -0,0 +1,250 @@
+'''
+Load benchmark - drives API requests through the WSGI application,
+in-process, with a number of concurrent clients, and reports latency
+percentiles, throughput and SQL queries per request as JSON, to be compared
+between commits (see the loadbench command).
+'''
+import io
+import json
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urlsplit
+
+from django.db import connections
+
+from mobilestore.querybudget import query_budget
+from phones.models import Phone
+from phones.pagination import PhonesKeysetPagination
+
+REPORT_VERSION = 1
+SCENARIOS = [
+    'list', 'list_20', 'detail', 'deep_offset', 'deep_keyset', 'filter',
+    'search'
+]
+
+
+def scenarios(seed=0):
+    '''
+    Returns the benchmark scenarios for the phones in the database (at least
+    10): a dict of functions returning the url of the next request of each
+    scenario.
+    '''
+    random_ = random.Random(seed)
+    ids = list(Phone.objects.order_by('id').values_list('id', flat=True))
+    deep = int(len(ids) * 0.9)
+    paginator = PhonesKeysetPagination()
+    paginator.ordering = 'id'
+    cursor = quote(paginator.encode_cursor(Phone(id=ids[deep - 1])))
+
+    def price_range():
+        price = random_.randint(100, 1900)
+        return '/api/phones/?min_price=%d&max_price=%d' % (price, price + 100)
+
+    return {
+        'list': lambda: '/api/phones/',
+        'list_20': lambda: '/api/phones/?limit=20',
+        'detail': lambda: '/api/phones/%d/' % random_.choice(ids),
+        'deep_offset': lambda: '/api/phones/?limit=20&offset=%d' % deep,
+        'deep_keyset': lambda: '/api/phones/?limit=20&cursor=%s' % cursor,
+        'filter': price_range,
+        'search': lambda: '/api/phones/?q=%s' % random_.choice([
+            'battery', 'camera', 'display', 'fingerprint', 'phone'
+        ]),
+    }
+
+
+def make_environ(url):
+    ''' Returns the WSGI environ of a GET request. '''
+    parts = urlsplit(url)
+    return {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': parts.path,
+        'QUERY_STRING': parts.query,
+        'SERVER_NAME': 'testserver',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'testserver',
+        'HTTP_ACCEPT': 'application/json',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+
+
+def call(application, url):
+    '''
+    Runs a request through a WSGI application.
+
+    Requires:
+        - application (callable): WSGI application;
+        - url (str): path and query string.
+    Ensures:
+        Returns the status code (int), response size (int, bytes), time
+        taken (float, seconds) and SQL queries run (int).
+    '''
+    status = []
+
+    def start_response(status_line, headers, exc_info=None):
+        status.append(int(status_line.split()[0]))
+
+    start = time.perf_counter()
+    with query_budget(None) as queries:
+        result = application(make_environ(url), start_response)
+        try:
+            size = sum(len(chunk) for chunk in result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+    return status[0], size, time.perf_counter() - start, queries.count
+
+
+def percentile(values, percent):
+    ''' Returns a percentile of sorted values (nearest rank). '''
+    if not values:
+        return None
+    rank = int(round(percent / 100 * len(values))) - 1
+    return values[max(0, min(len(values) - 1, rank))]
+
+
+def run_scenario(application, next_url, requests, concurrency):
+    '''
+    Sends requests from concurrent clients (threads, each with its own
+    database connection).
+
+    Requires:
+        - application (callable): WSGI application;
+        - next_url (callable): returns the url of the next request;
+        - requests (int): number of requests;
+        - concurrency (int): number of concurrent clients.
+    Ensures:
+        Returns the results of the scenario (dict): latency percentiles and
+        mean (ms), throughput (requests/s), queries and bytes per request,
+        and number of errors (responses other than 200).
+    '''
+    lock = threading.Lock()
+    urls = [next_url() for _ in range(requests)]
+    results = []
+
+    def client(urls):
+        try:
+            for url in urls:
+                result = call(application, url)
+                with lock:
+                    results.append(result)
+        finally:
+            connections.close_all()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        for future in [
+            executor.submit(client, urls[i::concurrency])
+            for i in range(concurrency)
+        ]:
+            future.result()
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(seconds * 1000 for _, _, seconds, _ in results)
+    return {
+        'requests': len(results),
+        'concurrency': concurrency,
+        'errors': sum(1 for status, _, _, _ in results if status != 200),
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'mean_ms': sum(latencies) / len(latencies),
+        'throughput_rps': len(results) / elapsed,
+        'queries_per_request': sum(r[3] for r in results) / len(results),
+        'bytes_per_request': sum(r[1] for r in results) / len(results),
+    }
+
+
+def git_commit():
+    ''' Returns the current git commit, if any. '''
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_load(application, requests=200, concurrency=(1, 8), names=None,
+        warmup=10):
+    '''
+    Runs the benchmark scenarios at each concurrency level.
+
+    Requires:
+        - application (callable): WSGI application;
+        - requests (int - optional): requests per scenario and level;
+        - concurrency (iterable - optional): numbers of concurrent clients;
+        - names (iterable - optional): scenarios run, or else all of them;
+        - warmup (int - optional): requests sent first, not measured.
+    Ensures:
+        Returns the report (dict): commit, catalog size, and the results of
+        each scenario at each concurrency level.
+    '''
+    all_scenarios = scenarios()
+    report = {
+        'version': REPORT_VERSION,
+        'commit': git_commit(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'phones': Phone.objects.count(),
+        'results': {},
+    }
+    for name in names or SCENARIOS:
+        next_url = all_scenarios[name]
+        for _ in range(warmup):
+            call(application, next_url())
+        report['results'][name] = [
+            run_scenario(application, next_url, requests, level)
+            for level in concurrency
+        ]
+    return report
+
+
+def format_report(report, baseline=None):
+    '''
+    Returns a table of the results of a report (str) - with the change from
+    a baseline report, when given.
+    '''
+    columns = ['p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps',
+        'queries_per_request']
+    lines = ['%-12s %5s %s' % (
+        'scenario', 'conc.', ' '.join('%19s' % column for column in columns)
+    )]
+    for name, results in report['results'].items():
+        old_results = (baseline or {}).get('results', {}).get(name, [])
+        old_levels = {old['concurrency']: old for old in old_results}
+        for result in results:
+            old = old_levels.get(result['concurrency'])
+            cells = []
+            for column in columns:
+                cell = '%.2f' % result[column]
+                if old and old[column]:
+                    cell += ' (%+.0f%%)' % (
+                        (result[column] - old[column]) / old[column] * 100
+                    )
+                cells.append('%19s' % cell)
+            lines.append('%-12s %5d %s' % (
+                name, result['concurrency'], ' '.join(cells)
+            ))
+    return '\n'.join(lines)
+
+
+def save_report(report, path):
+    with open(path, 'w') as file:
+        json.dump(report, file, indent=2, sort_keys=True)
+
+
+def load_report(path):
+    with open(path) as file:
+        return json.load(file)
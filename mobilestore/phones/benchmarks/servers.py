@@ -0,0 +1,266 @@
+'''
+Concurrency benchmark - starts the API behind gunicorn in each server mode
+(sync WSGI workers, or uvicorn ASGI workers - see gunicorn.conf.py), and
+measures the requests per second and latency percentiles seen by 10, 100 and
+1000 concurrent HTTP clients (see the servebench command).
+'''
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from .load import percentile
+
+INTERFACES = ['wsgi', 'asgi']
+CONCURRENCY = [10, 100, 1000]
+REQUEST_TIMEOUT = 60.0 # Seconds before a request counts as an error
+# gunicorn, run with the current interpreter (19.x has no __main__ module)
+RUN_GUNICORN = 'from gunicorn.app.wsgiapp import run; run()'
+
+
+class DatabaseLatencyMiddleware(object):
+    '''
+    Adds a delay to every SQL query (BENCHMARK_DB_LATENCY, in milliseconds),
+    like a database on another host, or a busy one.
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.latency = float(os.environ.get('BENCHMARK_DB_LATENCY', 0)) / 1000
+
+    def __call__(self, request):
+        with connection.execute_wrapper(self.delay):
+            return self.get_response(request)
+
+    def delay(self, execute, sql, params, many, context):
+        time.sleep(self.latency)
+        return execute(sql, params, many, context)
+
+
+def free_port():
+    ''' Returns a TCP port nobody is listening to. '''
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Server(object):
+    '''
+    Context manager running gunicorn in a server mode, on the benchmark
+    settings (mobilestore.benchmark_settings):
+
+        with Server('asgi', database='test_mobilestore') as server:
+            urlopen(server.url + '/api/phones/')
+    '''
+
+    def __init__(self, interface, database, workers=1, threads=None,
+            cache=False, db_latency=0, preload=True):
+        '''
+        Requires:
+            - interface (str): 'wsgi' or 'asgi';
+            - database (str): name of the database served;
+            - workers (int - optional): gunicorn worker processes;
+            - threads (int - optional): ASGI_THREADS of each process;
+            - cache (bool - optional): keep the response cache on;
+            - db_latency (float - optional): milliseconds added to every SQL
+            query;
+            - preload (bool - optional): load the application before forking
+            the workers (PRELOAD_APP).
+        '''
+        self.interface = interface
+        self.database = database
+        self.workers = workers
+        self.threads = threads
+        self.cache = cache
+        self.db_latency = db_latency
+        self.preload = preload
+        self.port = free_port()
+        self.url = 'http://127.0.0.1:%d' % self.port
+
+    def __enter__(self):
+        env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE='mobilestore.benchmark_settings',
+            BENCHMARK_DATABASE=self.database,
+            SERVER_INTERFACE=self.interface,
+            WEB_CONCURRENCY=str(self.workers),
+            PRELOAD_APP=str(self.preload).lower(),
+        )
+        if self.cache:
+            env['BENCHMARK_CACHE'] = '1'
+        if self.threads:
+            env['ASGI_THREADS'] = str(self.threads)
+        if self.db_latency:
+            env['BENCHMARK_DB_LATENCY'] = str(self.db_latency)
+        config = os.path.join(settings.BASE_DIR, 'gunicorn.conf.py')
+        self.process = subprocess.Popen(
+            [
+                sys.executable, '-c', RUN_GUNICORN,
+                '--config', config,
+                '--bind', '127.0.0.1:%d' % self.port,
+                '--backlog', '2048',
+                '--timeout', '120',
+                '--log-level', 'warning',
+                'mobilestore.%s' % self.interface,
+            ],
+            cwd=settings.BASE_DIR, env=env
+        )
+        try:
+            self.wait_ready()
+        except Exception:
+            self.__exit__(None, None, None)
+            raise
+        return self
+
+    def wait_ready(self, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(
+                    'The %s server exited (%d).'
+                    % (self.interface, self.process.returncode)
+                )
+            try:
+                socket.create_connection(('127.0.0.1', self.port), 1).close()
+                return
+            except OSError:
+                time.sleep(0.1)
+        raise RuntimeError('The %s server did not start.' % self.interface)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.process.terminate()
+        try:
+            self.process.wait(30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.wait_disconnected()
+
+    def wait_disconnected(self, timeout=10):
+        # Connections of the workers end after them (and the test database
+        # can't be dropped until then)
+        deadline = time.monotonic() + timeout
+        with connection.cursor() as cursor:
+            while time.monotonic() < deadline:
+                cursor.execute(
+                    'SELECT count(*) FROM pg_stat_activity WHERE datname = %s '
+                    'AND pid <> pg_backend_pid()', [self.database]
+                )
+                if not cursor.fetchone()[0]:
+                    return
+                time.sleep(0.05)
+
+
+async def fetch(port, url):
+    '''
+    Sends a GET request on a new connection, and reads the whole response.
+
+    Ensures: Returns the status code (int).
+    '''
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write((
+            'GET %s HTTP/1.1\r\n'
+            'Host: 127.0.0.1:%d\r\n'
+            'Accept: application/json\r\n'
+            'Connection: close\r\n\r\n' % (url, port)
+        ).encode('latin-1'))
+        head = await reader.readuntil(b'\r\n\r\n')
+        # Not every server closes the connection right after the response
+        lines = head.decode('latin-1').split('\r\n')
+        headers = dict(
+            line.lower().split(': ', 1) for line in lines[1:] if ': ' in line
+        )
+        if 'content-length' in headers:
+            await reader.readexactly(int(headers['content-length']))
+        else:
+            await reader.read()
+        return int(lines[0].split()[1])
+    finally:
+        writer.close()
+
+
+async def run_clients(port, next_url, clients, duration):
+    '''
+    Clients sending requests one after the other, for some time.
+
+    Requires:
+        - port (int): port of the server;
+        - next_url (callable): returns the url of the next request;
+        - clients (int): number of concurrent clients;
+        - duration (float): seconds clients start new requests for.
+    Ensures:
+        Returns the status (int, or None on errors) and seconds taken by each
+        request, and the total seconds taken.
+    '''
+    results = []
+    start = time.perf_counter()
+    deadline = start + duration
+
+    async def client():
+        while time.perf_counter() < deadline:
+            sent = time.perf_counter()
+            try:
+                status = await asyncio.wait_for(
+                    fetch(port, next_url()), REQUEST_TIMEOUT
+                )
+            except (OSError, ValueError, IndexError, asyncio.TimeoutError,
+                    asyncio.IncompleteReadError):
+                status = None
+            results.append((status, time.perf_counter() - sent))
+
+    await asyncio.gather(*[client() for _ in range(clients)])
+    return results, time.perf_counter() - start
+
+
+def run_level(port, next_url, clients, duration):
+    '''
+    Runs the clients on a new event loop.
+
+    Ensures:
+        Returns the results of the level (dict): latency percentiles (ms),
+        successful requests per second, and number of errors (failed requests
+        and responses other than 200).
+    '''
+    loop = asyncio.new_event_loop()
+    try:
+        results, elapsed = loop.run_until_complete(
+            run_clients(port, next_url, clients, duration)
+        )
+    finally:
+        loop.close()
+    latencies = sorted(seconds * 1000 for _, seconds in results)
+    errors = sum(1 for status, _ in results if status != 200)
+    return {
+        'concurrency': clients,
+        'requests': len(results),
+        'errors': errors,
+        'rps': (len(results) - errors) / elapsed,
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'max_ms': latencies[-1] if latencies else None,
+    }
+
+
+def format_results(results):
+    '''
+    Returns a table of the results (str): a list of dicts, as returned by
+    run_level, with the `interface` of each one.
+    '''
+    lines = ['%-6s %6s %8s %7s %10s %10s %10s %10s' % (
+        'server', 'conc.', 'requests', 'errors', 'req/s', 'p50_ms', 'p95_ms',
+        'p99_ms'
+    )]
+    for result in results:
+        lines.append('%-6s %6d %8d %7d %10.1f %10.1f %10.1f %10.1f' % (
+            result['interface'], result['concurrency'], result['requests'],
+            result['errors'], result['rps'], result['p50_ms'],
+            result['p95_ms'], result['p99_ms']
+        ))
+    return '\n'.join(lines)
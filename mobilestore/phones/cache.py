@@ -0,0 +1,118 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from mobilestore.metrics import CACHE_REQUESTS
+
+CATALOG_VERSION_KEY = 'phones:catalog-version'
+
+
+def get_cache():
+    ''' Returns the cache backend used by the phones API (PHONES_CACHE). '''
+    return caches[getattr(settings, 'PHONES_CACHE', 'default')]
+
+
+def is_local_cache():
+    '''
+    Returns whether the cache backend lives in the process memory, so that
+    reading from it never waits on the network.
+    '''
+    return isinstance(get_cache(), LocMemCache)
+
+
+def catalog_version():
+    '''
+    Returns the current version of the catalog, which is part of every cached
+    response key.
+    If the version is missing (first use, or evicted), a new one is made from
+    the clock, so that keys from before can never be reached again.
+    '''
+    cache = get_cache()
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version(**kwargs):
+    '''
+    Invalidates every cached response at once, by moving on to a new catalog
+    version. Can be used as a signal receiver.
+    '''
+    cache = get_cache()
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOG_VERSION_KEY, int(time.time() * 1000), None)
+
+
+def response_cache_key(request):
+    ''' Returns the key of the cached response to a request. '''
+    # Absolute urls in the content depend on the host, and the format on the
+    # Accept header
+    url = request.build_absolute_uri()
+    accept = request.META.get('HTTP_ACCEPT', '')
+    digest = hashlib.md5(('%s|%s' % (url, accept)).encode('utf-8'))
+    return 'phones:response:%s:%s' % (catalog_version(), digest.hexdigest())
+
+
+class CatalogCacheMixin(object):
+    '''
+    Viewset mixin caching rendered JSON responses to GET requests, under the
+    current catalog version, and answering them with a strong ETag, or with
+    304 Not Modified when the client already has it (If-None-Match).
+    Cached responses skip authentication and permissions, so this is only
+    meant for public, read-only views. A cached response already read for the
+    request (`catalog_cached` attribute) is used as is.
+    '''
+    cache_methods = ('GET',)
+    cache_formats = ('json',)
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in self.cache_methods:
+            return super().dispatch(request, *args, **kwargs)
+
+        cache = get_cache()
+        key = self.get_cache_key(request)
+        cached = getattr(request, 'catalog_cached', None) or cache.get(key)
+        if cached is not None:
+            CACHE_REQUESTS.labels('hit').inc()
+            response = HttpResponse(cached['content'])
+            for header, value in cached['headers']:
+                response[header] = value
+            return get_conditional_response(
+                request, etag=response['ETag'], response=response
+            )
+
+        CACHE_REQUESTS.labels('miss').inc()
+        response = super().dispatch(request, *args, **kwargs)
+        if not self.is_cacheable(response):
+            return response
+
+        response.render()
+        etag = quote_etag(hashlib.md5(response.content).hexdigest())
+        response['ETag'] = etag
+        cache.set(
+            key,
+            {'content': response.content, 'headers': list(response.items())},
+            getattr(settings, 'PHONES_CACHE_TIMEOUT', 300)
+        )
+        return get_conditional_response(request, etag=etag, response=response)
+
+    def get_cache_key(self, request):
+        return response_cache_key(request)
+
+    def is_cacheable(self, response):
+        renderer = getattr(response, 'accepted_renderer', None)
+        return (
+            response.status_code == 200
+            and renderer is not None
+            and renderer.format in self.cache_formats
+        )
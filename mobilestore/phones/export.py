@@ -0,0 +1,117 @@
+import csv
+import io
+import json
+from functools import lru_cache
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from .images import variant_name
+from .serializers import image_url
+
+# Rows read from the database cursor at a time, and rows per chunk of output
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FIELDS = [
+    'id', 'manufacturer', 'model', 'image', 'image_webp', 'price',
+    'description', 'specs', 'stock'
+]
+EXPORT_COLUMNS = [
+    'id', 'manufacturer__name', 'model', 'image', 'price', 'description',
+    'specs', 'stock'
+]
+
+
+def export_rows(queryset, request=None, chunk_size=EXPORT_CHUNK_SIZE):
+    '''
+    Reads phones for the export, with a server-side cursor, so that only one
+    chunk of rows is in memory at a time.
+
+    Requires:
+        - queryset (QuerySet): phones, as values_list(*EXPORT_COLUMNS,
+        named=True) rows;
+        - request (HttpRequest - optional): makes image urls absolute;
+        - chunk_size (int - optional): rows fetched at a time.
+    Ensures:
+        Yields a dict for each phone, with the fields of the phone detail.
+    '''
+    @lru_cache(maxsize=1024)
+    def image_urls(name):
+        # Many phones share the same (default) image
+        return (
+            image_url(name, request),
+            image_url(variant_name(name, extension='webp'), request)
+        )
+
+    for row in queryset.iterator(chunk_size=chunk_size):
+        image, image_webp = image_urls(row.image)
+        yield {
+            'id': row.id,
+            'manufacturer': row.manufacturer__name,
+            'model': row.model,
+            'image': image,
+            'image_webp': image_webp,
+            'price': row.price,
+            'description': row.description,
+            'specs': row.specs,
+            'stock': row.stock,
+        }
+
+
+class StreamingRenderer(BaseRenderer):
+    '''
+    Renderer for exports - encodes rows one chunk at a time, for
+    StreamingHttpResponse, instead of rendering all the data at once. Error
+    responses (e.g. invalid filters) are not rows, and are sent as JSON.
+    '''
+    charset = 'utf-8'
+    chunk_size = EXPORT_CHUNK_SIZE
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get('response')
+        if response is not None and response.exception:
+            response['Content-Type'] = JSONRenderer.media_type
+            return JSONRenderer().render(data)
+        return b''.join(self.stream(data))
+
+    def stream(self, rows):
+        ''' Yields the encoded rows, in chunks of bytes. '''
+        lines = []
+        for row in rows:
+            lines.append(self.encode_row(row))
+            if len(lines) == self.chunk_size:
+                yield ''.join(lines).encode(self.charset)
+                lines = []
+        if lines:
+            yield ''.join(lines).encode(self.charset)
+
+    def encode_row(self, row):
+        raise NotImplementedError()
+
+
+class NDJSONRenderer(StreamingRenderer):
+    ''' Newline delimited JSON - one phone object per line. '''
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def encode_row(self, row):
+        return json.dumps(row, ensure_ascii=False) + '\n'
+
+
+class CSVRenderer(StreamingRenderer):
+    ''' CSV with a header line - specs are written as a JSON object. '''
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, rows):
+        yield self.encode_row(EXPORT_FIELDS).encode(self.charset)
+        yield from super().stream(
+            [row[name] for name in EXPORT_FIELDS] for row in rows
+        )
+
+    def encode_row(self, row):
+        line = io.StringIO()
+        csv.writer(line).writerow([
+            json.dumps(value, ensure_ascii=False)
+            if isinstance(value, dict) else value
+            for value in row
+        ])
+        return line.getvalue()
@@ -0,0 +1,95 @@
+import json
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .search import search
+
+
+class PhonesFilter(BaseFilterBackend):
+    '''
+    Phones filter - narrows down the phones with query parameters, each one
+    answered by an index (see Phone.Meta.indexes):
+        - min_price, max_price (int): price range, inclusive;
+        - manufacturer (int or str): company id or exact name;
+        - in_stock (bool): only phones with stock left;
+        - specs (json object): phones whose specs contain it;
+        - platform, chipset (str): shortcuts for exact specs values.
+    '''
+    spec_params = ['platform', 'chipset']
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+
+        if 'min_price' in params:
+            queryset = queryset.filter(
+                price__gte=self.get_int(params, 'min_price')
+            )
+        if 'max_price' in params:
+            queryset = queryset.filter(
+                price__lte=self.get_int(params, 'max_price')
+            )
+
+        manufacturer = params.get('manufacturer')
+        if manufacturer:
+            # ASCII only: isdigit() is also true of superscripts, which
+            # int() rejects
+            if manufacturer.isascii() and manufacturer.isdigit():
+                queryset = queryset.filter(manufacturer_id=int(manufacturer))
+            else:
+                queryset = queryset.filter(manufacturer__name=manufacturer)
+
+        if params.get('in_stock', '').lower() in ('1', 'true', 'yes'):
+            queryset = queryset.filter(stock__gt=0)
+
+        specs = self.get_specs(params)
+        if specs:
+            queryset = queryset.filter(specs__contains=specs)
+
+        return queryset
+
+    def reads_summary(self, request):
+        ''' Whether the filters asked for also apply to PhoneSummary. '''
+        params = request.query_params
+        return not any(
+            name in params for name in ['specs'] + self.spec_params
+        )
+
+    def get_int(self, params, name):
+        try:
+            return int(params[name])
+        except ValueError:
+            raise ValidationError({name: 'A valid integer is required.'})
+
+    def get_specs(self, params):
+        specs = {}
+        if 'specs' in params:
+            try:
+                specs = json.loads(params['specs'])
+            except ValueError:
+                specs = None
+            if not isinstance(specs, dict):
+                raise ValidationError({'specs': 'A JSON object is required.'})
+        for name in self.spec_params:
+            if name in params:
+                specs[name] = params[name]
+        return specs
+
+
+class PhonesSearch(BaseFilterBackend):
+    '''
+    Phones search - full text search on the model, manufacturer and
+    description with the `q` query parameter, best matches first.
+    With keyset pagination, the matches are ordered by the cursor instead.
+    '''
+    search_param = 'q'
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '').strip()
+        if not text:
+            return queryset
+        return search(queryset, text)
+
+    def reads_summary(self, request):
+        ''' Whether the search also applies to PhoneSummary (no search). '''
+        return not request.query_params.get(self.search_param, '').strip()
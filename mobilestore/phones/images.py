@@ -0,0 +1,122 @@
+'''
+Phone image pipeline - builds the resized and WebP variants of each phone
+image at ingest time, under names derived from the content of the original:
+
+    img/<hash>.jpg          original, as downloaded
+    img/<hash>.webp         original size, WebP
+    img/<hash>-240.jpg      thumbnail (list cards), JPEG
+    img/<hash>-240.webp     thumbnail (list cards), WebP
+
+A name never points to other content, so the files can be cached forever.
+Only depends on Pillow, to be used both by the API and by worker.py.
+'''
+import io
+import re
+import hashlib
+
+from PIL import Image
+
+DIRECTORY = 'img'
+HASH_LENGTH = 16
+THUMBNAIL_SIZE = 240 # Pixels, longest side
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Extension: (Pillow format, content type, save options)
+FORMATS = {
+    'jpg': ('JPEG', 'image/jpeg', {'quality': 85, 'optimize': True,
+        'progressive': True}),
+    'png': ('PNG', 'image/png', {'optimize': True}),
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 6}),
+}
+# Originals in other formats are saved as JPEG
+ORIGINAL_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png'}
+
+NAME_PATTERN = re.compile(
+    r'^(?P<prefix>(.*/)?[0-9a-f]{%d})\.(?P<extension>jpg|png)$' % HASH_LENGTH
+)
+# Originals and variants
+HASHED_PATTERN = re.compile(
+    r'^(.*/)?[0-9a-f]{%d}(-\d+)?\.(jpg|png|webp)$' % HASH_LENGTH
+)
+
+
+def is_hashed(name):
+    '''
+    Returns whether a name is the content hash name of an image or variant,
+    whose content never changes (and can be cached forever).
+    '''
+    return HASHED_PATTERN.match(name) is not None
+
+
+def variant_name(name, size=None, extension=None):
+    '''
+    Finds the name of a variant of an image.
+
+    Requires:
+        - name (str): name of an original image;
+        - size (int - optional): longest side of the variant, or None for the
+        original size;
+        - extension (str - optional): 'jpg' or 'webp', or None for the
+        format of the original.
+    Ensures:
+        Returns the name of the variant. Images saved before the pipeline
+        (without a content hash in their name) have no variants: the original
+        name is returned, or None when asking for another format.
+    '''
+    match = NAME_PATTERN.match(name or '')
+    if match is None:
+        return name if extension is None else None
+    extension = extension or match.group('extension')
+    if size is None:
+        return '%s.%s' % (match.group('prefix'), extension)
+    return '%s-%d.%s' % (match.group('prefix'), size, extension)
+
+
+def encode(image, extension):
+    ''' Returns the bytes of an image saved in the format of an extension. '''
+    pillow_format, _, options = FORMATS[extension]
+    if pillow_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    elif pillow_format == 'WEBP' and image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    output = io.BytesIO()
+    image.save(output, pillow_format, **options)
+    return output.getvalue()
+
+
+def build_variants(data, directory=DIRECTORY):
+    '''
+    Builds every variant of an image.
+
+    Requires:
+        - data (bytes): content of the original image (any format read by
+        Pillow);
+        - directory (str - optional): directory of the names.
+    Ensures:
+        Returns a list of (name, content type, bytes) tuples - the original
+        first, followed by its variants.
+        Raises OSError if the data is not an image.
+    '''
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    extension = ORIGINAL_EXTENSIONS.get(image.format)
+    if extension is None:
+        extension = 'jpg'
+        data = encode(image, extension)
+    digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+    name = '%s/%s.%s' % (directory, digest, extension)
+
+    thumbnail = image.copy()
+    thumbnail.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.LANCZOS)
+
+    variants = [(name, FORMATS[extension][1], data)]
+    for size, source in [(None, image), (THUMBNAIL_SIZE, thumbnail)]:
+        for variant_extension in [extension, 'webp']:
+            variant = variant_name(name, size, variant_extension)
+            if variant != name:
+                variants.append((
+                    variant,
+                    FORMATS[variant_extension][1],
+                    encode(source, variant_extension)
+                ))
+    return variants
@@ -0,0 +1,46 @@
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+
+from phones.images import NAME_PATTERN, build_variants
+from phones.models import Phone
+
+
+class Command(BaseCommand):
+    '''
+    Builds the variants of the phone images saved before the image pipeline
+    (see phones.images), in the file storage of the site (local media or S3),
+    and renames the phone images to their content hash names.
+    '''
+    help = 'Builds thumbnails and WebP variants of the phone images.'
+
+    def handle(self, *args, **options):
+        storage = Phone._meta.get_field('image').storage
+        names = {}
+        phones = Phone.objects.exclude(image='').only('id', 'image')
+        for phone in phones.iterator():
+            old_name = phone.image.name
+            if NAME_PATTERN.match(old_name):
+                continue
+            if old_name not in names:
+                names[old_name] = self.save_variants(storage, old_name)
+            if names[old_name] is not None:
+                phone.image = names[old_name]
+                phone.save(update_fields=['image'])
+        done = [name for name in names.values() if name is not None]
+        self.stdout.write('Built variants of %d images.' % len(done))
+
+    def save_variants(self, storage, name):
+        ''' Returns the new name of an image, or None if it can't be read. '''
+        try:
+            with storage.open(name) as file:
+                variants = build_variants(file.read())
+        except (OSError, IOError) as error:
+            self.stderr.write('Skipping %s: %s' % (name, error))
+            return None
+        for variant, content_type, data in variants:
+            if not storage.exists(variant):
+                content = ContentFile(data)
+                # Used by S3 storage (mimetypes may not know .webp)
+                content.content_type = content_type
+                storage.save(variant, content)
+        return variants[0][0]
@@ -0,0 +1,78 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from mobilestore.wsgi import application
+from phones.benchmarks import NO_CACHE, create_catalog
+from phones.benchmarks import load
+from phones.models import Phone, Company
+
+
+class Command(BaseCommand):
+    '''
+    Load benchmark of the phones API (see phones.benchmarks.load), on a
+    throwaway test database filled with a synthetic catalog.
+    '''
+    help = 'Measures the latency and throughput of the phones API.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--phones', type=int, default=10000,
+            help='Phones in the synthetic catalog (default=10000).')
+        parser.add_argument('--companies', type=int, default=10,
+            help='Companies in the synthetic catalog (default=10).')
+        parser.add_argument('--requests', type=int, default=200,
+            help='Requests per scenario and concurrency level (default=200).')
+        parser.add_argument('--concurrency', default='1,8',
+            help='Numbers of concurrent clients, comma separated '
+                '(default=1,8).')
+        parser.add_argument('--scenario', action='append', dest='scenarios',
+            help='Scenario to run (can be repeated), or else all of them.')
+        parser.add_argument('--cache', action='store_true',
+            help='Keep the response cache on.')
+        parser.add_argument('--keepdb', action='store_true',
+            help='Keep the test database (and its catalog) between runs.')
+        parser.add_argument('--output', help='Path of the JSON report.')
+        parser.add_argument('--compare',
+            help='Path of a previous JSON report, to compare the results to.')
+
+    def handle(self, *args, **options):
+        try:
+            concurrency = [
+                int(level) for level in options['concurrency'].split(',')
+            ]
+        except ValueError:
+            raise CommandError('--concurrency: comma separated integers.')
+        if options['phones'] < 10:
+            raise CommandError('--phones: at least 10 phones are needed.')
+        unknown = set(options['scenarios'] or []) - set(load.SCENARIOS)
+        if unknown:
+            raise CommandError('Unknown scenarios: %s (choose among: %s).' % (
+                ', '.join(sorted(unknown)), ', '.join(load.SCENARIOS)
+            ))
+        baseline = None
+        if options['compare']:
+            baseline = load.load_report(options['compare'])
+
+        runner = DiscoverRunner(keepdb=options['keepdb'], verbosity=0)
+        runner.setup_test_environment()
+        old_config = runner.setup_databases()
+        try:
+            if Phone.objects.count() != options['phones']:
+                Company.objects.all().delete()
+                self.stdout.write('Creating %d phones...' % options['phones'])
+                create_catalog(options['phones'], options['companies'])
+            caches = {} if options['cache'] else {'CACHES': NO_CACHE}
+            with override_settings(**caches):
+                report = load.run_load(
+                    application,
+                    requests=options['requests'],
+                    concurrency=concurrency,
+                    names=options['scenarios']
+                )
+        finally:
+            runner.teardown_databases(old_config)
+            runner.teardown_test_environment()
+
+        self.stdout.write(load.format_report(report, baseline))
+        if options['output']:
+            load.save_report(report, options['output'])
@@ -0,0 +1,105 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.runner import DiscoverRunner
+
+from phones.benchmarks import create_catalog
+from phones.benchmarks import load, servers
+from phones.models import Phone, Company
+
+
+class Command(BaseCommand):
+    '''
+    Concurrency benchmark of the server modes (see phones.benchmarks.servers),
+    on a throwaway test database filled with a synthetic catalog.
+    '''
+    help = (
+        'Compares the requests per second and latency of the phones API '
+        'served by sync WSGI and async ASGI workers.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--phones', type=int, default=10000,
+            help='Phones in the synthetic catalog (default=10000).')
+        parser.add_argument('--concurrency', default='10,100,1000',
+            help='Numbers of concurrent clients, comma separated '
+                '(default=10,100,1000).')
+        parser.add_argument('--duration', type=float, default=10,
+            help='Seconds each concurrency level runs for (default=10).')
+        parser.add_argument('--interface', action='append',
+            dest='interfaces', choices=servers.INTERFACES,
+            help='Server mode to run (can be repeated), or else all of them.')
+        parser.add_argument('--scenario', action='append', dest='scenarios',
+            help='Scenario of the requests (can be repeated, see loadbench), '
+                'or else list and detail.')
+        parser.add_argument('--workers', type=int, default=1,
+            help='Gunicorn worker processes (default=1).')
+        parser.add_argument('--threads', type=int,
+            help='Threads of each ASGI worker (default=ASGI_THREADS).')
+        parser.add_argument('--db-latency', type=float, default=0,
+            help='Milliseconds added to every SQL query, as with a remote '
+                'or busy database (default=0).')
+        parser.add_argument('--cache', action='store_true',
+            help='Keep the response cache on.')
+        parser.add_argument('--keepdb', action='store_true',
+            help='Keep the test database (and its catalog) between runs.')
+        parser.add_argument('--output', help='Path of the JSON results.')
+
+    def handle(self, *args, **options):
+        try:
+            concurrency = [
+                int(level) for level in options['concurrency'].split(',')
+            ]
+        except ValueError:
+            raise CommandError('--concurrency: comma separated integers.')
+        if options['phones'] < 10:
+            raise CommandError('--phones: at least 10 phones are needed.')
+        names = options['scenarios'] or ['list', 'detail']
+        unknown = set(names) - set(load.SCENARIOS)
+        if unknown:
+            raise CommandError('Unknown scenarios: %s (choose among: %s).' % (
+                ', '.join(sorted(unknown)), ', '.join(load.SCENARIOS)
+            ))
+
+        runner = DiscoverRunner(keepdb=options['keepdb'], verbosity=0)
+        runner.setup_test_environment()
+        old_config = runner.setup_databases()
+        results = []
+        try:
+            if Phone.objects.count() != options['phones']:
+                Company.objects.all().delete()
+                self.stdout.write('Creating %d phones...' % options['phones'])
+                create_catalog(options['phones'])
+            all_scenarios = load.scenarios()
+            requests = [all_scenarios[name] for name in names]
+            count = iter(range(10 ** 9))
+
+            def next_url():
+                return requests[next(count) % len(requests)]()
+
+            # Servers use the test database, through their own connections
+            database = connection.settings_dict['NAME']
+            connection.close()
+            for interface in options['interfaces'] or servers.INTERFACES:
+                with servers.Server(
+                    interface, database, options['workers'],
+                    options['threads'], options['cache'],
+                    options['db_latency']
+                ) as server:
+                    servers.run_level(server.port, next_url, 1, 1) # Warm up
+                    for level in concurrency:
+                        result = servers.run_level(
+                            server.port, next_url, level, options['duration']
+                        )
+                        result['interface'] = interface
+                        results.append(result)
+                        self.stdout.write(servers.format_results([result]))
+        finally:
+            runner.teardown_databases(old_config)
+            runner.teardown_test_environment()
+
+        self.stdout.write(servers.format_results(results))
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, indent=2, sort_keys=True)
@@ -0,0 +1,36 @@
+# Generated by Django 2.1.7 on 2026-10-17 22:48
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Company',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Phone',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=100, unique=True)),
+                ('image', models.ImageField(blank=True, default='img/default.png', upload_to='img')),
+                ('price', models.PositiveIntegerField()),
+                ('description', models.TextField()),
+                ('specs', django.contrib.postgres.fields.jsonb.JSONField()),
+                ('stock', models.PositiveIntegerField()),
+                ('manufacturer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='phones.Company')),
+            ],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.1.7 on 2026-10-17 22:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('phones', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='phone',
+            index=models.Index(fields=['price', 'id'], name='phone_price_id_idx'),
+        ),
+    ]
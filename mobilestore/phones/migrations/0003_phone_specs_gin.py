@@ -0,0 +1,18 @@
+# Generated by Django 2.1.7 on 2026-10-17 22:53
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('phones', '0002_phone_price_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='phone',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['specs'], name='phone_specs_gin'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 2.1.7 on 2026-10-17 22:54
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Same vector as phones.search.phone_search_vector, for the existing phones
+POPULATE_SEARCH_VECTOR = '''
+    UPDATE phones_phone SET search_vector =
+        setweight(to_tsvector('english', COALESCE(phones_phone.model, '')), 'A')
+        || setweight(to_tsvector('english', COALESCE(phones_company.name, '')), 'B')
+        || setweight(to_tsvector('english', COALESCE(phones_phone.description, '')), 'C')
+    FROM phones_company
+    WHERE phones_company.id = phones_phone.manufacturer_id;
+'''
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('phones', '0003_phone_specs_gin'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='phone',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='phone',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='phone_search_gin'),
+        ),
+        migrations.RunSQL(POPULATE_SEARCH_VECTOR, migrations.RunSQL.noop),
+    ]
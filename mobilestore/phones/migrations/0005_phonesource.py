@@ -0,0 +1,26 @@
+# Generated by Django 2.1.7 on 2026-10-17 23:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('phones', '0004_phone_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhoneSource',
+            fields=[
+                ('phone', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='source', serialize=False, to='phones.Phone')),
+                ('url', models.URLField(db_index=True, max_length=500)),
+                ('etag', models.CharField(blank=True, max_length=200)),
+                ('last_modified', models.CharField(blank=True, max_length=100)),
+                ('content_hash', models.CharField(max_length=64)),
+                ('last_seen', models.DateTimeField()),
+                ('last_changed', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 2.1.7 on 2026-10-17 23:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# phone_summary follows phones_phone: rows are copied on insert, on updates of
+# the summary columns only (not description, specs or search_vector), and
+# deleted with the phone
+CREATE_TRIGGERS = '''
+    CREATE FUNCTION phone_summary_sync() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            DELETE FROM phone_summary WHERE id = OLD.id;
+            RETURN OLD;
+        END IF;
+        IF TG_OP = 'UPDATE' AND NEW.id <> OLD.id THEN
+            DELETE FROM phone_summary WHERE id = OLD.id;
+        END IF;
+        INSERT INTO phone_summary
+            (id, model, image, price, stock, manufacturer_id)
+        VALUES
+            (NEW.id, NEW.model, NEW.image, NEW.price, NEW.stock,
+            NEW.manufacturer_id)
+        ON CONFLICT (id) DO UPDATE SET
+            model = EXCLUDED.model, image = EXCLUDED.image,
+            price = EXCLUDED.price, stock = EXCLUDED.stock,
+            manufacturer_id = EXCLUDED.manufacturer_id;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER phone_summary_insert
+        AFTER INSERT ON phones_phone
+        FOR EACH ROW EXECUTE PROCEDURE phone_summary_sync();
+
+    CREATE TRIGGER phone_summary_update
+        AFTER UPDATE OF id, model, image, price, stock, manufacturer_id
+        ON phones_phone
+        FOR EACH ROW
+        WHEN ((OLD.id, OLD.model, OLD.image, OLD.price, OLD.stock,
+            OLD.manufacturer_id) IS DISTINCT FROM (NEW.id, NEW.model,
+            NEW.image, NEW.price, NEW.stock, NEW.manufacturer_id))
+        EXECUTE PROCEDURE phone_summary_sync();
+
+    CREATE TRIGGER phone_summary_delete
+        AFTER DELETE ON phones_phone
+        FOR EACH ROW EXECUTE PROCEDURE phone_summary_sync();
+
+    INSERT INTO phone_summary (id, model, image, price, stock, manufacturer_id)
+    SELECT id, model, image, price, stock, manufacturer_id FROM phones_phone;
+'''
+
+DROP_TRIGGERS = '''
+    DROP TRIGGER phone_summary_delete ON phones_phone;
+    DROP TRIGGER phone_summary_update ON phones_phone;
+    DROP TRIGGER phone_summary_insert ON phones_phone;
+    DROP FUNCTION phone_summary_sync();
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('phones', '0005_phonesource'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhoneSummary',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('model', models.CharField(max_length=100)),
+                ('image', models.CharField(max_length=100)),
+                ('price', models.PositiveIntegerField()),
+                ('stock', models.PositiveIntegerField()),
+                ('manufacturer', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='phones.Company')),
+            ],
+            options={
+                'db_table': 'phone_summary',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='phonesummary',
+            index=models.Index(fields=['id', 'price', 'model', 'image'], name='phone_summary_id_cover'),
+        ),
+        migrations.AddIndex(
+            model_name='phonesummary',
+            index=models.Index(fields=['price', 'id', 'model', 'image'], name='phone_summary_price_cover'),
+        ),
+        migrations.RunSQL(CREATE_TRIGGERS, DROP_TRIGGERS),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 2.1.7 on 2026-10-18 00:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('phones', '0006_phone_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CrawlJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=500, unique=True)),
+                ('kind', models.CharField(choices=[('results', 'Results page'), ('phone', 'Phone page')], max_length=10)),
+                ('state', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('available_at', models.DateTimeField()),
+                ('lease_until', models.DateTimeField(blank=True, null=True)),
+                ('claimed_by', models.CharField(blank=True, max_length=100)),
+                ('last_error', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='crawljob',
+            index=models.Index(fields=['state', 'available_at'], name='phones_crawljob_claim_idx'),
+        ),
+    ]
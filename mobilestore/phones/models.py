@@ -1,5 +1,7 @@
 from django.db import models
 from django.contrib.postgres.fields import JSONField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 
 class Phone(models.Model):
     ''' Information about smartphones. '''
@@ -10,6 +12,21 @@ class Phone(models.Model):
     description = models.TextField()
     specs = JSONField()
     stock = models.PositiveIntegerField()
+    # Model, manufacturer name and description, for full text search.
+    # Kept up to date by phones.signals and worker.insert_data.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        # manufacturer_id is indexed as a foreign key
+        indexes = [
+            # Keyset pagination ordered by price (see phones.pagination), and
+            # price range filters (see phones.filters)
+            models.Index(fields=['price', 'id'], name='phone_price_id_idx'),
+            # Specs containment filters
+            GinIndex(fields=['specs'], name='phone_specs_gin'),
+            # Full text search (see phones.search)
+            GinIndex(fields=['search_vector'], name='phone_search_gin'),
+        ]
 
     def __str__(self):
         return self.model
@@ -20,4 +37,104 @@ class Company(models.Model):
     name = models.CharField(max_length=100, unique=True)
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+class PhoneSource(models.Model):
+    '''
+    Page a phone is scraped from, and what is needed to tell whether it
+    changed since (see worker.refresh_data).
+    '''
+    phone = models.OneToOneField(
+        Phone, on_delete=models.CASCADE, primary_key=True,
+        related_name='source'
+    )
+    url = models.URLField(max_length=500, db_index=True)
+    # HTTP validators of the page, for conditional requests
+    etag = models.CharField(max_length=200, blank=True)
+    last_modified = models.CharField(max_length=100, blank=True)
+    # SHA-256 of the scraped text of the page
+    content_hash = models.CharField(max_length=64)
+    last_seen = models.DateTimeField()
+    last_changed = models.DateTimeField()
+
+    def __str__(self):
+        return self.url
+
+
+class PhoneSummary(models.Model):
+    '''
+    Read model of the phone list: the few columns it reads, in a narrow table
+    kept in sync with phones_phone by database triggers (see migration 0006),
+    which also cover the raw SQL writes of worker.py. Never written to by
+    Django.
+    '''
+    id = models.IntegerField(primary_key=True)
+    model = models.CharField(max_length=100)
+    image = models.CharField(max_length=100)
+    price = models.PositiveIntegerField()
+    stock = models.PositiveIntegerField()
+    manufacturer = models.ForeignKey(
+        'Company', on_delete=models.DO_NOTHING, db_constraint=False,
+        related_name='+'
+    )
+
+    class Meta:
+        db_table = 'phone_summary'
+        # Covering indexes for the list orderings (see phones.pagination),
+        # so that pages are read with index only scans
+        indexes = [
+            models.Index(
+                fields=['id', 'price', 'model', 'image'],
+                name='phone_summary_id_cover'
+            ),
+            models.Index(
+                fields=['price', 'id', 'model', 'image'],
+                name='phone_summary_price_cover'
+            ),
+        ]
+
+    def __str__(self):
+        return self.model
+
+
+class CrawlJob(models.Model):
+    '''
+    Page in the crawl frontier of worker.py, shared by every worker process
+    (see worker.crawl): claimed with a lease, retried with a backoff when it
+    fails, and claimed again by another worker if its lease expires.
+    '''
+    RESULTS = 'results'
+    PHONE = 'phone'
+    KINDS = [(RESULTS, 'Results page'), (PHONE, 'Phone page')]
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATES = [
+        (PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    url = models.URLField(max_length=500, unique=True)
+    kind = models.CharField(max_length=10, choices=KINDS)
+    state = models.CharField(max_length=10, choices=STATES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    # Not claimed before then (retry backoff)
+    available_at = models.DateTimeField()
+    # Claimed by a worker until then
+    lease_until = models.DateTimeField(null=True, blank=True)
+    claimed_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['state', 'available_at'],
+                name='phones_crawljob_claim_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return self.url
@@ -1,9 +1,163 @@
-from rest_framework.pagination import LimitOffsetPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    BasePagination, LimitOffsetPagination, _positive_int
+)
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class PhonesKeysetPagination(BasePagination):
+    '''
+    Keyset (cursor) pagination - each page continues right after the last row
+    of the previous one, instead of skipping rows with OFFSET, so deep pages
+    cost the same as the first one.
+    Cursors are opaque, and remember the ordering they were created with.
+    '''
+    default_limit = 8
+    max_limit = 20
+    limit_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+    default_ordering = 'id'
+    orderings = {
+        'id': ('id',),
+        'price': ('price', 'id'),
+    }
+    invalid_cursor_message = 'Invalid cursor.'
+    invalid_ordering_message = 'Invalid ordering, choose one of: %s.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        position = self.decode_cursor(request)
+
+        if position is None:
+            self.ordering = self.get_ordering(request)
+        else:
+            self.ordering = position['o']
+
+        keys = self.orderings[self.ordering]
+        queryset = queryset.order_by(*keys)
+        if position is not None:
+            queryset = self.seek(queryset, keys, position['k'])
+
+        # One extra row tells us if there is a next page, without a COUNT
+        results = list(queryset[:self.limit + 1])
+        self.has_next = len(results) > self.limit
+        results = results[:self.limit]
+        self.last = results[-1] if results else None
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_limit(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.limit_query_param],
+                strict=True,
+                cutoff=self.max_limit
+            )
+        except (KeyError, ValueError):
+            return self.default_limit
+
+    def get_ordering(self, request):
+        ordering = request.query_params.get(
+            self.ordering_query_param, self.default_ordering
+        )
+        if ordering not in self.orderings:
+            raise NotFound(
+                self.invalid_ordering_message % ', '.join(sorted(self.orderings))
+            )
+        return ordering
+
+    def seek(self, queryset, keys, values):
+        '''
+        Filters a queryset to the rows placed after the given key values.
+        Written as a range on the first key, so that it can be answered by a
+        btree index, with the ties on that key resolved by the next ones.
+        '''
+        if len(keys) == 1:
+            return queryset.filter(**{keys[0] + '__gt': values[0]})
+
+        first, rest = keys[0], keys[1:]
+        queryset = queryset.filter(**{first + '__gte': values[0]})
+        tied = {first: values[0]}
+        for key, value in zip(rest, values[1:]):
+            tied[key + '__lte'] = value
+        return queryset.exclude(**tied)
+
+    def encode_cursor(self, obj):
+        position = {
+            'o': self.ordering,
+            'k': [getattr(obj, key) for key in self.orderings[self.ordering]],
+        }
+        data = json.dumps(position, separators=(',', ':')).encode('ascii')
+        return urlsafe_b64encode(data).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            keys = self.orderings[position['o']]
+            if len(position['k']) != len(keys):
+                raise ValueError()
+            if not all(isinstance(value, int) for value in position['k']):
+                raise ValueError()
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.ordering_query_param)
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.last)
+        )
+
 
 class PhonesPagination(LimitOffsetPagination):
+    '''
+    Phones pagination - limit/offset with a bare list response, as expected by
+    the frontend, in id order, unless keyset pagination is asked for with the
+    `cursor` query parameter (empty for the first page), or turned on by
+    default through the PHONES_PAGINATION setting.
+    '''
     default_limit = 8
     max_limit = 20
+    keyset_class = PhonesKeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.use_keyset(request):
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        # Same pages whichever table the list is read from (see
+        # PhoneSummary), unless ordered by relevance
+        if not queryset.ordered:
+            queryset = queryset.order_by('id')
+        return super().paginate_queryset(queryset, request, view)
+
+    def use_keyset(self, request):
+        mode = getattr(settings, 'PHONES_PAGINATION', 'offset')
+        return (
+            mode == 'keyset'
+            or self.keyset_class.cursor_query_param in request.query_params
+        )
 
     def get_paginated_response(self, data):
-        return Response(data)
\ No newline at end of file
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return Response(data)
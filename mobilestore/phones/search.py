@@ -0,0 +1,42 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db.models import CharField, F, Value
+
+# Text search configuration, also used by worker.insert_data
+SEARCH_CONFIG = 'english'
+
+
+def phone_search_vector(company_name):
+    '''
+    Returns the expression for Phone.search_vector, ranking matches in the
+    model above the manufacturer name, and both above the description.
+
+    Requires: company_name (str), name of the phone's manufacturer.
+    Ensures: an expression to be used in Phone updates.
+    '''
+    company_name = Value(company_name, output_field=CharField())
+    return (
+        SearchVector('model', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(company_name, weight='B', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vector(queryset, company_name):
+    ''' Refreshes the search vector of the phones of one company. '''
+    return queryset.update(search_vector=phone_search_vector(company_name))
+
+
+def search(queryset, text):
+    '''
+    Finds the phones matching some free text, best matches first.
+
+    Requires:
+        - queryset (QuerySet): phones to search in;
+        - text (str): words to look for.
+    Ensures:
+        Returns the queryset filtered to the matching phones, and ordered by
+        relevance (then by id, for ties).
+    '''
+    query = SearchQuery(text, config=SEARCH_CONFIG)
+    rank = SearchRank(F('search_vector'), query)
+    return queryset.filter(search_vector=query).order_by(rank.desc(), 'id')
@@ -1,19 +1,214 @@
 from rest_framework import serializers
-from phones.models import Phone, Company
+from rest_framework.exceptions import ValidationError
+from phones.models import Phone, PhoneSummary, Company
+from phones.images import THUMBNAIL_SIZE, variant_name
 
-class PhoneListSerializer(serializers.ModelSerializer):
-    ''' Phone Serializer - list view '''
+
+def image_url(name, request=None):
+    ''' Same as ImageField: absolute url of a file when there is a request. '''
+    if not name:
+        return None
+    url = Phone._meta.get_field('image').storage.url(name)
+    if request is not None:
+        url = request.build_absolute_uri(url)
+    return url
+
+
+class ImageVariantField(serializers.ReadOnlyField):
+    ''' Url of a variant of an image (see phones.images). '''
+
+    def __init__(self, size=None, extension=None, **kwargs):
+        self.size = size
+        self.extension = extension
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        name = variant_name(value.name, self.size, self.extension)
+        return image_url(name, self.context.get('request'))
+
+
+class SparseFieldsMixin(object):
+    '''
+    Sparse fieldsets - the fields sent are the ones named in the `fields`
+    query parameter, or else the default ones (Meta.default_fields) minus
+    those named in `exclude` (comma separated, among Meta.fields); `id` is
+    always sent.
+    get_queryset reads only the columns those fields need (Meta.sources
+    gives the column of the fields not named after one), so the other
+    columns are never read from the database.
+    '''
+    fields_param = 'fields'
+    exclude_param = 'exclude'
+
+    @classmethod
+    def selected_fields(cls, request=None):
+        ''' Returns the names of the fields to send, in Meta.fields order. '''
+        meta = cls.Meta
+        params = getattr(request, 'query_params', {})
+        if params.get(cls.fields_param):
+            names = cls.parse_fields(params, cls.fields_param)
+        else:
+            names = getattr(meta, 'default_fields', meta.fields)
+            if params.get(cls.exclude_param):
+                excluded = cls.parse_fields(params, cls.exclude_param)
+                names = [name for name in names if name not in excluded]
+        return [name for name in meta.fields if name == 'id' or name in names]
+
+    @classmethod
+    def parse_fields(cls, params, param):
+        names = [name.strip() for name in params[param].split(',')]
+        unknown = [name for name in names if name not in cls.Meta.fields]
+        if unknown:
+            raise ValidationError({
+                param: 'Unknown fields: %s. Choose among: %s.' % (
+                    ', '.join(unknown), ', '.join(cls.Meta.fields)
+                )
+            })
+        return names
+
+    @classmethod
+    def get_columns(cls, names):
+        ''' Returns the columns read for the given fields. '''
+        sources = getattr(cls.Meta, 'sources', {})
+        columns = list(getattr(cls.Meta, 'required_columns', ['id']))
+        for name in names:
+            column = sources.get(name, name)
+            if column not in columns:
+                columns.append(column)
+        return columns
+
+    @classmethod
+    def get_queryset(cls, names):
+        ''' Returns the phones queryset, reading only the given fields. '''
+        columns = cls.get_columns(names)
+        related = [
+            column.split('__')[0] for column in columns if '__' in column
+        ]
+        queryset = cls.Meta.model.objects.only(*columns)
+        if related:
+            queryset = queryset.select_related(*related)
+        return queryset
+
+    def get_field_names(self, declared_fields, info):
+        # ModelSerializer hook - sends the selected fields only
+        return self.selected_fields(self.context.get('request'))
+
+
+class PhoneListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    ''' Phone Serializer - list view, with thumbnails '''
+    manufacturer = serializers.ReadOnlyField(source='manufacturer.name')
+    image = ImageVariantField(size=THUMBNAIL_SIZE)
+    image_webp = ImageVariantField(
+        size=THUMBNAIL_SIZE, extension='webp', source='image'
+    )
 
     class Meta:
         model = Phone
-        fields = ['id','model', 'image', 'price']
+        fields = [
+            'id', 'manufacturer', 'model', 'image', 'image_webp', 'price',
+            'description', 'specs', 'stock'
+        ]
+        default_fields = ['id', 'model', 'image', 'image_webp', 'price']
+        sources = {'manufacturer': 'manufacturer__name', 'image_webp': 'image'}
+        # Sort keys of the pagination, needed for the cursors
+        required_columns = ['id', 'price']
+
+
+class PhoneListFastSerializer(SparseFieldsMixin):
+    '''
+    Phone Serializer - list view, fast path.
+    Serializes rows read with values_list(named=True) instead of model
+    instances, skipping the model instance, image file wrapper and field
+    objects built for each value by PhoneListSerializer, with the same output.
+    '''
+    Meta = PhoneListSerializer.Meta
+    # Fields whose columns are also in PhoneSummary
+    summary_fields = [
+        'id', 'manufacturer', 'model', 'image', 'image_webp', 'price', 'stock'
+    ]
+
+    def __init__(self, instance=None, many=True, context=None):
+        self.instance = instance
+        self.context = context or {}
+
+    @classmethod
+    def get_queryset(cls, names=Meta.default_fields):
+        return Phone.objects.values_list(*cls.get_columns(names), named=True)
+
+    @classmethod
+    def get_summary_queryset(cls, names=Meta.default_fields):
+        ''' Same as get_queryset, reading the phone_summary table. '''
+        return PhoneSummary.objects.values_list(
+            *cls.get_columns(names), named=True
+        )
+
+    @property
+    def data(self):
+        request = self.context.get('request')
+        names = self.selected_fields(request)
+        urls = {}
 
+        def image_urls(name):
+            if name not in urls:
+                urls[name] = {
+                    'image': image_url(
+                        variant_name(name, THUMBNAIL_SIZE), request
+                    ),
+                    'image_webp': image_url(
+                        variant_name(name, THUMBNAIL_SIZE, 'webp'), request
+                    ),
+                }
+            return urls[name]
 
-class PhoneDetailSerializer(serializers.ModelSerializer):
+        columns = [self.Meta.sources.get(name, name) for name in names]
+        images = [name for name in names if name in ('image', 'image_webp')]
+        data = []
+        for row in self.instance:
+            item = {
+                name: getattr(row, column)
+                for name, column in zip(names, columns)
+            }
+            if images:
+                urls_of_row = image_urls(row.image)
+                for name in images:
+                    item[name] = urls_of_row[name]
+            data.append(item)
+        return data
+
+
+class PhoneDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     ''' Phone Serializer - detail view '''
     manufacturer = serializers.ReadOnlyField(source='manufacturer.name')
+    image_webp = ImageVariantField(extension='webp', source='image')
 
     class Meta:
         model = Phone
-        fields = '__all__'      
-        
\ No newline at end of file
+        fields = [
+            'id', 'manufacturer', 'model', 'image', 'image_webp', 'price',
+            'description', 'specs', 'stock'
+        ]
+        sources = {'manufacturer': 'manufacturer__name', 'image_webp': 'image'}
+
+
+class CartItemSerializer(serializers.Serializer):
+    ''' Quantity of a phone, in a stock reservation. '''
+    id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class CartSerializer(serializers.Serializer):
+    ''' Stock reservation - validated items are merged by phone id. '''
+    max_items = 50
+    items = CartItemSerializer(many=True, allow_empty=False)
+
+    def validate_items(self, items):
+        if len(items) > self.max_items:
+            raise ValidationError(
+                'At most %d items are allowed.' % self.max_items
+            )
+        quantities = {}
+        for item in items:
+            quantities[item['id']] = (
+                quantities.get(item['id'], 0) + item['quantity']
+            )
+        return quantities
@@ -0,0 +1,29 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .cache import bump_catalog_version
+from .models import Phone, Company
+from .search import update_search_vector
+
+
+@receiver([post_save, post_delete], sender=Phone)
+@receiver([post_save, post_delete], sender=Company)
+def invalidate_catalog(sender, **kwargs):
+    ''' Invalidates cached API responses when the catalog changes. '''
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=Phone)
+def update_phone_search(sender, instance, raw=False, **kwargs):
+    ''' Refreshes the search vector of a saved phone. '''
+    if not raw:
+        update_search_vector(
+            Phone.objects.filter(pk=instance.pk), instance.manufacturer.name
+        )
+
+
+@receiver(post_save, sender=Company)
+def update_company_search(sender, instance, created, raw=False, **kwargs):
+    ''' Refreshes the search vectors of a renamed company's phones. '''
+    if not created and not raw:
+        update_search_vector(instance.phone_set.all(), instance.name)
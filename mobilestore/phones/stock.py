@@ -0,0 +1,72 @@
+from django.db import transaction
+from django.db.models import F
+
+from .cache import bump_catalog_version
+from .models import Phone
+
+
+class StockError(Exception):
+    ''' Raised when a cart can't be reserved or released as a whole. '''
+
+    def __init__(self, message, phone_id):
+        super().__init__(message % phone_id)
+        self.phone_id = phone_id
+
+
+class OutOfStock(StockError):
+    ''' Raised when a phone has less stock left than asked for. '''
+
+
+class PhoneNotFound(StockError):
+    ''' Raised when a phone of a cart doesn't exist. '''
+
+
+def reserve(items):
+    '''
+    Takes the given quantities of phones out of stock, all or nothing.
+    Each phone is decremented with a single conditional UPDATE (stock >= n),
+    so concurrent reservations can never oversell nor overwrite each other,
+    and rows are updated in id order, so that two carts can't deadlock.
+    Row locks only last until the end of the call. Bulk updates send no
+    post_save, so cached responses are invalidated once they are committed.
+
+    Requires: items (dict): quantity (positive int) for each phone id.
+    Ensures:
+        The stock of every phone is decremented; otherwise, nothing is and
+        OutOfStock or PhoneNotFound is raised, for the first phone missing.
+    '''
+    with transaction.atomic():
+        for phone_id, quantity in sorted(items.items()):
+            updated = (
+                Phone.objects
+                .filter(pk=phone_id, stock__gte=quantity)
+                .update(stock=F('stock') - quantity)
+            )
+            if not updated:
+                if Phone.objects.filter(pk=phone_id).exists():
+                    raise OutOfStock('Not enough stock of phone %d.', phone_id)
+                raise PhoneNotFound('Phone %d not found.', phone_id)
+        transaction.on_commit(bump_catalog_version)
+
+
+def release(items):
+    '''
+    Puts the given quantities of phones back in stock (a cancelled or
+    expired reservation), all or nothing.
+
+    Requires: items (dict): quantity (positive int) for each phone id.
+    Ensures:
+        The stock of every phone is incremented, and cached responses are
+        invalidated; otherwise, nothing is and PhoneNotFound is raised, for
+        the first phone missing.
+    '''
+    with transaction.atomic():
+        for phone_id, quantity in sorted(items.items()):
+            updated = (
+                Phone.objects
+                .filter(pk=phone_id)
+                .update(stock=F('stock') + quantity)
+            )
+            if not updated:
+                raise PhoneNotFound('Phone %d not found.', phone_id)
+        transaction.on_commit(bump_catalog_version)
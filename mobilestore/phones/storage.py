@@ -0,0 +1,16 @@
+from storages.backends.s3boto3 import S3Boto3Storage
+
+from .images import CACHE_CONTROL, is_hashed
+
+
+class S3Storage(S3Boto3Storage):
+    '''
+    S3 file storage. Images under content hash names (see phones.images) are
+    served with a long-lived Cache-Control; other files, such as images
+    uploaded in the admin under their own names, may be replaced.
+    '''
+
+    def _save_content(self, obj, content, parameters):
+        if is_hashed(obj.key):
+            parameters = dict(parameters, CacheControl=CACHE_CONTROL)
+        super()._save_content(obj, content, parameters)
@@ -1,3 +1,1413 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gc
+import gzip
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+from unittest import mock
+from urllib.request import urlopen
 
-# Create your tests here.
+import brotli
+from django.contrib.auth.models import User
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from mobilestore import metrics
+from mobilestore.asgihandler import ASGIHandler
+from mobilestore.querybudget import query_budget, QueryBudgetExceeded
+from .api import PhoneViewSet
+from .benchmarks import NO_CACHE, create_catalog, load
+from .cache import get_cache
+from .export import NDJSONRenderer
+from .filters import PhonesFilter
+from .images import CACHE_CONTROL, build_variants, variant_name
+from .models import Phone, PhoneSummary, Company
+from .serializers import (
+    CartSerializer, PhoneListSerializer, PhoneListFastSerializer
+)
+from .stock import reserve, OutOfStock
+from .storage import S3Storage
+
+STATIC_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+
+
+def create_phone(manufacturer, number, **fields):
+    ''' Creates a phone with placeholder values for the fields not given. '''
+    values = {
+        'model': 'Phone %d' % number,
+        'manufacturer': manufacturer,
+        'price': 100 + number,
+        'description': 'Description of phone %d.' % number,
+        'specs': {'platform': 'Android'},
+        'stock': 10,
+    }
+    values.update(fields)
+    return Phone.objects.create(**values)
+
+
+@contextmanager
+def run_on_commit():
+    '''
+    Runs the on_commit callbacks registered in the block, which a TestCase
+    never commits.
+    '''
+    start = len(connection.run_on_commit)
+    yield
+    callbacks = connection.run_on_commit[start:]
+    del connection.run_on_commit[start:]
+    for _, callback in callbacks:
+        callback()
+
+
+class PhonesTestCase(APITestCase):
+    ''' Base test case - every test starts with an empty response cache. '''
+
+    def setUp(self):
+        get_cache().clear()
+
+
+class PaginationTests(PhonesTestCase):
+    ''' Phone list pagination - limit/offset and keyset. '''
+
+    @classmethod
+    def setUpTestData(cls):
+        company = Company.objects.create(name='Company')
+        prices = [300, 100, 200, 100, 300, 200, 100]
+        cls.phones = [
+            create_phone(company, i, price=price)
+            for i, price in enumerate(prices)
+        ]
+
+    def walk(self, url):
+        ''' Follows the next links from the given url, collecting all ids. '''
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [phone['id'] for phone in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_offset_is_a_bare_list(self):
+        response = self.client.get('/api/phones/?limit=2&offset=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response.data, list)
+        self.assertEqual(len(response.data), 2)
+
+    def test_keyset_by_id(self):
+        ids = self.walk('/api/phones/?limit=3&cursor=')
+        self.assertEqual(ids, sorted(phone.id for phone in self.phones))
+
+    def test_keyset_by_price(self):
+        ids = self.walk('/api/phones/?limit=2&ordering=price&cursor=')
+        expected = sorted(self.phones, key=lambda phone: (phone.price, phone.id))
+        self.assertEqual(ids, [phone.id for phone in expected])
+
+    def test_keyset_limit_is_capped(self):
+        Phone.objects.bulk_create(
+            Phone(
+                model='Extra %d' % i, manufacturer=self.phones[0].manufacturer,
+                price=1, description='', specs={}, stock=1
+            )
+            for i in range(30)
+        )
+        response = self.client.get('/api/phones/?limit=100&cursor=')
+        self.assertEqual(len(response.data['results']), 20)
+
+    def test_keyset_invalid_cursor(self):
+        for cursor in ['garbage', 'eyJvIjoieCJ9', 'e30=']:
+            response = self.client.get('/api/phones/?cursor=' + cursor)
+            self.assertEqual(response.status_code, 404)
+
+    def test_keyset_invalid_ordering(self):
+        response = self.client.get('/api/phones/?ordering=model&cursor=')
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(PHONES_PAGINATION='keyset')
+    def test_keyset_by_default(self):
+        response = self.client.get('/api/phones/')
+        self.assertIn('results', response.data)
+
+
+class QueryBudgetTests(PhonesTestCase):
+    ''' SQL queries per request, and the query budget checks. '''
+
+    @classmethod
+    def setUpTestData(cls):
+        companies = [
+            Company.objects.create(name='Company %d' % i) for i in range(3)
+        ]
+        cls.phones = [create_phone(companies[i % 3], i) for i in range(6)]
+
+    def test_list_queries(self):
+        with query_budget(2):  # COUNT and page
+            self.client.get('/api/phones/?limit=20')
+        with query_budget(1):
+            self.client.get('/api/phones/?limit=20&cursor=')
+
+    def test_detail_queries(self):
+        for phone in self.phones:
+            with query_budget(1):
+                response = self.client.get('/api/phones/%d/' % phone.id)
+            self.assertEqual(
+                response.data['manufacturer'], phone.manufacturer.name
+            )
+
+    def test_budget_counts_queries(self):
+        with query_budget(None) as budget:
+            list(Phone.objects.all())
+            list(Company.objects.all())
+        self.assertEqual(budget.count, 2)
+        with self.assertRaises(QueryBudgetExceeded):
+            with query_budget(1):
+                list(Phone.objects.all())
+                list(Company.objects.all())
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_middleware_strict(self):
+        with mock.patch.object(PhoneViewSet, 'query_budget', 1):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get('/api/phones/')
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_middleware_logs(self):
+        with mock.patch.object(PhoneViewSet, 'query_budget', 1):
+            with self.assertLogs('mobilestore.querybudget', 'WARNING'):
+                response = self.client.get('/api/phones/')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_middleware_server_error(self):
+        # Not hidden behind a QueryBudgetExceeded
+        def failing_list(viewset, request):
+            list(Phone.objects.all())
+            list(Company.objects.all())
+            return Response(status=503)
+
+        with mock.patch.object(PhoneViewSet, 'query_budget', 1):
+            with mock.patch.object(PhoneViewSet, 'list', failing_list):
+                response = self.client.get('/api/phones/')
+        self.assertEqual(response.status_code, 503)
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_middleware_authenticated(self):
+        # The session and user queries aren't counted
+        user = User.objects.create_user('budget')
+        self.client.force_login(user)
+        response = self.client.get('/api/phones/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.wsgi_request.user, user)
+        phones = [
+            create_phone(self.phones[0].manufacturer, 100 + i, stock=1)
+            for i in range(CartSerializer.max_items)
+        ]
+        response = self.client.post('/api/phones/reserve/', {'items': [
+            {'id': phone.id, 'quantity': 1} for phone in phones
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+
+class CacheTests(PhonesTestCase):
+    ''' Response cache, invalidation and conditional requests. '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Company')
+        cls.phone = create_phone(cls.company, 1)
+
+    def test_cached_response(self):
+        url = '/api/phones/%d/' % self.phone.id
+        first = self.client.get(url)
+        with query_budget(None) as budget:
+            second = self.client.get(url)
+        self.assertEqual(budget.count, 0)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first['ETag'], second['ETag'])
+        self.assertEqual(second['Content-Type'], first['Content-Type'])
+
+    def test_not_modified(self):
+        url = '/api/phones/'
+        etag = self.client.get(url)['ETag']
+        self.assertTrue(etag.startswith('"'))
+        for _ in range(2):  # cache miss, then hit
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.content, b'')
+            get_cache().clear()
+
+    def test_invalidated_on_phone_save(self):
+        url = '/api/phones/%d/' % self.phone.id
+        etag = self.client.get(url)['ETag']
+        self.phone.price = 999
+        self.phone.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['price'], 999)
+
+    def test_invalidated_on_company_save(self):
+        url = '/api/phones/%d/' % self.phone.id
+        self.client.get(url)
+        self.company.name = 'Renamed'
+        self.company.save()
+        self.assertEqual(self.client.get(url).data['manufacturer'], 'Renamed')
+
+    def test_invalidated_on_delete(self):
+        phone = create_phone(self.company, 2)
+        url = '/api/phones/%d/' % phone.id
+        self.client.get(url)
+        phone.delete()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    @override_settings(STATICFILES_STORAGE=STATIC_STORAGE)
+    def test_browsable_api_not_cached(self):
+        url = '/api/phones/'
+        self.client.get(url, HTTP_ACCEPT='text/html')
+        with query_budget(None) as budget:
+            response = self.client.get(url, HTTP_ACCEPT='text/html')
+        self.assertGreater(budget.count, 0)
+        self.assertNotIn('ETag', response)
+
+
+class CompressionTests(PhonesTestCase):
+    ''' On the fly compression of JSON responses, above a size threshold. '''
+
+    @classmethod
+    def setUpTestData(cls):
+        company = Company.objects.create(name='Company')
+        cls.phones = [create_phone(company, i) for i in range(20)]
+
+    def test_compressed(self):
+        url = '/api/phones/?limit=20'
+        plain = self.client.get(url)
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertGreater(len(plain.content), 1024)
+        for encoding, decompress in [
+                ('gzip', gzip.decompress), ('br', brotli.decompress)]:
+            response = self.client.get(
+                url, HTTP_ACCEPT_ENCODING='gzip, deflate, ' + encoding
+            )
+            self.assertEqual(response['Content-Encoding'], encoding)
+            self.assertEqual(decompress(response.content), plain.content)
+            self.assertEqual(
+                response['Content-Length'], str(len(response.content))
+            )
+            self.assertIn('Accept-Encoding', response['Vary'])
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='br;q=0, gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_not_modified(self):
+        url = '/api/phones/?limit=20'
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        response = self.client.get(
+            url, HTTP_ACCEPT_ENCODING='gzip',
+            HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_not_compressed(self):
+        small = self.client.get(
+            '/api/phones/%d/?fields=model' % self.phones[0].id,
+            HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertLess(len(small.content), 1024)
+        self.assertNotIn('Content-Encoding', small)
+        self.assertIn('Accept-Encoding', small['Vary'])
+        # Streamed
+        export = self.client.get(
+            '/api/phones/export/?format=csv', HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertNotIn('Content-Encoding', export)
+        with override_settings(STATICFILES_STORAGE=STATIC_STORAGE):
+            page = self.client.get(
+                '/api/phones/', HTTP_ACCEPT='text/html',
+                HTTP_ACCEPT_ENCODING='gzip'
+            )
+        self.assertNotIn('Content-Encoding', page)
+
+
+class StaticFilesTests(PhonesTestCase):
+    ''' Static files - hashed names, precompressed, cached forever. '''
+
+    def setUp(self):
+        super().setUp()
+        static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_root)
+        settings = override_settings(STATIC_ROOT=static_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # Only the project's own files (assets): building the brotli variants
+        # of the others takes seconds
+        call_command(
+            'collectstatic', interactive=False, verbosity=0,
+            ignore_patterns=['admin', 'rest_framework']
+        )
+        self.static_root = static_root
+
+    def test_served(self):
+        url = staticfiles_storage.url('styles.css')
+        name = url[len('/static/'):]
+        self.assertRegex(name, r'^styles\.[0-9a-f]{12}\.css$')
+        for variant in [name + '.gz', name + '.br']:
+            self.assertTrue(
+                os.path.exists(os.path.join(self.static_root, variant))
+            )
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=315360000', response['Cache-Control'])
+        with open(os.path.join(self.static_root, name), 'rb') as file:
+            self.assertEqual(
+                brotli.decompress(b''.join(response.streaming_content)),
+                file.read()
+            )
+
+
+@override_settings(METRICS_TOKEN='secret')
+class MetricsTests(PhonesTestCase):
+    ''' Request metrics, served in Prometheus format at /metrics. '''
+
+    @classmethod
+    def setUpTestData(cls):
+        company = Company.objects.create(name='Company')
+        cls.phones = [create_phone(company, i) for i in range(3)]
+
+    def sample(self, name, **labels):
+        return metrics.REGISTRY.get_sample_value(name, labels) or 0
+
+    def scrape(self):
+        response = self.client.get(
+            '/metrics', HTTP_AUTHORIZATION='Bearer secret'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        return response.content.decode()
+
+    def test_requests(self):
+        route = {'route': 'api:phones-list'}
+        requests = self.sample(
+            'http_requests_total', method='GET', status='200', **route
+        )
+        latency = self.sample(
+            'http_request_duration_seconds_count', method='GET', **route
+        )
+        queries = self.sample('http_request_db_queries_sum', **route)
+        with query_budget(None) as budget:
+            response = self.client.get('/api/phones/')
+        self.assertEqual(
+            self.sample(
+                'http_requests_total', method='GET', status='200', **route
+            ),
+            requests + 1
+        )
+        self.assertEqual(
+            self.sample(
+                'http_request_duration_seconds_count', method='GET', **route
+            ),
+            latency + 1
+        )
+        self.assertEqual(
+            self.sample('http_request_db_queries_sum', **route),
+            queries + budget.count
+        )
+        self.assertGreaterEqual(
+            self.sample('http_response_size_bytes_sum', **route),
+            len(response.content)
+        )
+
+        self.client.get('/api/phones/0/')
+        self.client.get('/nowhere/')
+        content = self.scrape()
+        self.assertIn(
+            'http_request_duration_seconds_bucket{le="0.005",method="GET",'
+            'route="api:phones-list"}', content
+        )
+        self.assertIn(
+            'http_requests_total{method="GET",route="api:phones-detail",'
+            'status="404"}', content
+        )
+        self.assertIn('route="unmatched"', content)
+
+    def test_cache_requests(self):
+        hits = self.sample('phones_cache_requests_total', result='hit')
+        misses = self.sample('phones_cache_requests_total', result='miss')
+        url = '/api/phones/%d/' % self.phones[0].id
+        for _ in range(3):
+            self.client.get(url)
+        self.assertEqual(
+            self.sample('phones_cache_requests_total', result='hit'), hits + 2
+        )
+        self.assertEqual(
+            self.sample('phones_cache_requests_total', result='miss'),
+            misses + 1
+        )
+
+    def test_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        response = self.client.get(
+            '/metrics', HTTP_AUTHORIZATION='Bearer wrong'
+        )
+        self.assertEqual(response.status_code, 401)
+        with override_settings(METRICS_TOKEN=None, DEBUG=False):
+            self.assertEqual(self.client.get('/metrics').status_code, 404)
+        with override_settings(METRICS_TOKEN=None, DEBUG=True):
+            self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    def test_processes(self):
+        # Each server process writes its metrics to prometheus_multiproc_dir,
+        # and they are added up when scraped
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        environ = dict(os.environ, prometheus_multiproc_dir=directory.name)
+        script = (
+            'from mobilestore import metrics; '
+            'metrics.REQUESTS.labels("api:phones-list", "GET", 200).inc(%d); '
+            'metrics.LATENCY.labels("api:phones-list", "GET").observe(0.2)'
+        )
+        processes = [
+            subprocess.Popen(
+                [sys.executable, '-c', script % count], env=environ,
+                cwd=os.path.dirname(os.path.dirname(__file__))
+            )
+            for count in [2, 3]
+        ]
+        for process in processes:
+            self.assertEqual(process.wait(), 0)
+
+        with mock.patch.dict(os.environ, environ):
+            content = self.scrape()
+        self.assertIn(
+            'http_requests_total{method="GET",route="api:phones-list",'
+            'status="200"} 5.0', content
+        )
+        self.assertIn(
+            'http_request_duration_seconds_count{method="GET",'
+            'route="api:phones-list"} 2.0', content
+        )
+
+
+class FastSerializerTests(PhonesTestCase):
+    ''' Phone list fast path - same output as the model serializer. '''
+
+    @classmethod
+    def setUpTestData(cls):
+        company = Company.objects.create(name='Company')
+        images = [
+            'img/default.png', 'img/phone 1.jpg', 'img/ü.jpg', '',
+            'img/0123456789abcdef.jpg'
+        ]
+        for i, image in enumerate(images):
+            create_phone(company, i, image=image, model='Mödel "%d"' % i)
+
+    def render(self, serializer_class, queryset, request=None):
+        serializer = serializer_class(
+            queryset, many=True, context={'request': request}
+        )
+        return JSONRenderer().render(serializer.data)
+
+    def test_byte_identical(self):
+        request = APIRequestFactory().get('/api/phones/', HTTP_HOST='a.b:8000')
+        for context_request in [request, None]:
+            self.assertEqual(
+                self.render(
+                    PhoneListFastSerializer,
+                    PhoneListFastSerializer.get_queryset().order_by('id'),
+                    context_request
+                ),
+                self.render(
+                    PhoneListSerializer,
+                    Phone.objects.order_by('id'),
+                    context_request
+                )
+            )
+
+    def test_list_endpoint(self):
+        response = self.client.get('/api/phones/?limit=20')
+        expected = self.render(
+            PhoneListSerializer,
+            Phone.objects.all()[:20],
+            response.wsgi_request
+        )
+        self.assertEqual(response.content, expected)
+
+
+class FilterTests(PhonesTestCase):
+    ''' Phone list filters, and the indexes answering them. '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.apple = Company.objects.create(name='Apple')
+        cls.google = Company.objects.create(name='Google')
+        cls.phones = [
+            create_phone(cls.apple, 1, price=999, stock=0, specs={
+                'platform': 'iOS 12', 'chipset': 'Apple A12'
+            }),
+            create_phone(cls.google, 2, price=799, stock=5, specs={
+                'platform': 'Android 9.0', 'chipset': 'Snapdragon 845',
+                'camera': {'main': '12 MP'}
+            }),
+            create_phone(cls.google, 3, price=399, stock=9, specs={
+                'platform': 'Android 9.0', 'chipset': 'Snapdragon 670'
+            }),
+        ]
+
+    def get_models(self, query):
+        response = self.client.get('/api/phones/?limit=20&' + query)
+        self.assertEqual(response.status_code, 200)
+        return sorted(phone['model'] for phone in response.data)
+
+    def test_price_range(self):
+        self.assertEqual(
+            self.get_models('min_price=399&max_price=800'),
+            ['Phone 2', 'Phone 3']
+        )
+        self.assertEqual(self.get_models('min_price=800'), ['Phone 1'])
+
+    def test_manufacturer(self):
+        self.assertEqual(self.get_models('manufacturer=Apple'), ['Phone 1'])
+        self.assertEqual(
+            self.get_models('manufacturer=%d' % self.google.id),
+            ['Phone 2', 'Phone 3']
+        )
+        # Not an id - and no company has that name
+        self.assertEqual(self.get_models('manufacturer=\u00b2'), [])
+
+    def test_in_stock(self):
+        self.assertEqual(
+            self.get_models('in_stock=true'), ['Phone 2', 'Phone 3']
+        )
+
+    def test_specs(self):
+        self.assertEqual(
+            self.get_models('platform=Android 9.0&chipset=Snapdragon 670'),
+            ['Phone 3']
+        )
+        self.assertEqual(
+            self.get_models('specs={"camera": {"main": "12 MP"}}'),
+            ['Phone 2']
+        )
+
+    def test_invalid(self):
+        for query in ['min_price=cheap', 'specs=[1]', 'specs={']:
+            response = self.client.get('/api/phones/?' + query)
+            self.assertEqual(response.status_code, 400)
+
+    def explain(self, query):
+        '''
+        Returns the plan of the filtered list query. Sequential scans are
+        turned off, as the tiny test table would never need an index.
+        '''
+        request = Request(APIRequestFactory().get('/api/phones/?' + query))
+        queryset = PhonesFilter().filter_queryset(
+            request, Phone.objects.all(), PhoneViewSet()
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off;')
+        return queryset.explain()
+
+    def test_indexes_used(self):
+        self.assertIn('phone_price_id_idx', self.explain('min_price=500'))
+        self.assertIn(
+            'manufacturer_id', self.explain('manufacturer=%d' % self.apple.id)
+        )
+        self.assertIn('phone_specs_gin', self.explain('platform=iOS 12'))
+
+
+class SummaryTests(PhonesTestCase):
+    ''' Phone list read model - phone_summary, kept in sync by triggers. '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Company')
+        cls.phones = [
+            create_phone(cls.company, i, stock=i % 2) for i in range(5)
+        ]
+
+    def summary(self, phone):
+        return PhoneSummary.objects.filter(id=phone.id).values_list(
+            'model', 'image', 'price', 'stock', 'manufacturer_id'
+        ).first()
+
+    def row(self, phone):
+        return (
+            phone.model, phone.image.name, phone.price, phone.stock,
+            phone.manufacturer_id
+        )
+
+    def test_kept_in_sync(self):
+        for phone in self.phones:
+            self.assertEqual(self.summary(phone), self.row(phone))
+        phone = self.phones[0]
+        phone.price = 1
+        phone.image = 'img/new.jpg'
+        phone.save()
+        Phone.objects.filter(id=phone.id).update(model='Renamed')
+        phone.refresh_from_db()
+        self.assertEqual(self.summary(phone), self.row(phone))
+        reserve({self.phones[1].id: 1})
+        self.assertEqual(self.summary(self.phones[1])[3], 0)
+        phone.delete()
+        self.assertIsNone(self.summary(phone))
+        self.assertEqual(PhoneSummary.objects.count(), 4)
+
+    def test_raw_sql_writes(self):
+        # As worker.insert_data and worker.insert_batch
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """INSERT INTO phones_phone
+                (model, image, manufacturer_id, price, description, specs,
+                stock) VALUES ('Raw', 'img/raw.jpg', %s, 5, '', '{}', 3)
+                ON CONFLICT (model) DO UPDATE SET price = 6
+                RETURNING id;""", [self.company.id]
+            )
+            phone = Phone.objects.get(id=cursor.fetchone()[0])
+        self.assertEqual(self.summary(phone), self.row(phone))
+
+    def get(self, url, summary):
+        ''' Returns the response, and whether phone_summary was read. '''
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        sql = ' '.join(query['sql'] for query in queries)
+        self.assertEqual('"phone_summary"' in sql, summary, url)
+        self.assertEqual('"phones_phone"' in sql, not summary, url)
+        return response
+
+    def test_list_reads_summary(self):
+        for query in ['', 'limit=2&offset=1', 'cursor=&ordering=price',
+                'in_stock=1&min_price=101&manufacturer=Company',
+                'fields=model,manufacturer,stock']:
+            url = '/api/phones/?' + query
+            response = self.get(url, True)
+            with mock.patch.object(
+                    PhoneViewSet, 'reads_summary', return_value=False):
+                get_cache().clear()
+                self.assertEqual(self.get(url, False).content, response.content)
+
+    def test_list_reads_phones(self):
+        for query in ['fields=model,description', 'exclude=image&fields=specs',
+                'q=phone', 'platform=Android', 'specs={}']:
+            self.get('/api/phones/?' + query, False)
+
+
+class SearchTests(PhonesTestCase):
+    ''' Full text search, ranked by relevance. '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.google = Company.objects.create(name='Google')
+        samsung = Company.objects.create(name='Samsung')
+        cls.pixel = create_phone(
+            cls.google, 1, model='Pixel 3',
+            description='The best camera in a phone.'
+        )
+        cls.galaxy = create_phone(
+            samsung, 2, model='Galaxy S10',
+            description='A camera that rivals the Pixel cameras.'
+        )
+        create_phone(samsung, 3, model='Galaxy Note 9', description='Big.')
+
+    def search(self, text):
+        response = self.client.get('/api/phones/', {'q': text})
+        self.assertEqual(response.status_code, 200)
+        return [phone['model'] for phone in response.data]
+
+    def test_ranked(self):
+        # A match in the model ranks above a match in the description
+        self.assertEqual(self.search('pixel'), ['Pixel 3', 'Galaxy S10'])
+        # Words are stemmed, and more mentions rank higher
+        self.assertEqual(self.search('cameras'), ['Galaxy S10', 'Pixel 3'])
+        self.assertEqual(self.search('nokia'), [])
+
+    def test_manufacturer(self):
+        self.assertEqual(self.search('google'), ['Pixel 3'])
+        self.google.name = 'Alphabet'
+        self.google.save()
+        self.assertEqual(self.search('google'), [])
+        self.assertEqual(self.search('alphabet'), ['Pixel 3'])
+
+    def test_updated_on_save(self):
+        self.galaxy.model = 'Galaxy Fold'
+        self.galaxy.save()
+        self.assertEqual(self.search('fold'), ['Galaxy Fold'])
+
+    def test_not_in_detail(self):
+        response = self.client.get('/api/phones/%d/' % self.pixel.id)
+        self.assertNotIn('search_vector', response.data)
+
+
+def create_image(size=(600, 415), image_format='JPEG'):
+    ''' Returns the bytes of a generated image. '''
+    image = Image.linear_gradient('L').resize(size).convert('RGB')
+    output = io.BytesIO()
+    image.save(output, image_format)
+    return output.getvalue()
+
+
+class ImageTests(PhonesTestCase):
+    ''' Image pipeline - thumbnail and WebP variants, content hash names. '''
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        os.mkdir(os.path.join(media, 'img'))
+        settings = override_settings(MEDIA_ROOT=media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.media = media
+
+    def test_build_variants(self):
+        data = create_image()
+        variants = build_variants(data)
+        name = variants[0][0]
+        self.assertRegex(name, r'^img/[0-9a-f]{16}\.jpg$')
+        self.assertEqual(variants[0][1:], ('image/jpeg', data))
+        self.assertEqual(build_variants(data)[0][0], name)
+        self.assertNotEqual(build_variants(create_image((600, 400)))[0][0], name)
+
+        sizes = {}
+        for variant, content_type, content in variants:
+            image = Image.open(io.BytesIO(content))
+            sizes[variant] = (image.format, content_type, image.size)
+        self.assertEqual(sizes, {
+            name: ('JPEG', 'image/jpeg', (600, 415)),
+            variant_name(name, extension='webp'):
+                ('WEBP', 'image/webp', (600, 415)),
+            variant_name(name, 240): ('JPEG', 'image/jpeg', (240, 166)),
+            variant_name(name, 240, 'webp'): ('WEBP', 'image/webp', (240, 166)),
+        })
+
+    def test_other_formats(self):
+        name = build_variants(create_image(image_format='PNG'))[0][0]
+        self.assertTrue(name.endswith('.png'))
+        name = build_variants(create_image(image_format='GIF'))[0][0]
+        self.assertTrue(name.endswith('.jpg'))
+        with self.assertRaises(OSError):
+            build_variants(b'not an image')
+
+    def test_variant_name(self):
+        name = 'img/0123456789abcdef.jpg'
+        self.assertEqual(variant_name(name), name)
+        self.assertEqual(variant_name(name, 240), 'img/0123456789abcdef-240.jpg')
+        self.assertEqual(
+            variant_name(name, extension='webp'), 'img/0123456789abcdef.webp'
+        )
+        # Images saved before the pipeline have no variants
+        self.assertEqual(variant_name('img/default.png', 240), 'img/default.png')
+        self.assertIsNone(variant_name('img/default.png', 240, 'webp'))
+
+    def test_s3_cache_control(self):
+        # Only content hash names never change
+        storage = S3Storage(bucket_name='bucket')
+        for name, cache_control in [
+            ('img/0123456789abcdef.jpg', CACHE_CONTROL),
+            ('img/0123456789abcdef-240.webp', CACHE_CONTROL),
+            ('img/pixel3.jpg', None),
+        ]:
+            obj = mock.Mock(key=name)
+            storage._save_content(
+                obj, ContentFile(b'image'), {'ContentType': 'image/jpeg'}
+            )
+            parameters = obj.upload_fileobj.call_args[1]['ExtraArgs']
+            self.assertEqual(parameters.get('CacheControl'), cache_control)
+            self.assertEqual(parameters['ContentType'], 'image/jpeg')
+
+    def test_variant_per_endpoint(self):
+        phone = create_phone(
+            Company.objects.create(name='Company'), 1,
+            image='img/0123456789abcdef.jpg'
+        )
+        url = 'http://testserver/media/img/0123456789abcdef'
+        response = self.client.get('/api/phones/')
+        self.assertEqual(response.data[0]['image'], url + '-240.jpg')
+        self.assertEqual(response.data[0]['image_webp'], url + '-240.webp')
+        response = self.client.get('/api/phones/%d/' % phone.id)
+        self.assertEqual(response.data['image'], url + '.jpg')
+        self.assertEqual(response.data['image_webp'], url + '.webp')
+
+    def test_build_image_variants_command(self):
+        company = Company.objects.create(name='Company')
+        with open(os.path.join(self.media, 'img', 'old.jpg'), 'wb') as file:
+            file.write(create_image())
+        phones = [
+            create_phone(company, i, image='img/old.jpg') for i in range(2)
+        ]
+        broken = create_phone(company, 2, image='img/missing.jpg')
+        call_command('build_image_variants', stdout=io.StringIO(),
+            stderr=io.StringIO())
+
+        names = set()
+        for phone in phones:
+            phone.refresh_from_db()
+            names.add(phone.image.name)
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertRegex(name, r'^img/[0-9a-f]{16}\.jpg$')
+        for size in [None, 240]:
+            for extension in ['jpg', 'webp']:
+                self.assertTrue(os.path.exists(os.path.join(
+                    self.media, variant_name(name, size, extension)
+                )))
+        broken.refresh_from_db()
+        self.assertEqual(broken.image.name, 'img/missing.jpg')
+
+
+class ExportTests(PhonesTestCase):
+    ''' Catalog export - every phone, streamed as NDJSON or CSV. '''
+
+    @classmethod
+    def setUpTestData(cls):
+        google = Company.objects.create(name='Google')
+        samsung = Company.objects.create(name='Samsung')
+        create_phone(google, 1, model='Pixel "3"', description='Ünicode,\n')
+        create_phone(samsung, 2, image='img/0123456789abcdef.jpg')
+        create_phone(google, 3, specs={'camera': {'main': '12 MP'}})
+
+    def export(self, query=''):
+        response = self.client.get('/api/phones/export/' + query)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def details(self):
+        return [
+            self.client.get('/api/phones/%d/' % phone.id).data
+            for phone in Phone.objects.order_by('id')
+        ]
+
+    def test_ndjson(self):
+        with mock.patch.object(NDJSONRenderer, 'chunk_size', 2):
+            response, content = self.export()
+        self.assertEqual(
+            response['Content-Type'], 'application/x-ndjson; charset=utf-8'
+        )
+        self.assertIn('phones.ndjson', response['Content-Disposition'])
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(rows, self.details())
+
+    def test_csv(self):
+        response, content = self.export('?format=csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.DictReader(io.StringIO(content)))
+        details = self.details()
+        self.assertEqual(len(rows), len(details))
+        for row, detail in zip(rows, details):
+            self.assertEqual(json.loads(row.pop('specs')), detail.pop('specs'))
+            self.assertEqual(
+                row, {name: str(value or '') for name, value in detail.items()}
+            )
+
+    def test_filtered(self):
+        _, content = self.export('?manufacturer=Samsung')
+        self.assertEqual(
+            [json.loads(line)['model'] for line in content.splitlines()],
+            ['Phone 2']
+        )
+
+    def test_invalid_filter(self):
+        for export_format in ['ndjson', 'csv']:
+            response = self.client.get(
+                '/api/phones/export/?format=%s&min_price=abc' % export_format
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response['Content-Type'], 'application/json')
+            self.assertEqual(json.loads(response.content), {
+                'min_price': 'A valid integer is required.'
+            })
+
+    def test_server_side_cursor(self):
+        with mock.patch.object(
+            connection, 'chunked_cursor', wraps=connection.chunked_cursor
+        ) as chunked_cursor:
+            self.export()
+        chunked_cursor.assert_called_once_with()
+
+
+class BatchTests(PhonesTestCase):
+    ''' Batch detail retrieval - several phones in one request. '''
+
+    @classmethod
+    def setUpTestData(cls):
+        google = Company.objects.create(name='Google')
+        cls.phones = [create_phone(google, i) for i in range(3)]
+
+    def detail(self, phone):
+        return self.client.get('/api/phones/%d/' % phone.id).data
+
+    def test_get(self):
+        first, second, third = self.phones
+        with query_budget(1):
+            response = self.client.get(
+                '/api/phones/batch/', {'ids': '%d,%d' % (third.id, first.id)}
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [self.detail(third), self.detail(first)])
+
+    def test_post(self):
+        ids = [phone.id for phone in self.phones]
+        with query_budget(1):
+            response = self.client.post(
+                '/api/phones/batch/', {'ids': ids}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data, [self.detail(phone) for phone in self.phones]
+        )
+
+    def test_not_found(self):
+        first = self.phones[0]
+        response = self.client.get(
+            '/api/phones/batch/', {'ids': '%d,0,%d' % (first.id, first.id)}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [
+            self.detail(first),
+            {'id': 0, 'status': 404, 'detail': 'Not found.'},
+        ])
+
+    def test_invalid(self):
+        too_many = ','.join(str(i) for i in range(51))
+        for ids in ['', 'a,1', too_many, '1.5', '\u00b2', '-1', '1e3']:
+            response = self.client.get('/api/phones/batch/', {'ids': ids})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('ids', response.data)
+        for data in [[1, 2], {'ids': [1.5, True]}, {'ids': ['\u0661']}]:
+            response = self.client.post(
+                '/api/phones/batch/', data, format='json'
+            )
+            self.assertEqual(response.status_code, 400)
+
+
+class SparseFieldsTests(PhonesTestCase):
+    ''' Sparse fieldsets - fields chosen per request, and their columns read. '''
+
+    @classmethod
+    def setUpTestData(cls):
+        google = Company.objects.create(name='Google')
+        cls.phone = create_phone(google, 1, specs={'os': 'Android'})
+        create_phone(google, 2, image='img/0123456789abcdef.jpg')
+
+    def get(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.sql = ' '.join(query['sql'] for query in queries)
+        return response.data
+
+    def test_list(self):
+        data = self.get('/api/phones/', fields='manufacturer,stock')
+        self.assertEqual(data[0], {
+            'id': self.phone.id, 'manufacturer': 'Google', 'stock': 10
+        })
+        self.assertNotIn('"description"', self.sql)
+        data = self.get('/api/phones/', exclude='image,image_webp')
+        self.assertEqual(list(data[0]), ['id', 'model', 'price'])
+        self.assertNotIn('"image"', self.sql)
+        self.assertNotIn('JOIN', self.sql)
+
+    def test_list_same_as_model_serializer(self):
+        serializer_classes = [PhoneListSerializer, PhoneListFastSerializer]
+        for query in ['', 'fields=id,specs,image', 'exclude=model,price',
+                'fields=description,manufacturer,image_webp']:
+            request = Request(APIRequestFactory().get('/api/phones/?' + query))
+            renders = []
+            for serializer_class in serializer_classes:
+                fields = serializer_class.selected_fields(request)
+                serializer = serializer_class(
+                    serializer_class.get_queryset(fields).order_by('id'),
+                    many=True, context={'request': request}
+                )
+                renders.append(JSONRenderer().render(serializer.data))
+            self.assertEqual(renders[0], renders[1], query)
+
+    def test_detail(self):
+        url = '/api/phones/%d/' % self.phone.id
+        self.assertEqual(len(self.get(url)), 9)
+        self.assertIn('"description"', self.sql)
+        data = self.get(url, exclude='description,specs')
+        self.assertEqual(list(data), [
+            'id', 'manufacturer', 'model', 'image', 'image_webp', 'price',
+            'stock'
+        ])
+        self.assertNotIn('"description"', self.sql)
+        self.assertNotIn('"specs"', self.sql)
+        data = self.get(url, fields='model,price')
+        self.assertEqual(data, {
+            'id': self.phone.id, 'model': 'Phone 1', 'price': 101
+        })
+        self.assertNotIn('JOIN', self.sql)
+
+    def test_batch(self):
+        data = self.get(
+            '/api/phones/batch/', ids='%d,0' % self.phone.id, fields='stock'
+        )
+        self.assertEqual(data, [
+            {'id': self.phone.id, 'stock': 10},
+            {'id': 0, 'status': 404, 'detail': 'Not found.'},
+        ])
+
+    def test_keyset_pagination(self):
+        data = self.get(
+            '/api/phones/', cursor='', ordering='price', limit=1,
+            fields='model'
+        )
+        self.assertEqual(
+            data['results'], [{'id': self.phone.id, 'model': 'Phone 1'}]
+        )
+        self.assertIsNotNone(data['next'])
+
+    def test_unknown(self):
+        for param in ['fields', 'exclude']:
+            response = self.client.get('/api/phones/', {param: 'model,secret'})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('secret', response.data[param])
+
+
+class StockTests(PhonesTestCase):
+    ''' Stock reservations - atomic conditional updates, all or nothing. '''
+
+    @classmethod
+    def setUpTestData(cls):
+        google = Company.objects.create(name='Google')
+        cls.first = create_phone(google, 1, stock=5)
+        cls.second = create_phone(google, 2, stock=1)
+        cls.user = User.objects.create_user('checkout')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def post(self, action, *items):
+        return self.client.post('/api/phones/%s/' % action, {'items': [
+            {'id': phone.id if isinstance(phone, Phone) else phone,
+                'quantity': quantity}
+            for phone, quantity in items
+        ]}, format='json')
+
+    def stock(self):
+        return [
+            Phone.objects.get(pk=phone.pk).stock
+            for phone in [self.first, self.second]
+        ]
+
+    def test_reserve(self):
+        response = self.post('reserve', (self.second, 1), (self.first, 2),
+            (self.first, 1))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'items': [
+            {'id': self.first.id, 'quantity': 3},
+            {'id': self.second.id, 'quantity': 1},
+        ]})
+        self.assertEqual(self.stock(), [2, 0])
+
+    def test_out_of_stock(self):
+        response = self.post('reserve', (self.first, 2), (self.second, 2))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['id'], self.second.id)
+        # Nothing reserved
+        self.assertEqual(self.stock(), [5, 1])
+
+    def test_not_found(self):
+        response = self.post('reserve', (self.first, 1), (0, 1))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.data['id'], 0)
+        self.assertEqual(self.stock(), [5, 1])
+        response = self.post('release', (self.first, 1), (0, 1))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.stock(), [5, 1])
+
+    def test_release(self):
+        self.post('reserve', (self.first, 4))
+        response = self.post('release', (self.first, 3))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stock(), [4, 1])
+
+    def test_cache_invalidated(self):
+        url = '/api/phones/%d/' % self.first.id
+        response = self.client.get(url)
+        self.assertEqual(response.data['stock'], 5)
+        with run_on_commit():
+            self.post('reserve', (self.first, 2))
+        reserved = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(reserved.status_code, 200)
+        self.assertEqual(reserved.data['stock'], 3)
+        self.assertNotEqual(reserved['ETag'], response['ETag'])
+        with run_on_commit():
+            self.post('release', (self.first, 2))
+        self.assertEqual(self.client.get(url).data['stock'], 5)
+
+    def test_single_update_per_item(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.post('reserve', (self.first, 1), (self.second, 1))
+        updates = [
+            query['sql'] for query in queries
+            if not query['sql'].startswith(('SAVEPOINT', 'RELEASE'))
+        ]
+        self.assertEqual(len(updates), 2)
+        self.assertIn('"stock" = ("phones_phone"."stock" - 1)', updates[0])
+        self.assertIn('"stock" >= 1', updates[0])
+
+    def test_invalid(self):
+        for items in [[], [{'id': self.first.id, 'quantity': 0}],
+                [{'id': 'one', 'quantity': 1}],
+                [{'id': i, 'quantity': 1} for i in range(51)]]:
+            response = self.client.post(
+                '/api/phones/reserve/', {'items': items}, format='json'
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('items', response.data)
+
+    def test_authentication_required(self):
+        self.client.force_authenticate(None)
+        response = self.post('reserve', (self.first, 1))
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.stock(), [5, 1])
+
+
+class StockContentionTests(TransactionTestCase):
+    ''' Concurrent reservations of the last phones in stock. '''
+
+    def test_no_overselling(self):
+        phone = create_phone(Company.objects.create(name='Google'), 1, stock=20)
+        reserved = []
+
+        def buy():
+            try:
+                for _ in range(10):
+                    try:
+                        reserve({phone.id: 1})
+                        reserved.append(1)
+                    except OutOfStock:
+                        pass
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(reserved), 20)
+        self.assertEqual(Phone.objects.get(pk=phone.pk).stock, 0)
+
+
+@override_settings(CACHES=NO_CACHE)
+class LoadBenchmarkTests(TransactionTestCase):
+    ''' Load benchmark runner, on a small synthetic catalog. '''
+
+    def test_report(self):
+        from mobilestore.wsgi import application
+        create_catalog(20, companies=2)
+        chipsets = {phone.specs['chipset'] for phone in Phone.objects.all()}
+        self.assertGreater(len(chipsets), 1)
+        report = load.run_load(
+            application, requests=6, concurrency=[1, 3],
+            names=['list', 'detail', 'deep_keyset'], warmup=1
+        )
+        self.assertEqual(report['phones'], 20)
+        self.assertEqual(
+            list(report['results']), ['list', 'detail', 'deep_keyset']
+        )
+        queries = {'list': 2, 'detail': 1, 'deep_keyset': 1}
+        for name, results in report['results'].items():
+            self.assertEqual(
+                [result['concurrency'] for result in results], [1, 3]
+            )
+            for result in results:
+                self.assertEqual(result['requests'], 6)
+                self.assertEqual(result['errors'], 0)
+                self.assertEqual(result['queries_per_request'], queries[name])
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+        # Reports survive a round trip to JSON, and can be compared
+        report = json.loads(json.dumps(report))
+        table = load.format_report(report, baseline=report)
+        self.assertIn('(+0%)', table)
+
+
+class ASGITests(TransactionTestCase):
+    ''' ASGI mode - same responses as WSGI, with views run in threads. '''
+
+    def setUp(self):
+        get_cache().clear()
+        self.company = Company.objects.create(name='Google')
+        self.phones = [create_phone(self.company, i) for i in range(3)]
+        self.application = ASGIHandler(threads=2)
+        self.addCleanup(self.close_application)
+
+    def close_application(self):
+        self.application.executor.shutdown()
+        # The database connections of its threads, kept open (CONN_MAX_AGE),
+        # are only closed once collected
+        gc.collect()
+
+    def request(self, path, method='GET', query=b'', headers=()):
+        ''' Returns the status, headers and body chunks of a response. '''
+        scope = {
+            'type': 'http', 'method': method, 'path': path,
+            'query_string': query, 'http_version': '1.1', 'scheme': 'http',
+            'server': ('testserver', 80), 'client': ('127.0.0.1', 1234),
+            'headers': [(b'host', b'testserver')] + list(headers),
+        }
+        received = [{'type': 'http.request', 'body': b''}]
+        messages = []
+
+        async def receive():
+            return received.pop(0)
+
+        async def send(message):
+            messages.append(message)
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self.application(scope, receive, send))
+        finally:
+            loop.close()
+        start, body = messages[0], messages[1:]
+        self.assertEqual(start['type'], 'http.response.start')
+        headers = {
+            name.decode().lower(): value.decode()
+            for name, value in start['headers']
+        }
+        return start['status'], headers, [
+            message.get('body', b'') for message in body
+        ]
+
+    def test_same_as_wsgi(self):
+        for path in ['/api/phones/', '/api/phones/%d/' % self.phones[1].id]:
+            status, headers, body = self.request(path)
+            get_cache().clear()
+            response = self.client.get(path)
+            self.assertEqual(status, 200)
+            self.assertEqual(b''.join(body), response.content)
+            self.assertEqual(headers['content-type'], response['Content-Type'])
+            self.assertEqual(headers['etag'], response['ETag'])
+        status, _, _ = self.request('/api/phones/0/')
+        self.assertEqual(status, 404)
+
+    def test_cached_on_event_loop(self):
+        path = '/api/phones/%d/' % self.phones[0].id
+        status, headers, body = self.request(path)
+        with mock.patch.object(
+            self.application, 'get_response_async'
+        ) as get_response_async, query_budget(None) as budget:
+            cached = self.request(path)
+            not_modified = self.request(path, headers=[
+                (b'if-none-match', headers['etag'].encode())
+            ])
+        get_response_async.assert_not_called()
+        self.assertEqual(budget.count, 0)
+        self.assertEqual(cached[0], status)
+        self.assertEqual(cached[1]['etag'], headers['etag'])
+        self.assertEqual(cached[2], body)
+        self.assertEqual(not_modified[0], 304)
+
+    def test_other_views(self):
+        with mock.patch.object(NDJSONRenderer, 'chunk_size', 1):
+            status, headers, body = self.request(
+                '/api/phones/export/', query=b'format=ndjson'
+            )
+        self.assertEqual(status, 200)
+        self.assertEqual(body[-1], b'')  # Streamed, then closed
+        lines = b''.join(body).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertGreater(len(body), 3)
+
+        status, _, _ = self.request(
+            '/api/phones/reserve/', method='POST',
+            headers=[(b'content-type', b'application/json')]
+        )
+        self.assertEqual(status, 403)
+
+    def test_lifespan(self):
+        received = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+        messages = []
+
+        async def receive():
+            return received.pop(0)
+
+        async def send(message):
+            messages.append(message['type'])
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(
+                self.application({'type': 'lifespan'}, receive, send)
+            )
+        finally:
+            loop.close()
+        self.assertEqual(messages, [
+            'lifespan.startup.complete', 'lifespan.shutdown.complete'
+        ])
+
+
+class GunicornTests(TransactionTestCase):
+    ''' Server settings (gunicorn.conf.py), and the server they run. '''
+    config_script = (
+        'import gc, json, runpy; '
+        'config = runpy.run_path("gunicorn.conf.py"); '
+        'config["gc_enabled"] = gc.isenabled(); '
+        'print(json.dumps({name: config[name] for name in ['
+        '"workers", "worker_class", "preload_app", "max_requests", '
+        '"max_requests_jitter", "CORES", "gc_enabled"]}))'
+    )
+
+    def read_config(self, **variables):
+        environ = dict(os.environ)
+        for name in ['WEB_CONCURRENCY', 'PRELOAD_APP', 'MAX_REQUESTS']:
+            environ.pop(name, None)
+        environ.update(variables)
+        output = subprocess.check_output(
+            [sys.executable, '-c', self.config_script], env=environ,
+            cwd=os.path.dirname(os.path.dirname(__file__))
+        )
+        return json.loads(output.decode())
+
+    def test_config(self):
+        config = self.read_config()
+        self.assertEqual(config['workers'], config['CORES'] * 2 + 1)
+        self.assertTrue(config['preload_app'])
+        # Loading the settings (again, on reload) leaves the master alone
+        self.assertTrue(config['gc_enabled'])
+        self.assertEqual(config['max_requests'], 1000)
+        self.assertEqual(config['max_requests_jitter'], 100)
+        config = self.read_config(SERVER_INTERFACE='asgi')
+        self.assertEqual(config['workers'], config['CORES'])
+        self.assertEqual(
+            config['worker_class'], 'uvicorn.workers.UvicornWorker'
+        )
+        config = self.read_config(
+            WEB_CONCURRENCY='3', PRELOAD_APP='false', MAX_REQUESTS='50'
+        )
+        self.assertEqual(config['workers'], 3)
+        self.assertFalse(config['preload_app'])
+        self.assertEqual(config['max_requests'], 50)
+
+    def test_preload(self):
+        # Workers forked from the application loaded by the master process
+        # (with its garbage collection frozen) answer requests
+        from .benchmarks.servers import Server
+        create_phone(Company.objects.create(name='Google'), 1)
+        with Server('wsgi', connection.settings_dict['NAME'], workers=2,
+                preload=True) as server:
+            for _ in range(4):
+                with urlopen(server.url + '/api/phones/') as response:
+                    self.assertEqual(response.status, 200)
+                    self.assertEqual(len(json.loads(response.read())), 1)
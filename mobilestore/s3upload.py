@@ -0,0 +1,176 @@
+import hashlib
+import io
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+WORKERS = 16 # Concurrent uploads
+# Objects up to this size are sent in a single PUT, so that their ETag is the
+# MD5 of their content (and can be compared before uploading them again)
+MULTIPART_THRESHOLD = 64 * 1024 * 1024 # Bytes
+MULTIPART_CHUNKSIZE = 16 * 1024 * 1024 # Bytes
+MAX_ATTEMPTS = 5 # Attempts at each request, on errors and throttling
+
+
+def new_client(workers=WORKERS, **client_args):
+    '''
+    Creates an S3 client for concurrent use by a number of threads.
+
+    Requires:
+        - workers (int - optional): threads sharing the client;
+        - client_args: other arguments of boto3's client (e.g. endpoint_url).
+    Ensures:
+        Returns a client with a connection for each thread, and retries
+        with a backoff.
+    '''
+    config = Config(
+        max_pool_connections=workers,
+        retries={'max_attempts': MAX_ATTEMPTS}
+    )
+    # A session of its own: the default one is not thread safe
+    return boto3.session.Session().client('s3', config=config, **client_args)
+
+
+class S3Uploader(object):
+    '''
+    Uploads objects to an S3 bucket in the background, with a pool of threads
+    sharing a single client:
+
+        uploader = S3Uploader('bucket')
+        uploader.upload('img/name.jpg', data, 'image/jpeg')
+        ...
+        uploader.close()  # Waits for the uploads
+
+    Objects already in the bucket with the same content (their ETag is the
+    MD5 of the data) and headers are skipped, and objects uploaded by this
+    uploader are only sent once.
+    '''
+
+    def __init__(self, bucket, client=None, workers=WORKERS,
+        cache_control=None):
+        '''
+        Requires:
+            - self: an object of the S3Uploader class;
+            - bucket (str): name of the bucket;
+            - client (obj - optional): the boto3 S3 client used (default:
+            new_client);
+            - workers (int - optional): number of concurrent uploads;
+            - cache_control (str - optional): Cache-Control header of the
+            objects.
+        '''
+        self.bucket = bucket
+        self.client = client or new_client(workers)
+        self.cache_control = cache_control
+        # Each thread sends its objects in one go: the pool is the concurrency
+        self.transfer_config = TransferConfig(
+            multipart_threshold=MULTIPART_THRESHOLD,
+            multipart_chunksize=MULTIPART_CHUNKSIZE,
+            use_threads=False
+        )
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._lock = threading.Lock()
+        self._uploads = {}
+        self._stats = {
+            'uploaded': 0, 'skipped': 0, 'failed': 0, 'bytes_uploaded': 0,
+            'seconds': 0.0,
+        }
+        self._start = time.perf_counter()
+
+    def upload(self, key, data, content_type):
+        '''
+        Queues an object for upload.
+
+        Requires:
+            - self: an object of the S3Uploader class;
+            - key (str): name of the object;
+            - data (bytes): its content;
+            - content_type (str): its Content-Type header.
+        Ensures:
+            Returns a Future, with the outcome of the upload: 'uploaded',
+            'skipped' (already in the bucket) or 'failed' (logged). An
+            object already queued is not queued again.
+        '''
+        with self._lock:
+            if key not in self._uploads:
+                self._uploads[key] = self._executor.submit(
+                    self._upload, key, data, content_type
+                )
+            return self._uploads[key]
+
+    def is_uploaded(self, key, data, content_type):
+        '''
+        Returns whether an object is in the bucket with the given content
+        (same MD5) and headers.
+        '''
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as error:
+            if error.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                return False
+            raise
+        return (
+            head['ETag'].strip('"') == hashlib.md5(data).hexdigest()
+            and head.get('ContentType') == content_type
+            and head.get('CacheControl') == self.cache_control
+        )
+
+    def _upload(self, key, data, content_type):
+        try:
+            if self.is_uploaded(key, data, content_type):
+                self._count('skipped')
+                return 'skipped'
+            extra_args = {'ContentType': content_type}
+            if self.cache_control:
+                extra_args['CacheControl'] = self.cache_control
+            self.client.upload_fileobj(
+                io.BytesIO(data), self.bucket, key, ExtraArgs=extra_args,
+                Config=self.transfer_config
+            )
+        except Exception:
+            logging.exception('Unable to upload %s to S3.' % key)
+            self._count('failed')
+            return 'failed'
+        self._count('uploaded')
+        self._count('bytes_uploaded', len(data))
+        return 'uploaded'
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self._stats[name] += value
+
+    def stats(self):
+        '''
+        Returns the upload metrics (dict): objects uploaded, skipped and
+        failed, bytes uploaded, and seconds since the uploader started (until
+        it was closed).
+        '''
+        with self._lock:
+            stats = dict(self._stats)
+        if not stats['seconds']:
+            stats['seconds'] = time.perf_counter() - self._start
+        return stats
+
+    def format_stats(self):
+        stats = self.stats()
+        return (
+            '%(uploaded)d uploaded (%(bytes_uploaded)d bytes), %(skipped)d '
+            'skipped, %(failed)d failed, in %(seconds).2fs' % stats
+        )
+
+    def close(self):
+        '''
+        Waits for the queued uploads, and logs the upload metrics.
+
+        Ensures: Returns the metrics (dict), as in stats.
+        '''
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            self._stats['seconds'] = time.perf_counter() - self._start
+        logging.info('S3 uploads done (%s).' % self.format_stats())
+        return self.stats()
@@ -0,0 +1,1284 @@
+import hashlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock, skipUnless
+
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase
+
+import lxml.html
+import psycopg2
+from selenium.common.exceptions import NoSuchElementException
+
+import s3upload
+import worker
+from database import ConnectionPool, PoolTimeout
+from httpcache import CacheMiss, HttpCache
+from httpdriver import HttpDriver, element_text
+from phones import images
+from phones.models import CrawlJob, Phone, PhoneSource, Company
+from phones.search import search
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def read_fixture(name):
+    ''' Returns the content of a stored page. '''
+    with open(os.path.join(FIXTURES_DIR, name), 'rb') as file:
+        return file.read()
+
+
+def worker_config():
+    ''' Worker database settings, pointing to the test database. '''
+    db = connection.settings_dict
+    return {
+        worker.env: {
+            'NAME': db['NAME'],
+            'USER': db['USER'],
+            'PASSWORD': db['PASSWORD'] or '',
+            'HOST': db['HOST'],
+            'PORT': db['PORT'] or '5432',
+        }
+    }
+
+
+def json_phone(number, company='Company', **fields):
+    ''' Returns a phone as saved in the placeholder JSON data file. '''
+    phone = {
+        'model': 'Phone %d' % number,
+        'img': 'img/default.png',
+        'company': company,
+        'price': 100 + number,
+        'info': 'Description of phone %d.' % number,
+        'specs': {'platform': 'Android', 'number': number},
+    }
+    phone.update(fields)
+    return phone
+
+
+class FixtureServer(object):
+    '''
+    Local HTTP server standing in for the scraped websites: serves the given
+    pages (bytes or str, by path) after an artificial latency, and counts the
+    requests for each path. Pages have an ETag, and conditional requests get
+    304 Not Modified when they did not change.
+    '''
+
+    def __init__(self, pages, latency=0):
+        self.pages = pages
+        self.latency = latency
+        self.hits = {}
+
+    def __enter__(self):
+        fixture = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                fixture.hits[self.path] = fixture.hits.get(self.path, 0) + 1
+                time.sleep(fixture.latency)
+                page = fixture.pages.get(self.path)
+                if page is None:
+                    self.send_error(404)
+                    return
+                if isinstance(page, str):
+                    page = page.encode('utf-8')
+                etag = '"%s"' % hashlib.md5(page).hexdigest()
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(page)))
+                self.end_headers()
+                self.wfile.write(page)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:%d' % self.server.server_port
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class S3Server(object):
+    '''
+    Local HTTP server standing in for S3 (path style addressing, no
+    authentication): objects are stored in memory, by bucket and key, with
+    their Content-Type and Cache-Control, and their ETag is the MD5 of their
+    content. Requests are answered after an artificial latency, and counted
+    by method.
+    '''
+
+    def __init__(self, latency=0):
+        self.latency = latency
+        self.objects = {}
+        self.requests = {}
+
+    def client(self, workers=s3upload.WORKERS):
+        ''' Returns an S3 client (as s3upload.new_client) of the server. '''
+        return s3upload.new_client(
+            workers, endpoint_url=self.url, region_name='us-east-1',
+            aws_access_key_id='key', aws_secret_access_key='secret'
+        )
+
+    def __enter__(self):
+        stand_in = self
+        lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, and answers to 'Expect: 100-continue'
+            protocol_version = 'HTTP/1.1'
+
+            def count(self):
+                with lock:
+                    stand_in.requests[self.command] = (
+                        stand_in.requests.get(self.command, 0) + 1
+                    )
+                time.sleep(stand_in.latency)
+
+            def do_PUT(self):
+                self.count()
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                stand_in.objects[self.path] = {
+                    'body': body,
+                    'ETag': '"%s"' % hashlib.md5(body).hexdigest(),
+                    'Content-Type': self.headers.get('Content-Type'),
+                    'Cache-Control': self.headers.get('Cache-Control'),
+                }
+                self.send_response(200)
+                self.send_header('ETag', stand_in.objects[self.path]['ETag'])
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def do_HEAD(self):
+                self.count()
+                stored = stand_in.objects.get(self.path)
+                if stored is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                for header in ['ETag', 'Content-Type', 'Cache-Control']:
+                    if stored[header] is not None:
+                        self.send_header(header, stored[header])
+                self.send_header('Content-Length', str(len(stored['body'])))
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:%d' % self.server.server_port
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class WorkerDatabaseTestCase(TransactionTestCase):
+    ''' Base test case - the worker connects to the test database. '''
+
+    def setUp(self):
+        patcher = mock.patch.object(worker, 'config', worker_config())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(worker.close_pool)
+
+    def write_json(self, data):
+        ''' Saves data to a temporary JSON file, and returns its path. '''
+        handle, path = tempfile.mkstemp(suffix='.json')
+        with os.fdopen(handle, 'w') as file:
+            json.dump(data, file)
+        self.addCleanup(os.remove, path)
+        return path
+
+
+class JSONChunksTests(TestCase):
+    ''' Reading a JSON list in chunks. '''
+
+    def test_same_as_json_load(self):
+        data = [
+            json_phone(i, info='Quote \' and ] and , %d' % i) for i in range(20)
+        ]
+        data += [1, 22.5, 'text', None, [1, [2]], {}]
+        text = json.dumps(data, indent=2)
+        for chunk_size in [1, 7, 100, len(text) + 1]:
+            items = list(worker.iter_json_list(io.StringIO(text), chunk_size))
+            self.assertEqual(items, data)
+
+    def test_empty_and_invalid(self):
+        self.assertEqual(list(worker.iter_json_list(io.StringIO(' [ ] '))), [])
+        for text in ['{}', '[1, 2', '[1 2]', '[{"a": ]']:
+            with self.assertRaises(ValueError):
+                list(worker.iter_json_list(io.StringIO(text), 2))
+
+
+class BulkInsertTests(WorkerDatabaseTestCase):
+    ''' Bulk ingestion of the JSON data file. '''
+
+    def saved(self):
+        return worker.metrics.get_sample_value('crawl_phones_saved_total')
+
+    def test_bulk_insert(self):
+        data = [
+            json_phone(i, company='Company %d' % (i % 3)) for i in range(25)
+        ]
+        path = self.write_json(data)
+        total, rate = worker.readfile_bulk(path, batch_size=10)
+        self.assertEqual(total, 25)
+        self.assertGreater(rate, 0)
+        self.assertEqual(Phone.objects.count(), 25)
+        self.assertEqual(Company.objects.count(), 3)
+        phone = Phone.objects.get(model='Phone 4')
+        self.assertEqual(phone.manufacturer.name, 'Company 1')
+        self.assertEqual(phone.specs, {'platform': 'Android', 'number': 4})
+        self.assertEqual(
+            list(search(Phone.objects.all(), 'Company 1 phone 4')), [phone]
+        )
+
+    def test_existing_phones(self):
+        path = self.write_json([json_phone(1)])
+        worker.readfile_bulk(path)
+        stock = Phone.objects.get().stock
+
+        path = self.write_json([json_phone(1, price=5), json_phone(2)])
+        saved = self.saved()
+        worker.readfile_bulk(path)
+        self.assertEqual(Phone.objects.count(), 2)
+        self.assertEqual(Phone.objects.get(model='Phone 1').price, 101)
+        # The phone skipped isn't counted
+        self.assertEqual(self.saved(), saved + 1)
+
+        worker.readfile_bulk(path, update=True)
+        phone = Phone.objects.get(model='Phone 1')
+        self.assertEqual((phone.price, phone.stock), (5, stock))
+        self.assertEqual(self.saved(), saved + 3)
+
+
+class PoolTests(TestCase):
+    ''' Concurrent fetchers, and their rate limits. '''
+
+    def fetch_all(self, urls, workers, limiter=None):
+        ''' Fetches urls in a pool, returning the seconds it took. '''
+        limiter = limiter or worker.RateLimiter(0)
+
+        def fetch(url, resource):
+            limiter.wait(url)
+            urllib.request.urlopen(url).read()
+
+        start = time.perf_counter()
+        worker.run_pool(urls, fetch, workers)
+        return time.perf_counter() - start
+
+    def test_speedup(self):
+        pages = {'/phone/%d' % i: 'Phone %d' % i for i in range(16)}
+        with FixtureServer(pages, latency=0.1) as server:
+            urls = [server.url + path for path in pages]
+            sequential = self.fetch_all(urls, workers=1)
+            concurrent = self.fetch_all(urls, workers=8)
+            self.assertEqual(sum(server.hits.values()), 32)
+        self.assertGreater(sequential / concurrent, 3)
+
+    def test_rate_limit_per_host(self):
+        pages = {'/phone/%d' % i: 'Phone %d' % i for i in range(10)}
+        with FixtureServer(pages) as server:
+            other = server.url.replace('127.0.0.1', 'localhost')
+            limiter = worker.RateLimiter({
+                server.url[len('http://'):]: 0.05, None: 0
+            })
+            limited = self.fetch_all(
+                [server.url + path for path in pages], 8, limiter
+            )
+            unlimited = self.fetch_all(
+                [other + path for path in pages], 8, limiter
+            )
+        self.assertGreaterEqual(limited, 0.45)
+        self.assertLess(unlimited, 0.45)
+
+    def test_resources_released(self):
+        started, released, done = [], [], []
+
+        def setup():
+            started.append(object())
+            return started[-1]
+
+        def work(task, resource):
+            if task == 3:
+                raise KeyboardInterrupt()
+            time.sleep(0.01)
+            done.append(task)
+
+        with self.assertRaises(KeyboardInterrupt), self.assertLogs():
+            worker.run_pool(range(100), work, 2, setup, released.append)
+        self.assertEqual(sorted(map(id, started)), sorted(map(id, released)))
+        self.assertLess(len(done), 99)
+
+
+class BatchWriterTests(WorkerDatabaseTestCase):
+    ''' Phones scraped concurrently, saved by a single writer. '''
+
+    def scraped_phone(self, number):
+        details = worker.read_phone(json_phone(number))
+        details['features'] = details['battery'] = ''
+        return details
+
+    def test_batches(self):
+        writer = worker.BatchWriter(batch_size=10, flush_interval=60)
+        writer.start()
+        with mock.patch.object(
+            worker, 'insert_batch', wraps=worker.insert_batch
+        ) as insert_batch:
+            threads = [
+                threading.Thread(target=lambda n=n: [
+                    writer.put(self.scraped_phone(n * 100 + i))
+                    for i in range(5)
+                ])
+                for n in range(5)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            writer.close()
+        self.assertEqual(writer.saved, 25)
+        self.assertEqual(insert_batch.call_count, 3)
+        self.assertEqual(Phone.objects.count(), 25)
+
+    def test_flush_interval(self):
+        writer = worker.BatchWriter(batch_size=10, flush_interval=0.05)
+        writer.start()
+        writer.put(self.scraped_phone(1))
+        time.sleep(0.5)
+        self.assertEqual(Phone.objects.count(), 1)
+        writer.close()
+
+
+class ConnectionPoolTests(WorkerDatabaseTestCase):
+    ''' Pooled database connections, shared by the worker's threads. '''
+
+    def new_pool(self, size=2, **args):
+        db = worker_config()[worker.env]
+        args = dict(
+            dbname=db['NAME'], user=db['USER'], password=db['PASSWORD'],
+            host=db['HOST'], port=db['PORT'], **args
+        )
+        pool = ConnectionPool(size, **args)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_shared_by_threads(self):
+        pool = self.new_pool(size=2)
+        backends = []
+
+        def work():
+            with pool.connection() as db:
+                db.query('SELECT pg_backend_pid(), pg_sleep(0.05);', ())
+                backends.append(db.fetch_one()[0])
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = pool.stats()
+        self.assertEqual(len(backends), 8)
+        self.assertLessEqual(len(set(backends)), 2)
+        self.assertEqual((stats['acquired'], stats['created']), (8, 2))
+        self.assertEqual(stats['reused'], 6)
+        self.assertGreater(stats['waits'], 0)
+        self.assertGreater(stats['max_wait_seconds'], 0)
+        self.assertEqual((stats['open'], stats['idle']), (2, 2))
+
+    def test_timeout(self):
+        pool = self.new_pool(size=1, timeout=0.05)
+        with pool.connection():
+            with self.assertRaises(PoolTimeout):
+                pool.acquire()
+        with pool.connection() as db:
+            db.query('SELECT 1;', ())
+            self.assertEqual(db.fetch_one()[0], 1)
+
+    def test_connect_error(self):
+        pool = self.new_pool(size=1, connect_timeout=1)
+        pool._connect_args['dbname'] = 'no_such_database'
+        with self.assertRaises(psycopg2.OperationalError):
+            pool.acquire()
+        self.assertEqual(pool.stats()['open'], 0)
+
+    def test_transactions(self):
+        pool = self.new_pool()
+        insert = 'INSERT INTO phones_company (name) VALUES (%s);'
+        with pool.connection() as db:
+            with self.assertRaises(ZeroDivisionError):
+                with db.transaction():
+                    db.query(insert, ('Rolled back',))
+                    with db.transaction():
+                        db.query(insert, ('Nested',))
+                    1 / 0
+            with db.transaction():
+                db.query(insert, ('Committed',))
+            # Left uncommitted, cancelled when given back to the pool
+            db.query(insert, ('Uncommitted',))
+        self.assertEqual(
+            list(Company.objects.values_list('name', flat=True)), ['Committed']
+        )
+        self.assertEqual(pool.stats()['reused'], 0)
+        with pool.connection() as db:
+            db.query('SELECT count(*) FROM phones_company;', ())
+            self.assertEqual(db.fetch_one()[0], 1)
+        self.assertEqual(pool.stats()['reused'], 1)
+
+    def test_stream(self):
+        company = Company.objects.create(name='Company')
+        Phone.objects.bulk_create(
+            Phone(
+                model='Phone %d' % i, manufacturer=company, price=100,
+                description='', specs={}, stock=1,
+            )
+            for i in range(50)
+        )
+        with worker.get_pool().connection() as db:
+            rows = db.stream(
+                'SELECT model FROM phones_phone ORDER BY id;', (), itersize=7
+            )
+            first = next(rows)
+            db.query('SELECT name FROM pg_cursors;', ())
+            self.assertEqual([row[0] for row in db.fetch_all()], ['stream_1'])
+            models = [first['model']] + [row['model'] for row in rows]
+            self.assertEqual(models, ['Phone %d' % i for i in range(50)])
+            self.assertEqual(len(worker.get_models(db)), 50)
+
+
+class HttpCacheTests(TestCase):
+    ''' Persistent cache of the scraped responses. '''
+
+    def setUp(self):
+        self.server = FixtureServer({
+            '/a': b'a' * 100, '/b': b'b' * 100, '/c': b'c' * 100,
+        }).__enter__()
+        self.addCleanup(self.server.__exit__)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cache.sqlite3')
+
+    def new_cache(self, **args):
+        cache = HttpCache(self.path, **args)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_reuse(self):
+        cache = self.new_cache()
+        url = self.server.url + '/a'
+        first = cache.fetch(url)
+        self.assertEqual([first.status, first.body, first.cached],
+            [200, b'a' * 100, False])
+        second = cache.fetch(url)
+        self.assertEqual([second.body, second.cached], [b'a' * 100, True])
+        self.assertEqual(second.etag, first.etag)
+        # Kept across runs
+        self.assertTrue(self.new_cache().fetch(url).cached)
+        self.assertEqual(self.server.hits, {'/a': 1})
+        stats = cache.stats()
+        self.assertEqual([stats['hits'], stats['misses'], stats['entries']],
+            [1, 1, 1])
+
+    def test_revalidate(self):
+        cache = self.new_cache(ttl=0)
+        url = self.server.url + '/a'
+        cache.fetch(url)
+        response = cache.fetch(url)  # 304 Not Modified
+        self.assertEqual([response.body, response.cached], [b'a' * 100, True])
+        self.server.pages['/a'] = b'new'
+        self.assertEqual(cache.fetch(url).body, b'new')
+        self.assertEqual(cache.fetch(url, ttl=60).body, b'new')
+        self.assertEqual(self.server.hits, {'/a': 3})
+        self.assertEqual(cache.stats()['revalidated'], 1)
+
+    def test_conditional(self):
+        cache = self.new_cache()
+        url = self.server.url + '/a'
+        etag = cache.fetch(url).etag
+        response = cache.fetch(url, {'If-None-Match': etag})
+        self.assertEqual([response.status, response.body], [304, b''])
+        response = cache.fetch(url, {'If-None-Match': '"other"'})
+        self.assertEqual([response.status, response.body], [200, b'a' * 100])
+        # Not cached: the server answers
+        response = cache.fetch(self.server.url + '/b', {'If-None-Match':
+            '"%s"' % hashlib.md5(b'b' * 100).hexdigest()})
+        self.assertEqual(response.status, 304)
+        self.assertEqual(self.server.hits, {'/a': 1, '/b': 1})
+
+    def test_lru_eviction(self):
+        cache = self.new_cache(max_size=250)
+        for path in ['/a', '/b', '/a', '/c']:
+            cache.fetch(self.server.url + path)
+        self.assertTrue(cache.is_fresh(self.server.url + '/a'))
+        self.assertFalse(cache.is_fresh(self.server.url + '/b'))
+        self.assertTrue(cache.is_fresh(self.server.url + '/c'))
+        stats = cache.stats()
+        self.assertEqual([stats['evicted'], stats['bytes']], [1, 200])
+
+    def test_offline(self):
+        self.new_cache().fetch(self.server.url + '/a')
+        cache = self.new_cache(ttl=0, offline=True)
+        self.assertEqual(cache.fetch(self.server.url + '/a').body, b'a' * 100)
+        with self.assertRaises(CacheMiss):
+            cache.fetch(self.server.url + '/b')
+        self.assertEqual(self.server.hits, {'/a': 1})
+
+    def test_links(self):
+        cache = self.new_cache()
+        self.assertIsNone(cache.get_link('/search'))
+        cache.add_link('/search', '/a')
+        self.assertEqual(cache.get_link('/search'), '/a')
+        # Kept for ttl seconds, or forever offline
+        self.assertIsNone(self.new_cache(ttl=0).get_link('/search'))
+        self.assertEqual(
+            self.new_cache(ttl=0, offline=True).get_link('/search'), '/a'
+        )
+
+
+class UploadTests(TestCase):
+    ''' Concurrent uploads to S3, skipping the objects already there. '''
+
+    def setUp(self):
+        self.variants = images.build_variants(read_fixture('allo_image.jpg'))
+        self.server = S3Server().__enter__()
+        self.addCleanup(self.server.__exit__)
+
+    def uploader(self, workers=s3upload.WORKERS):
+        return s3upload.S3Uploader(
+            'bucket', self.server.client(workers), workers,
+            cache_control=images.CACHE_CONTROL
+        )
+
+    def upload(self, uploader, variants):
+        ''' Uploads images, and returns the upload metrics. '''
+        for name, content_type, data in variants:
+            uploader.upload(name, data, content_type)
+        with self.assertLogs(level='INFO'):
+            return uploader.close()
+
+    def test_upload(self):
+        uploader = self.uploader()
+        name, content_type, data = self.variants[0]
+        future = uploader.upload(name, data, content_type)
+        self.assertIs(uploader.upload(name, data, content_type), future)
+        stats = self.upload(uploader, self.variants)
+        self.assertEqual(future.result(), 'uploaded')
+        self.assertEqual(stats['uploaded'], len(self.variants))
+        self.assertEqual(self.server.requests['PUT'], len(self.variants))
+        for name, content_type, data in self.variants:
+            stored = self.server.objects['/bucket/' + name]
+            self.assertEqual(stored['body'], data)
+            self.assertEqual(stored['Content-Type'], content_type)
+            self.assertEqual(stored['Cache-Control'], images.CACHE_CONTROL)
+
+        # Same content and headers: skipped, unless the headers changed
+        self.server.objects['/bucket/' + name]['Cache-Control'] = None
+        stats = self.upload(self.uploader(), self.variants)
+        self.assertEqual(stats['skipped'], len(self.variants) - 1)
+        self.assertEqual(stats['uploaded'], 1)
+        self.assertEqual(self.server.requests['PUT'], len(self.variants) + 1)
+        self.assertEqual(
+            self.server.objects['/bucket/' + name]['Cache-Control'],
+            images.CACHE_CONTROL
+        )
+
+    def test_failed(self):
+        uploader = self.uploader()
+        name, content_type, data = self.variants[0]
+        with mock.patch.object(
+                uploader.client, 'upload_fileobj', side_effect=OSError()), \
+                self.assertLogs(level='ERROR'):
+            self.assertEqual(
+                uploader.upload(name, data, content_type).result(), 'failed'
+            )
+        self.assertEqual(self.upload(uploader, [])['failed'], 1)
+
+    def test_speedup(self):
+        self.server.latency = 0.02
+        variants = [
+            ('img/%d.jpg' % i, 'image/jpeg', b'%d' % i) for i in range(32)
+        ]
+        sequential = self.upload(self.uploader(workers=1), variants)
+        self.server.objects.clear()
+        concurrent = self.upload(self.uploader(workers=8), variants)
+        self.assertEqual(concurrent['uploaded'], 32)
+        self.assertGreater(sequential['seconds'] / concurrent['seconds'], 3)
+
+    def test_save_images(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        os.makedirs(os.path.join(media.name, 'media', 'img'))
+        client = self.server.client()
+        for name, value in [
+            ('env', 'PRODUCTION'), ('bucket', 'bucket'),
+            ('BASE_DIR', media.name),
+            ('S3Uploader', lambda bucket, **kwargs: s3upload.S3Uploader(
+                bucket, client, **kwargs
+            )),
+        ]:
+            patcher = mock.patch.object(worker, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(worker.close_uploader)
+
+        self.assertEqual(
+            worker.save_images(self.variants), self.variants[0][0]
+        )
+        with self.assertLogs(level='INFO'):
+            worker.close_uploader()
+        self.assertEqual(
+            sorted(self.server.objects),
+            sorted('/bucket/' + name for name, _, _ in self.variants)
+        )
+
+
+class ScraperPages(object):
+    '''
+    Test case mixin - the scraped websites are served from stored pages, and
+    images are saved to a temporary directory.
+    '''
+    results_path = '/gsmarena/results.php3'
+    phone_path = '/gsmarena/google_pixel_3-9256.php'
+    image = read_fixture('allo_image.jpg')
+
+    def pages(self):
+        search = '/allo/catalogsearch/result/index/?cat=3&q=Google+Pixel+3'
+        return {
+            self.results_path:
+                '<div class="makers"><a href="%s">Pixel 3</a></div>'
+                % self.phone_path,
+            self.phone_path: read_fixture('gsmarena_phone.html'),
+            '/fonearena/csearch.php?q=Google+Pixel+3':
+                read_fixture('fonearena_search.html'),
+            '/phones/Google-Pixel-3_id8040.html':
+                read_fixture('fonearena_phone.html'),
+            search: read_fixture('allo_search.html'),
+            '/ru/products/mobile/google-pixel-3-64gb-black.html':
+                read_fixture('allo_phone.html'),
+            '/media/catalog/product/pixel3_600x415.jpg': self.image,
+        }
+
+    def setUp(self):
+        super().setUp()
+        self.server = FixtureServer(self.pages()).__enter__()
+        self.addCleanup(self.server.__exit__)
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        os.mkdir(os.path.join(media.name, 'media'))
+        os.mkdir(os.path.join(media.name, 'media', 'img'))
+        for name, value in [
+            ('BASE_DIR', media.name),
+            ('FONEARENA_SEARCH', self.server.url + '/fonearena/csearch.php?q='),
+            ('ALLO_SEARCH', self.server.url + '/allo/' + 
+                'catalogsearch/result/index/?cat=3&q='),
+        ]:
+            patcher = mock.patch.object(worker, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(worker.close_http_cache)
+        self.media = os.path.join(media.name, 'media')
+
+
+class ScraperPagesTestCase(ScraperPages, TestCase):
+    ''' Base test case - scraping stored pages (see ScraperPages). '''
+
+
+class HttpDriverTests(ScraperPagesTestCase):
+    ''' Browserless scraping backend, and its fallback to a browser. '''
+
+    expected_details = {
+        'network': {
+            'technology': 'GSM / CDMA / HSPA / EVDO / LTE',
+            '2gbands': 'GSM 850 / 900 / 1800 / 1900',
+        },
+        'body': {
+            'dimensions': '145.6 x 68.2 x 7.9 mm (5.73 x 2.69 x 0.31 in)',
+            'build': 'Front/back glass (Gorilla Glass 5), aluminum frame',
+            'sim': 'Nano-SIM, eSIM - IP68 dust/water resistant '
+                '(up to 1.5m for 30 mins)',
+        },
+        'display': {
+            'type': 'P-OLED capacitive touchscreen, 16M colors',
+            'size': '5.5 inches, 77.2 cm2 (~77.2% screen-to-body ratio)',
+        },
+        'platform': {
+            'os': 'Android 9.0 (Pie)',
+            'chipset': 'Qualcomm SDM845 Snapdragon 845 (10 nm)',
+        },
+        'memory': {'cardslot': 'No', 'internal': '64/128 GB, 4 GB RAM'},
+        'maincamera': {
+            'single': '12.2 MP, f/1.8, 28mm (wide), 1/2.55", 1.4\u00b5m, '
+                'dual pixel PDAF, OIS',
+            'features': 'Dual-LED flash, Auto-HDR, panorama',
+        },
+        'features': {
+            'sensors': 'Fingerprint (rear-mounted), accelerometer, gyro, '
+                'proximity, compass, barometer',
+        },
+        'battery': {
+            '': 'Non-removable Li-Po 2915 mAh battery',
+            'charging': 'Fast battery charging 18W Qi wireless charging',
+        },
+        'misc': {'price': 'About 700 EUR'},
+        'manufacturer': 'Google',
+        'priceusd': '$799.00',
+        'description': 'The Pixel 3 ensures that there\'s never a dull moment.',
+        'rearcamera': '12.2 MP Rear Camera with dual-pixel, 8 MP',
+        'frontcamera': '8 MP',
+    }
+
+    def scrape(self, driver):
+        ''' Returns the details and image found with the given driver. '''
+        try:
+            driver.get(self.server.url + self.phone_path)
+            model = driver.find_element_by_class_name(
+                'specs-phone-name-title'
+            ).text
+            self.assertEqual(model, 'Google Pixel 3')
+            with self.assertLogs(level='ERROR'):  # Misc disclaimer row
+                details = worker.get_details(model, driver)
+            return details, worker.get_img(model, driver)
+        finally:
+            driver.quit()
+
+    def test_details(self):
+        details, image = self.scrape(HttpDriver())
+        self.assertEqual(details, self.expected_details)
+        self.assertEqual(image, images.build_variants(self.image)[0][0])
+        with open(os.path.join(self.media, image), 'rb') as file:
+            self.assertEqual(file.read(), self.image)
+        for size in [None, images.THUMBNAIL_SIZE]:
+            self.assertTrue(os.path.exists(os.path.join(
+                self.media, images.variant_name(image, size, 'webp')
+            )))
+
+    def test_phone_info(self):
+        driver = HttpDriver()
+        with self.assertLogs(level='ERROR'):
+            info = worker.get_phone_info(
+                self.server.url + self.phone_path, driver, set()
+            )
+        self.assertEqual(info['model'], 'Google Pixel 3')
+        self.assertEqual(info['price'], 799)
+        self.assertEqual(json.loads(info['specs'])['camera'], {
+            'main': '12.2 MP Rear Camera with dual-pixel, 8 MP',
+            'selfie': '8 MP',
+            'features': 'Dual-LED flash, Auto-HDR, panorama',
+        })
+        self.assertEqual(
+            worker.get_phone_info(
+                self.server.url + self.phone_path, driver, {'Google Pixel 3'}
+            ),
+            'Google Pixel 3'
+        )
+
+    def test_fallback(self):
+        # Search results and image viewer only added by JavaScript
+        pages = self.server.pages
+        search = '/fonearena/csearch.php?q=Google+Pixel+3'
+        product = '/ru/products/mobile/google-pixel-3-64gb-black.html'
+        pages['/rendered' + search] = pages[search]
+        pages[search] = read_fixture('fonearena_search_js.html')
+        pages['/rendered' + product] = pages[product]
+        pages[product] = b'<div class="zoomImageMediaTab-main">Photo</div>'
+
+        browsers = []
+
+        class Browser(HttpDriver):
+            ''' A browser stand-in, where the JavaScript has been run. '''
+            def __init__(self):
+                super().__init__()
+                browsers.append(self)
+
+            def get(self, url):
+                super().get(url.replace('/fonearena/', '/rendered/fonearena/')
+                    .replace('/ru/', '/rendered/ru/'))
+
+        details, image = self.scrape(HttpDriver(fallback=Browser))
+        self.assertEqual(details, self.expected_details)
+        self.assertEqual(image, images.build_variants(self.image)[0][0])
+        self.assertEqual(len(browsers), 1)
+        # Click on the image viewer tab replayed in the browser
+        self.assertEqual(
+            browsers[0]._clicks, [[('class_name', 'zoomImageMediaTab-main', None)]]
+        )
+
+    def test_fallback_link_cached(self):
+        # The search result followed in the browser is loaded over HTTP, and
+        # from the cache next time, even offline, without a browser
+        pages = self.server.pages
+        search = '/fonearena/csearch.php?q=Google+Pixel+3'
+        pages['/rendered' + search] = pages[search]
+        pages[search] = read_fixture('fonearena_search_js.html')
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'cache.sqlite3')
+        browsers = []
+
+        class Browser(HttpDriver):
+            def __init__(self):
+                super().__init__()
+                browsers.append(self)
+
+            def get(self, url):
+                super().get(url.replace('/fonearena/', '/rendered/fonearena/'))
+
+        for offline in [False, True]:
+            cache = HttpCache(path, offline=offline)
+            self.addCleanup(cache.close)
+            details, _ = self.scrape(HttpDriver(
+                fallback=None if offline else Browser, cache=cache
+            ))
+            self.assertEqual(details, self.expected_details)
+        self.assertEqual(len(browsers), 1)
+        self.assertEqual(self.server.hits['/rendered' + search], 1)
+        # In the browser, then over HTTP
+        self.assertEqual(
+            self.server.hits['/phones/Google-Pixel-3_id8040.html'], 2
+        )
+
+    def test_no_fallback(self):
+        self.server.pages['/fonearena/csearch.php?q=Google+Pixel+3'] = (
+            read_fixture('fonearena_search_js.html')
+        )
+        with self.assertRaises(NoSuchElementException):
+            self.scrape(HttpDriver())
+
+    def test_rate_limited(self):
+        # Pages loaded by following links are rate limited too
+        limiter = mock.Mock(spec=worker.RateLimiter)
+        details, _ = self.scrape(
+            worker.RateLimitedDriver(HttpDriver(), limiter)
+        )
+        self.assertEqual(details, self.expected_details)
+        pages = [
+            path for path in self.server.hits
+            if path != '/media/catalog/product/pixel3_600x415.jpg'
+        ]
+        self.assertEqual(len(pages), 5)
+        self.assertEqual(
+            [call[0][0] for call in limiter.wait.call_args_list],
+            [self.server.url + path for path in pages]
+        )
+
+    def test_element_text(self):
+        html = lxml.html.fragment_fromstring(
+            '<div> A\n  <b>b</b>c<br>d <p>e</p><script>x</script>'
+            '<span>&nbsp;f </span></div>'
+        )
+        self.assertEqual(element_text(html), 'A bc\nd\ne\nf')
+
+    @skipUnless(os.path.exists('chromedriver'), 'Needs chromedriver.')
+    def test_same_as_browser(self):
+        self.assertEqual(
+            self.scrape(worker.new_driver()), self.scrape(HttpDriver())
+        )
+
+
+class RecrawlTests(ScraperPages, WorkerDatabaseTestCase):
+    ''' Incremental crawls - only new and changed pages are parsed. '''
+    fonearena_path = '/phones/Google-Pixel-3_id8040.html'
+    image_path = '/media/catalog/product/pixel3_600x415.jpg'
+
+    def refresh(self):
+        # Logs the counts (and an error for the misc disclaimer row, if the
+        # page is parsed)
+        with self.assertLogs(level='INFO'):
+            return worker.refresh_data(self.server.url + self.results_path)
+
+    def counts(self, **counts):
+        return dict({'unchanged': 0, 'updated': 0, 'added': 0, 'failed': 0},
+            **counts)
+
+    def edit_page(self, old, new):
+        page = self.server.pages[self.phone_path]
+        self.assertIn(old, page)
+        self.server.pages[self.phone_path] = page.replace(old, new)
+
+    def test_refresh(self):
+        hits = self.server.hits
+        self.assertEqual(self.refresh(), self.counts(added=1))
+        phone = Phone.objects.get(model='Google Pixel 3')
+        self.assertEqual(phone.price, 799)
+        source = phone.source
+        self.assertEqual(source.url, self.server.url + self.phone_path)
+        self.assertTrue(source.etag)
+        self.assertEqual(hits[self.image_path], 1)
+
+        # Same page: 304 Not Modified, nothing else requested
+        self.assertEqual(self.refresh(), self.counts(unchanged=1))
+        self.assertEqual(hits[self.phone_path], 2)
+        self.assertEqual(hits[self.fonearena_path], 1)
+        seen = PhoneSource.objects.get(pk=phone.pk)
+        self.assertGreater(seen.last_seen, source.last_seen)
+        self.assertEqual(seen.last_changed, source.last_changed)
+
+        # Changes outside of the details: same content hash
+        self.edit_page(b'</body>', b'<script>ads()</script></body>')
+        self.assertEqual(self.refresh(), self.counts(unchanged=1))
+        self.assertEqual(hits[self.fonearena_path], 1)
+        seen = PhoneSource.objects.get(pk=phone.pk)
+        self.assertNotEqual(seen.etag, source.etag)
+        self.assertEqual(seen.content_hash, source.content_hash)
+
+        # Changed details: only those columns are updated
+        Phone.objects.filter(pk=phone.pk).update(stock=3)
+        self.edit_page(b'Android 9.0 (Pie)', b'Android 10')
+        self.assertEqual(self.refresh(), self.counts(updated=1))
+        updated = Phone.objects.get(pk=phone.pk)
+        self.assertEqual(updated.specs['platform'], 'Android 10')
+        self.assertEqual(
+            [updated.price, updated.description, updated.image, updated.stock],
+            [phone.price, phone.description, phone.image, 3]
+        )
+        self.assertEqual(hits[self.image_path], 1)
+        seen = PhoneSource.objects.get(pk=phone.pk)
+        self.assertNotEqual(seen.content_hash, source.content_hash)
+        self.assertGreater(seen.last_changed, source.last_changed)
+
+    def test_no_transaction_during_fetch(self):
+        # No connection is left idle in a transaction while pages load
+        def idle_in_transaction():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT count(*) FROM pg_stat_activity WHERE datname = "
+                    "current_database() AND state = 'idle in transaction';"
+                )
+                return cursor.fetchone()[0]
+
+        counts = []
+        parse_phone = worker.parse_phone
+
+        def parse(*args, **kwargs):
+            counts.append(idle_in_transaction())
+            return parse_phone(*args, **kwargs)
+
+        with mock.patch.object(worker, 'parse_phone', side_effect=parse):
+            self.assertEqual(self.refresh(), self.counts(added=1))
+            self.edit_page(b'Android 9.0 (Pie)', b'Android 10')
+            self.assertEqual(self.refresh(), self.counts(updated=1))
+        self.assertEqual(counts, [0, 0])
+
+    def test_full_crawl_sources(self):
+        with self.assertLogs(level='ERROR'):
+            worker.fetch_data(self.server.url + self.results_path)
+        self.assertEqual(PhoneSource.objects.count(), 1)
+        self.assertEqual(self.refresh(), self.counts(unchanged=1))
+        self.assertEqual(self.server.hits[self.fonearena_path], 1)
+
+    def test_phone_without_source(self):
+        phone = Phone.objects.create(
+            model='Google Pixel 3', price=100, description='Old', specs={},
+            stock=7, image='img/old.jpg',
+            manufacturer=Company.objects.create(name='Google')
+        )
+        self.assertEqual(self.refresh(), self.counts(updated=1))
+        updated = Phone.objects.get(pk=phone.pk)
+        self.assertEqual(updated.price, 799)
+        self.assertEqual(updated.stock, 7)
+        self.assertEqual(updated.image, 'img/old.jpg')
+        self.assertEqual(
+            search(Phone.objects.all(), 'dull moment').get(), updated
+        )
+        self.assertTrue(PhoneSource.objects.filter(pk=phone.pk).exists())
+        self.assertNotIn(self.image_path, self.server.hits)
+
+
+class CachedCrawlTests(ScraperPages, WorkerDatabaseTestCase):
+    ''' Crawls through the HTTP cache. '''
+
+    def crawl(self):
+        Phone.objects.all().delete()
+        with self.assertLogs(level='ERROR'):  # Misc disclaimer row
+            worker.fetch_data(self.server.url + self.results_path)
+        self.assertEqual(
+            Phone.objects.get(model='Google Pixel 3').image,
+            images.build_variants(self.image)[0][0]
+        )
+
+    def test_rerun(self):
+        self.crawl()
+        hits = dict(self.server.hits)
+        self.assertEqual(len(hits), len(self.server.pages))
+        self.crawl()
+        self.assertEqual(self.server.hits, hits)
+
+        # Offline: stale pages replayed, and nothing else requested
+        worker.close_http_cache()
+        self.server.__exit__()
+        for name, value in [('OFFLINE', True), ('HTTP_CACHE_TTL', 0),
+                ('IMAGE_CACHE_TTL', 0)]:
+            patcher = mock.patch.object(worker, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.crawl()
+        self.assertEqual(self.server.hits, hits)
+
+
+class CrawlMetricsTests(ScraperPages, WorkerDatabaseTestCase):
+    ''' Crawl metrics, saved for the node_exporter textfile collector. '''
+
+    def sample(self, name, **labels):
+        return worker.metrics.get_sample_value(name, labels) or 0
+
+    def test_metrics(self):
+        url = self.server.url + self.results_path
+        added = self.sample('crawl_pages_total', result='added')
+        known = self.sample('crawl_pages_total', result='known')
+        saved = self.sample('crawl_phones_saved_total')
+        with self.assertLogs(level='ERROR'):  # Misc disclaimer row
+            worker.fetch_data(url)
+        with self.assertLogs(level='WARNING'):
+            worker.fetch_data(url)
+        self.assertEqual(
+            self.sample('crawl_pages_total', result='added'), added + 1
+        )
+        self.assertEqual(
+            self.sample('crawl_pages_total', result='known'), known + 1
+        )
+        self.assertEqual(self.sample('crawl_phones_saved_total'), saved + 1)
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'crawl.prom')
+        with mock.patch.object(worker, 'METRICS_FILE', path), \
+                self.assertLogs(level='INFO') as logs:
+            worker.save_metrics(2.0)
+        self.assertIn('phones saved', logs.output[0])
+        self.assertEqual(self.sample('crawl_duration_seconds'), 2.0)
+        self.assertEqual(
+            self.sample('crawl_phones_saved_per_second'), (saved + 1) / 2
+        )
+        with open(path) as file:
+            content = file.read()
+        self.assertIn('crawl_pages_total{result="added"}', content)
+        self.assertIn('crawl_last_finished_timestamp_seconds', content)
+
+
+class FrontierTests(ScraperPages, WorkerDatabaseTestCase):
+    ''' Crawl frontier shared by worker processes, through the db. '''
+
+    def claim(self, worker_id='worker', lease=60):
+        with worker.get_pool().connection() as db_connection:
+            return worker.claim_job(db_connection, worker_id, lease)
+
+    def test_claims(self):
+        urls = [self.server.url + '/a', self.server.url + '/b']
+        with worker.get_pool().connection() as db_connection:
+            self.assertEqual(worker.enqueue(db_connection, urls), 2)
+            self.assertEqual(worker.enqueue(db_connection, urls[:1]), 0)
+
+            # Lease expired: claimed again, and the first claim is fenced off
+            first = self.claim('one', lease=0)
+            second = self.claim('two')
+            self.assertEqual(first['url'], urls[0])
+            self.assertEqual(second['url'], urls[0])
+            self.assertEqual(second['attempts'], 2)
+            self.assertIsNone(worker.finish_job(db_connection, first))
+
+            # Retried after a backoff, doubled for each attempt
+            self.assertEqual(
+                worker.finish_job(db_connection, second, 'Boom'), 'retried'
+            )
+            job = CrawlJob.objects.get(url=urls[0])
+            self.assertEqual(job.state, CrawlJob.PENDING)
+            self.assertGreater(
+                job.available_at, job.updated_at + timedelta(seconds=59)
+            )
+            other = self.claim()
+            self.assertEqual(other['url'], urls[1])
+            self.assertEqual(worker.finish_job(db_connection, other), 'done')
+            self.assertIsNone(self.claim())
+            self.assertTrue(worker.has_pending_jobs(db_connection))
+
+            # Failed after MAX_ATTEMPTS
+            CrawlJob.objects.update(available_at=job.updated_at)
+            last = self.claim()
+            self.assertEqual(last['attempts'], worker.MAX_ATTEMPTS)
+            self.assertEqual(
+                worker.finish_job(db_connection, last, 'Boom'), 'failed'
+            )
+            self.assertFalse(worker.has_pending_jobs(db_connection))
+            status = worker.frontier_status(db_connection)
+            self.assertEqual(
+                status['counts'],
+                {'pending': 0, 'running': 0, 'done': 1, 'failed': 1}
+            )
+            self.assertEqual(status['failed'][0]['last_error'], 'Boom')
+
+            # Failed and done pages can be queued again
+            self.assertEqual(worker.retry_failed(db_connection), 1)
+            self.assertEqual(worker.enqueue(db_connection, urls), 1)
+            self.assertEqual(CrawlJob.objects.get(url=urls[0]).attempts, 0)
+
+    def test_lease_expired_on_last_attempt(self):
+        with worker.get_pool().connection() as db_connection:
+            worker.enqueue(db_connection, [self.server.url + '/a'])
+        with mock.patch.object(worker, 'MAX_ATTEMPTS', 1):
+            self.assertIsNotNone(self.claim(lease=0))
+            with self.assertLogs(level='WARNING'):
+                self.assertIsNone(self.claim())
+        job = CrawlJob.objects.get()
+        self.assertEqual(job.state, CrawlJob.FAILED)
+        self.assertEqual(job.last_error, 'Lease expired.')
+
+    def test_lease_lost(self):
+        # The page fails after another worker claimed it again: its outcome
+        # is left to that worker
+        url = self.server.url + self.phone_path
+        with worker.get_pool().connection() as db_connection:
+            worker.enqueue(db_connection, [url])
+
+        def steal(*args):
+            CrawlJob.objects.update(
+                attempts=F('attempts') + 1, claimed_by='two'
+            )
+            raise RuntimeError('Boom')
+
+        lost = worker.metrics.get_sample_value(
+            'crawl_pages_total', {'result': 'lost'}
+        ) or 0
+        with mock.patch.object(worker, 'refresh_phone', side_effect=steal):
+            with self.assertLogs(level='ERROR'):
+                counts = worker.crawl('one', max_jobs=1)
+        self.assertEqual(counts['lost'], 1)
+        self.assertEqual(counts['failed'] + counts['retried'], 0)
+        self.assertEqual(
+            worker.metrics.get_sample_value(
+                'crawl_pages_total', {'result': 'lost'}
+            ), lost + 1
+        )
+        job = CrawlJob.objects.get()
+        self.assertEqual(job.state, CrawlJob.RUNNING)
+        self.assertEqual(job.claimed_by, 'two')
+        self.assertEqual(job.last_error, '')
+
+    def test_lease_renewed(self):
+        # A page slower than its lease is not claimed by another worker
+        self.server.latency = 1.0
+        with worker.get_pool().connection() as db_connection:
+            worker.enqueue(
+                db_connection, [self.server.url + self.results_path],
+                kind='results'
+            )
+        with mock.patch.object(worker, 'LEASE_TIME', 0.6):
+            job = self.claim('one', lease=worker.LEASE_TIME)
+            results = []
+
+            def crawl():
+                with worker.get_pool().connection() as db_connection:
+                    results.append(
+                        worker.crawl_job(job, HttpDriver(), db_connection)
+                    )
+            thread = threading.Thread(target=crawl)
+            thread.start()
+            time.sleep(0.8)
+            self.assertIsNone(self.claim('two'))
+            thread.join()
+        self.assertEqual(results, ['expanded'])
+        self.assertEqual(
+            CrawlJob.objects.get(kind=CrawlJob.RESULTS).state, CrawlJob.DONE
+        )
+
+    def phone_pages(self, count):
+        '''
+        Returns a results page linking to a number of phone pages, and the
+        pages of each phone, as in ScraperPages.
+        '''
+        pages = self.pages()
+        links = []
+        for number in range(count):
+            model = 'Google Pixel 3 %d' % number
+            path = '/gsmarena/google_pixel_3_%d.php' % number
+            query = model.replace(' ', '+')
+            pages[path] = pages[self.phone_path].replace(
+                b'Google Pixel 3', model.encode()
+            )
+            pages['/fonearena/csearch.php?q=' + query] = pages[
+                '/fonearena/csearch.php?q=Google+Pixel+3'
+            ]
+            pages['/allo/catalogsearch/result/index/?cat=3&q=' + query] = \
+                pages['/allo/catalogsearch/result/index/?cat=3&q=Google+Pixel+3']
+            links.append(path)
+        links.append('/gsmarena/missing.php')
+        pages[self.results_path] = '<div class="makers">%s</div>' % ''.join(
+            '<a href="%s">Phone</a>' % link for link in links
+        )
+        return pages, links
+
+    def run_worker(self, *args):
+        ''' Runs the worker's command line in a new process. '''
+        settings = {
+            'config': worker_config(), 'BASE_DIR': worker.BASE_DIR,
+            'FONEARENA_SEARCH': worker.FONEARENA_SEARCH,
+            'ALLO_SEARCH': worker.ALLO_SEARCH,
+            'MAX_ATTEMPTS': 2, 'RETRY_DELAY': 0.1, 'POLL_INTERVAL': 0.05,
+        }
+        script = (
+            'import json, sys, worker\n'
+            'for name, value in json.loads(sys.argv[1]).items():\n'
+            '    setattr(worker, name, value)\n'
+            'worker.main(sys.argv[2:])\n'
+        )
+        environ = dict(
+            os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__))
+        )
+        return subprocess.Popen(
+            [sys.executable, '-c', script, json.dumps(settings)] + list(args),
+            cwd=worker.BASE_DIR, env=environ, stdout=subprocess.PIPE,
+            universal_newlines=True
+        )
+
+    def test_processes(self):
+        pages, links = self.phone_pages(12)
+        self.server.pages = pages
+        self.server.latency = 0.02
+        enqueue = self.run_worker('enqueue', self.server.url + self.results_path)
+        self.assertEqual(enqueue.communicate()[0], '1 pages queued.\n')
+
+        workers = [self.run_worker('crawl') for _ in range(3)]
+        for process in workers:
+            process.communicate()
+            self.assertEqual(process.returncode, 0)
+
+        self.assertEqual(
+            Phone.objects.filter(model__startswith='Google Pixel 3 ').count(),
+            12
+        )
+        # Each page crawled by a single worker, the missing one retried
+        for link in links[:-1]:
+            self.assertEqual(self.server.hits[link], 1)
+        self.assertEqual(self.server.hits[links[-1]], 2)
+        self.assertEqual(self.server.hits[self.results_path], 1)
+
+        status = self.run_worker('status').communicate()[0].splitlines()
+        self.assertEqual(
+            status[0], 'pending: 0, running: 0, done: 13, failed: 1'
+        )
+        self.assertRegex(
+            status[1], r'^failed: .*/gsmarena/missing\.php \(2 attempts\)'
+        )
@@ -1,14 +1,25 @@
-import boto3
+import argparse
+import hashlib
 import os
 import json
-import psycopg2
-import psycopg2.extras
 import logging
 import configparser
 import re
-import urllib.request
+import threading
+import queue
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
+from database import ConnectionPool
+from httpcache import HttpCache, fetch
+from httpdriver import HttpDriver, USER_AGENT
+from s3upload import S3Uploader
+from phones import images
+from prometheus_client import CollectorRegistry, Counter, Gauge
+from prometheus_client import write_to_textfile
 from random import randint
 from datetime import datetime
 import math
@@ -20,7 +31,7 @@ config.read(os.path.join(BASE_DIR, '.ini'))
 
 env = 'TESTING'
 # env = 'PRODUCTION'
-bucket = config['TESTING']['AWS_STORAGE_BUCKET_NAME']
+bucket = config.get('TESTING', 'AWS_STORAGE_BUCKET_NAME', fallback=None)
 
 PATH_TO_FILE = os.path.join(BASE_DIR, 'assets/data.json')
 
@@ -31,91 +42,165 @@ FONEARENA_SEARCH = FONEARENA + 'csearch.php?q='
 ALLO = 'https://allo.ua/ru/'
 ALLO_SEARCH = ALLO + 'catalogsearch/result/index/?cat=3&q=' # cat=3 only phones
 
+SEARCH_CONFIG = 'english' # Full text search configuration (see phones.search)
+
+BATCH_SIZE = 1000 # Phones inserted per transaction, in bulk mode
+CHUNK_SIZE = 64 * 1024 # Characters read from a file at a time, in bulk mode
+
+WORKERS = 4 # Concurrent fetchers (one browser each), in concurrent mode
+RATE_LIMIT = 1.0 # Minimum seconds between requests to the same host
+FLUSH_INTERVAL = 5.0 # Maximum seconds a scraped phone waits to be saved
+
+# Scraped pages and images are kept in an HTTP cache (under BASE_DIR, or None
+# for no cache), and only requested again once they are older than their TTL
+HTTP_CACHE = 'http_cache.sqlite3'
+HTTP_CACHE_TTL = 24 * 3600 # Seconds, pages
+IMAGE_CACHE_TTL = 30 * 24 * 3600 # Seconds, images
+HTTP_CACHE_SIZE = 256 * 1024 * 1024 # Bytes, least recently used evicted first
+OFFLINE = False # Replay cached responses only, without using the network
+
+UPLOAD_WORKERS = 16 # Concurrent uploads of images to S3, in production
+
+# Crawl frontier (see crawl), shared by worker processes through the db
+LEASE_TIME = 300 # Seconds a claimed page is kept from other workers
+MAX_ATTEMPTS = 3 # Attempts at crawling a page before giving up on it
+RETRY_DELAY = 30 # Seconds before a failed page is retried, doubled each time
+POLL_INTERVAL = 1.0 # Seconds between claims, while no page can be claimed
+
+# Crawl metrics, saved after each run (under BASE_DIR, or None for no file) in
+# Prometheus text format, for the node_exporter textfile collector
+METRICS_FILE = 'crawl.prom'
+# Pages lost were claimed again by another worker while they were crawled
+PAGE_RESULTS = ('added', 'updated', 'unchanged', 'known', 'failed', 'lost')
+
+metrics = CollectorRegistry()
+crawled_pages = Counter(
+    'crawl_pages', 'Phone pages crawled, by result.', ['result'],
+    registry=metrics
+)
+saved_phones = Counter(
+    'crawl_phones_saved', 'Phones inserted to the db.', registry=metrics
+)
+crawl_duration = Gauge(
+    'crawl_duration_seconds', 'Duration of the last crawl.', registry=metrics
+)
+crawl_pages_rate = Gauge(
+    'crawl_pages_per_second', 'Phone pages crawled per second, in the last '
+    'crawl.', registry=metrics
+)
+crawl_inserts_rate = Gauge(
+    'crawl_phones_saved_per_second', 'Phones inserted per second, in the '
+    'last crawl.', registry=metrics
+)
+crawl_finished = Gauge(
+    'crawl_last_finished_timestamp_seconds', 'When the last crawl finished.',
+    registry=metrics
+)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_http_cache = None
+_http_cache_lock = threading.Lock()
+_uploader = None
+_uploader_lock = threading.Lock()
+
+
+def get_pool():
+    '''
+    Returns the pool of database connections shared by the worker's threads,
+    opening it on first use.
 
-class MyDatabase(object):
-    ''' A PostgreSQL database connection. '''
-
-    def __init__(self):
-        '''
-        Initiates a connection to the database.
-
-        Requires:
-            - self: an object of the MyDatabase class.
-        Ensures:
-            Saves a newly created connection details to the object:
-            - _conn: a connection established to the database;
-            - _cursor: a cursor connected to the database.
-            If connection is unsuccessful, both values will be None.
-        '''
-        try:
-            self._conn = psycopg2.connect(
+    Ensures: Returns a ConnectionPool for the database of the current env, 
+    with a connection for each fetcher, the batch writer and the main thread.
+    '''
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(
+                size = WORKERS + 2,
                 dbname = config[env]['NAME'], 
                 user = config[env]['USER'], 
                 password = config[env]['PASSWORD'],
                 host = config[env]['HOST'], 
                 port = config[env]['PORT'] 
             )
-            logging.info('Successful connection to DB.')
+            logging.info('Connection pool to db opened.')
+        return _pool
 
-        except:
-            self._conn = None
-            self._cursor = None
-            logging.exception('Unable to connect to the database.')
 
-        else:
-            self._cursor = self._conn.cursor(
-                cursor_factory = psycopg2.extras.DictCursor
-            )
+def close_pool():
+    '''
+    Closes the connections of the pool, if open, and logs its metrics (wait
+    time and connections reused).
+    '''
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
 
-    def query(self, query, params):
-        '''
-        Sends a query to the database and executes it.
 
-        Requires:
-            - self: an object of the MyDatabase class;
-            - query (str): SQL query to be executed; 
-            - params (tuple): parameters specific to the parameterized query 
-            provided.
-        Ensures:
-            Returns a database response, and saves results to the cursor.
-        '''
-        return self._cursor.execute(query, params)
+def get_http_cache():
+    '''
+    Returns the HTTP cache shared by the worker's drivers, opening it on first
+    use.
 
-    def fetch_one(self):
-        '''
-        Iterates the next result from a previous query saved in the cursor.
+    Ensures: Returns an HttpCache (see HTTP_CACHE and OFFLINE), or None if 
+    there is no cache.
+    '''
+    global _http_cache
+    with _http_cache_lock:
+        if _http_cache is None and HTTP_CACHE:
+            _http_cache = HttpCache(
+                os.path.join(BASE_DIR, HTTP_CACHE), 
+                ttl = HTTP_CACHE_TTL, 
+                max_size = HTTP_CACHE_SIZE, 
+                offline = OFFLINE
+            )
+        return _http_cache
 
-        Requires:
-            - self: an object of the MyDatabase class, after a query has been
-            executed.
-        Ensures:
-            Returns the next item from the response saved in the cursor.
-        '''
-        return self._cursor.fetchone()
 
-    def commit(self):
-        '''
-        Makes sure that changes are applied to database.
+def close_http_cache():
+    '''
+    Closes the HTTP cache, if open, and logs its metrics (responses served 
+    from it and fetched).
+    '''
+    global _http_cache
+    with _http_cache_lock:
+        cache, _http_cache = _http_cache, None
+    if cache is not None:
+        cache.close()
 
-        Requires:
-            - self: an object of the MyDatabase class.
-        Ensures:
-            Previous changes are permanently applied to the database.
-        '''
-        self._conn.commit()
 
-    def __del__(self):
-        '''
-        Closes a connection to the database when the object falls out of scope.
+def get_uploader():
+    '''
+    Returns the uploader of images to the S3 bucket, shared by the worker's 
+    threads, starting it on first use.
 
-        Requires:
-            - self: an object of the MyDatabase class.
-        Ensures:
-            Safely closes a connection to the database.
-        '''
-        self._cursor.close()
-        self._conn.close()
-        logging.info('Connection to db terminated safely.')
+    Ensures: Returns an S3Uploader, in production, or None otherwise.
+    '''
+    global _uploader
+    with _uploader_lock:
+        if _uploader is None and env == 'PRODUCTION':
+            _uploader = S3Uploader(
+                bucket, 
+                workers = UPLOAD_WORKERS, 
+                cache_control = images.CACHE_CONTROL
+            )
+        return _uploader
+
+
+def close_uploader():
+    '''
+    Waits for the images queued for upload, if any, and logs the upload 
+    metrics (objects uploaded and skipped).
+    '''
+    global _uploader
+    with _uploader_lock:
+        uploader, _uploader = _uploader, None
+    if uploader is not None:
+        uploader.close()
 
 
 def readfile(filepath):
@@ -128,20 +213,12 @@ def readfile(filepath):
         - data is parsed and added to database, if not already saved.
     '''
 
-    db_connection = MyDatabase()
-
     with open(filepath, 'r') as file:
         data = json.load(file)
 
+    with get_pool().connection() as db_connection:
         for phone in data:
-            details = {}
-            details['model'] = phone['model']
-            details['image'] = phone['img']
-            details['manufacturer'] = phone['company']
-            details['price'] = phone['price']
-            details['description'] = phone['info'].replace("'", "''")
-            details['specs'] = json.dumps(phone['specs'])
-            details['stock'] = randint(1,100)
+            details = read_phone(phone)
 
             query = "SELECT id FROM phones_phone WHERE model=%s;" 
             db_connection.query(query, (details['model'],))
@@ -153,7 +230,217 @@ def readfile(filepath):
                 )
 
 
-def fetch_data(url, limit=1):
+def read_phone(phone):
+    '''
+    Converts a phone read from a JSON file to the details saved in the db.
+
+    Requires: phone (dict), with a phone's model, img, company, price, info 
+    and specs.
+    Ensures: Returns a dictionary with the phone's details, as expected by
+    insert_data.
+    '''
+    details = {}
+    details['model'] = phone['model']
+    details['image'] = phone['img']
+    details['manufacturer'] = phone['company']
+    details['price'] = phone['price']
+    details['description'] = phone['info'].replace("'", "''")
+    details['specs'] = json.dumps(phone['specs'])
+    details['stock'] = randint(1,100)
+    return details
+
+
+def readfile_bulk(filepath, batch_size=BATCH_SIZE, update=False):
+    '''
+    Reads smartphone data from a given JSON file, in bulk: the file is read 
+    in chunks, and phones are sent to the database in batches, with one 
+    statement and one transaction per batch.
+
+    Requires: 
+        - filepath (str): path to a JSON file with a list of phones;
+        - batch_size (int - optional): number of phones per batch;
+        - update (bool - optional): if True, phones already in the database 
+        are updated (except for their stock), otherwise they are skipped.
+    Ensures:
+        Data is parsed and added to database. Returns the number of phones
+        read and the rate of phones saved per second.
+    '''
+    start = datetime.now()
+    total = 0
+    batch = []
+
+    with get_pool().connection() as db_connection, \
+            open(filepath, 'r') as file:
+        companies = get_companies(db_connection)
+        for phone in iter_json_list(file):
+            batch.append(read_phone(phone))
+            if len(batch) == batch_size:
+                insert_batch(db_connection, batch, companies, update)
+                total += len(batch)
+                batch = []
+        if batch:
+            insert_batch(db_connection, batch, companies, update)
+            total += len(batch)
+
+    seconds = (datetime.now() - start).total_seconds()
+    rate = total / seconds if seconds else float(total)
+    logging.info(
+        'Bulk insert of %d phones in %.2fs (%.0f rows/s).' 
+        % (total, seconds, rate)
+    )
+    return total, rate
+
+
+def iter_json_list(file, chunk_size=CHUNK_SIZE):
+    '''
+    Parses a JSON list from a file, one item at a time, reading the file in
+    chunks instead of all at once.
+
+    Requires: 
+        - file (file object): opened in text mode, containing a JSON list;
+        - chunk_size (int - optional): number of characters read at a time.
+    Ensures:
+        Yields each item of the list, in order.
+    '''
+    decoder = json.JSONDecoder()
+    buffer = file.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError('Expected a JSON list.')
+    buffer = buffer[1:]
+    finished = False
+
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except ValueError:
+            # Item cut at the end of the chunk - read some more
+            if finished:
+                raise
+            chunk = file.read(chunk_size)
+            finished = not chunk
+            buffer += chunk
+            continue
+        if buffer[end:].lstrip()[:1] not in (',', ']'):
+            # Items end before a comma or the end of the list, otherwise they
+            # may continue in the next chunk (as numbers do)
+            if finished:
+                raise ValueError('Invalid JSON list.')
+            chunk = file.read(chunk_size)
+            finished = not chunk
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+def get_models(db_con):
+    '''
+    Reads the models of all phones in the database, streamed with a 
+    server-side cursor, so the whole result is never held by the client.
+
+    Requires: db_con (Database): a pooled database connection.
+    Ensures: Returns a set with the models.
+    '''
+    return {
+        row[0] for row in db_con.stream("SELECT model FROM phones_phone;", ())
+    }
+
+
+def get_companies(db_con):
+    '''
+    Reads all companies in the database, to be used as a cache.
+
+    Requires: db_con (Database): a pooled database connection.
+    Ensures: Returns a dictionary with the id of each company, by name.
+    '''
+    with db_con.transaction():
+        db_con.query("SELECT name, id FROM phones_company;", ())
+        return {name: key for name, key in db_con.fetch_all()}
+
+
+def insert_batch(db_con, phones, companies, update=False):
+    '''
+    Inserts data about many phones to the provided database, in a single 
+    transaction, along with the companies that manufacture them, if needed.
+
+    Requires:
+        - db_con (Database): a pooled database connection;
+        - phones (list): dictionaries with each phone's details, as in
+        insert_data;
+        - companies (dict): id of each company known to be in the db, by name,
+        which is updated with the new companies;
+        - update (bool - optional): if True, phones already in the database 
+        are updated (except for their stock), otherwise they are skipped.
+    Ensures:
+        - data is saved to database.
+    '''
+    with db_con.transaction():
+        saved = _insert_batch(db_con, phones, companies, update)
+        save_sources(db_con, phones)
+    saved_phones.inc(saved)
+    logging.info('Batch of %d phones sent to the db.' % len(phones))
+
+
+def _insert_batch(db_con, phones, companies, update):
+    # Insert new companies to db
+    new_companies = sorted({
+        phone['manufacturer'] for phone in phones 
+        if phone['manufacturer'] not in companies
+    })
+    if new_companies:
+        db_con.query_values(
+            "INSERT INTO phones_company (name) VALUES %s "
+            "ON CONFLICT (name) DO NOTHING;",
+            [(name,) for name in new_companies]
+        )
+        db_con.query(
+            "SELECT name, id FROM phones_company WHERE name = ANY(%s);", 
+            (new_companies,)
+        )
+        companies.update(db_con.fetch_all())
+        logging.info('New companies added to db (%s)' % len(new_companies))
+
+    # Repeated models in a batch can't be upserted by the same statement
+    rows = {}
+    for phone in phones:
+        rows[phone['model']] = (
+            phone['model'], phone['image'], 
+            companies[phone['manufacturer']], phone['price'], 
+            phone['description'], phone['specs'], phone['stock'],
+            SEARCH_CONFIG, phone['model'],
+            SEARCH_CONFIG, phone['manufacturer'],
+            SEARCH_CONFIG, phone['description']
+        )
+
+    if update:
+        conflict = """DO UPDATE SET 
+            image = EXCLUDED.image, manufacturer_id = EXCLUDED.manufacturer_id,
+            price = EXCLUDED.price, description = EXCLUDED.description, 
+            specs = EXCLUDED.specs, search_vector = EXCLUDED.search_vector"""
+    else:
+        conflict = 'DO NOTHING'
+
+    # Search vector as in insert_data
+    db_con.query_values(
+        """INSERT INTO phones_phone
+        (model, image, manufacturer_id, price, description, specs, stock,
+        search_vector)
+        VALUES %s
+        ON CONFLICT (model) """ + conflict + ' RETURNING id;',
+        list(rows.values()),
+        template="""(%s, %s, %s, %s, %s, %s, %s,
+        setweight(to_tsvector(%s, %s), 'A') ||
+        setweight(to_tsvector(%s, %s), 'B') ||
+        setweight(to_tsvector(%s, %s), 'C'))"""
+    )
+    # Phones skipped (DO NOTHING) are not returned
+    return len(db_con.fetch_all())
+
+
+def fetch_data(url, limit=1, make_driver=None):
     '''
     Fetches data about phones and companies and inserts it to the database(db).
     Finds all links for phones found in a given GSM Arena results page, up to a 
@@ -161,7 +448,9 @@ def fetch_data(url, limit=1):
 
     Requires: 
         - url (str): must be a link with a search results list of phones.
-        - limit (int - optional): maximum number of results added to the db.
+        - limit (int - optional): maximum number of results added to the db;
+        - make_driver (callable - optional): starts the driver used to load
+        pages (default: new_http_driver).
     Ensures:
         Finds a link to a limited number of phones, gathers more info and then,
         data is gathered and added to db, if not already saved. 
@@ -169,11 +458,80 @@ def fetch_data(url, limit=1):
         provide the necessary info, resulting in a smaller number of phones 
         added to the db.
     '''
+    with get_pool().connection() as db_connection:
+        known_models = get_models(db_connection)
+    driver = (make_driver or new_http_driver)()
+
+    for anchor in get_results(url, driver, limit):
+        
+        try:
+            phone_info = get_phone_info(anchor, driver, known_models)
+            assert(isinstance(phone_info, dict)) 
+
+        except AssertionError: 
+            logging.warning('Phone already in the database (%s).' % phone_info)
+            crawled_pages.labels('known').inc()
+
+        except Exception:
+            logging.exception(
+                'Unable to gather phone information (url: %s).' % anchor
+            )
+            crawled_pages.labels('failed').inc()
+
+        else:
+            try:
+                with get_pool().connection() as db_connection:
+                    insert_data(db_connection, phone_info)
+                known_models.add(phone_info['model'])
+                crawled_pages.labels('added').inc()
+            except KeyError:
+                logging.exception(
+                'Unable to add all needed information to db (url: %s).' % anchor
+            )
+                crawled_pages.labels('failed').inc()
+
+    driver.quit()
+
+
+def new_driver():
+    '''
+    Starts a new headless Chrome browser.
+
+    Ensures: Returns a driver object from the selenium library.
+    '''
     chrome_options = Options()  
     chrome_options.add_argument("--headless")  
-    db_connection = MyDatabase()
-    driver = webdriver.Chrome('./chromedriver', options=chrome_options)
+    return webdriver.Chrome('./chromedriver', options=chrome_options)
+
+
+def new_http_driver(ttl=None):
+    '''
+    Starts a new driver loading pages over plain HTTP, without a browser, 
+    through the HTTP cache. A headless Chrome browser is only started for 
+    pages that need JavaScript (never when OFFLINE).
+
+    Requires: ttl (float - optional): seconds cached pages are fresh for 
+    (default: HTTP_CACHE_TTL; 0 revalidates them on every load).
+    Ensures: Returns an HttpDriver object.
+    '''
+    return HttpDriver(
+        fallback=None if OFFLINE else new_driver, cache=get_http_cache(),
+        ttl=ttl
+    )
+
+
+def get_results(url, driver, limit=1):
+    '''
+    Finds the links for phones in a given GSM Arena results page, up to a 
+    certain limit.
 
+    Requires: 
+        - url (str): must be a link with a search results list of phones;
+        - driver (obj): driver object from the selenium library;
+        - limit (int - optional): maximum number of links (None for all).
+    Ensures:
+        Returns a list with the links found.
+    '''
     driver.get(url)
 
     results = [ 
@@ -189,32 +547,292 @@ def fetch_data(url, limit=1):
     if limit is None or num_items < limit:
         limit = num_items
 
-    for anchor in results[:limit]:
-        
-        try:
-            phone_info = get_phone_info(anchor, driver, db_connection)
-            assert(isinstance(phone_info, dict)) 
+    return results[:limit]
 
-        except AssertionError: 
-            logging.warning('Phone already in the database (%s).' % phone_info)
 
+def fetch_data_concurrent(url, limit=1, workers=WORKERS, rate_limit=RATE_LIMIT,
+    make_driver=None):
+    '''
+    Fetches data about phones and companies and inserts it to the database, 
+    like fetch_data, but visiting several phones at the same time: each 
+    fetcher has its own browser, requests to each website are spaced by a 
+    rate limit, and all phones are saved by a single batched writer.
+
+    Requires: 
+        - url (str): must be a link with a search results list of phones;
+        - limit (int - optional): maximum number of results added to the db;
+        - workers (int - optional): number of concurrent fetchers;
+        - rate_limit (float or dict - optional): minimum seconds between 
+        requests to the same host, or a dictionary of them by host (with a 
+        None key for other hosts);
+        - make_driver (callable - optional): starts the driver used by each 
+        fetcher to load pages (default: new_http_driver).
+    Ensures:
+        Same as fetch_data. On interruption (Ctrl+C), links not started yet are
+        dropped, while the browsers are closed and scraped phones are saved.
+    '''
+    limiter = RateLimiter(rate_limit)
+    with get_pool().connection() as db_connection:
+        known_models = get_models(db_connection)
+
+    def start_driver():
+        return RateLimitedDriver((make_driver or new_http_driver)(), limiter)
+
+    def scrape(anchor, driver):
+        try:
+            phone_info = get_phone_info(anchor, driver, known_models)
         except Exception:
             logging.exception(
                 'Unable to gather phone information (url: %s).' % anchor
             )
-
+            crawled_pages.labels('failed').inc()
         else:
+            if isinstance(phone_info, dict):
+                known_models.add(phone_info['model'])
+                writer.put(phone_info)
+                crawled_pages.labels('added').inc()
+            else:
+                logging.warning(
+                    'Phone already in the database (%s).' % phone_info
+                )
+                crawled_pages.labels('known').inc()
+
+    driver = start_driver()
+    try:
+        results = get_results(url, driver, limit)
+    finally:
+        driver.quit()
+
+    writer = BatchWriter()
+    writer.start()
+    try:
+        run_pool(results, scrape, workers, start_driver, lambda d: d.quit())
+    finally:
+        writer.close()
+
+
+def run_pool(tasks, work, workers=WORKERS, setup=None, teardown=None):
+    '''
+    Runs a function for each task, in a pool of threads, each one with its 
+    own resource (e.g. a browser).
+
+    Requires:
+        - tasks (list): arguments for each call of work;
+        - work (callable): called with a task and the thread's resource;
+        - workers (int - optional): number of threads;
+        - setup (callable - optional): returns a new resource for a thread;
+        - teardown (callable - optional): releases a resource.
+    Ensures:
+        All tasks are done, unless interrupted (KeyboardInterrupt), in which 
+        case tasks not yet started are cancelled and the running ones finish.
+        Resources are always released.
+    '''
+    local = threading.local()
+    resources = []
+    lock = threading.Lock()
+
+    def run(task):
+        if not hasattr(local, 'resource'):
+            local.resource = setup() if setup else None
+            with lock:
+                resources.append(local.resource)
+        return work(task, local.resource)
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    futures = [executor.submit(run, task) for task in tasks]
+    try:
+        for future in futures:
+            future.result()
+    except KeyboardInterrupt:
+        logging.warning('Interrupted, cancelling tasks not yet started.')
+        for future in futures:
+            future.cancel()
+        raise
+    finally:
+        executor.shutdown(wait=True)
+        if teardown:
+            for resource in resources:
+                try:
+                    teardown(resource)
+                except Exception:
+                    logging.exception('Unable to release a pool resource.')
+
+
+class RateLimiter(object):
+    ''' Spaces requests to each host, across threads. '''
+
+    def __init__(self, interval=RATE_LIMIT):
+        '''
+        Requires:
+            - self: an object of the RateLimiter class;
+            - interval (float or dict - optional): minimum seconds between 
+            requests to the same host, or a dictionary of them by host (with 
+            a None key for the other hosts).
+        '''
+        if not isinstance(interval, dict):
+            interval = {None: interval}
+        self._intervals = interval
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        '''
+        Blocks until a request to a given url can be made.
+
+        Requires:
+            - self: an object of the RateLimiter class;
+            - url (str): url about to be requested.
+        Ensures:
+            Returns once the interval for the url's host has passed since the 
+            previous request to it (the slot is reserved right away).
+        '''
+        host = urlsplit(url).netloc
+        interval = self._intervals.get(host, self._intervals.get(None, 0))
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next.get(host, now))
+            self._next[host] = start + interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class RateLimitedFinder(object):
+    '''
+    Wraps the elements found by a driver or element (find_element(s)_by_*),
+    so that the links clicked on go through the rate limiter too.
+    '''
+
+    def __getattr__(self, name):
+        attribute = getattr(self._target, name)
+        if not name.startswith('find_element'):
+            return attribute
+
+        def find(*args, **kwargs):
+            found = attribute(*args, **kwargs)
+            if isinstance(found, list):
+                return [RateLimitedElement(e, self._driver) for e in found]
+            return RateLimitedElement(found, self._driver)
+        return find
+
+
+class RateLimitedDriver(RateLimitedFinder):
+    '''
+    A selenium driver whose page loads go through a rate limiter - pages
+    loaded with get, and links followed with click.
+    '''
+
+    def __init__(self, driver, limiter):
+        self._target = driver
+        self._driver = self
+        self._limiter = limiter
+
+    def wait(self, url):
+        ''' Blocks until the url can be requested (see RateLimiter.wait). '''
+        # Pages the HTTP cache answers alone don't count
+        cache = getattr(self._target, 'cache', None)
+        if cache is None or not cache.is_fresh(url, self._target.ttl):
+            self._limiter.wait(url)
+
+    def get(self, url):
+        self.wait(url)
+        return self._target.get(url)
+
+    def save_link(self, url):
+        # The page is loaded again, over HTTP, if it was in the browser
+        if self._target.in_browser:
+            self.wait(self._target.current_url)
+        return self._target.save_link(url)
+
+
+class RateLimitedElement(RateLimitedFinder):
+    ''' An element of a page loaded by a RateLimitedDriver. '''
+
+    def __init__(self, element, driver):
+        self._target = element
+        self._driver = driver
+
+    def click(self):
+        if self._target.tag_name == 'a':
+            href = self._target.get_attribute('href')
+            if href and not href.startswith('javascript:'):
+                self._driver.wait(href)
+        return self._target.click()
+
+
+class BatchWriter(threading.Thread):
+    '''
+    A thread saving phones to the database in batches (see insert_batch), so
+    that concurrent fetchers share a single connection and transaction per 
+    batch.
+    '''
+    _done = object()
+
+    def __init__(self, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        '''
+        Requires:
+            - self: an object of the BatchWriter class;
+            - batch_size (int - optional): maximum phones per batch;
+            - flush_interval (float - optional): maximum seconds a phone waits
+            for its batch to fill up.
+        '''
+        super().__init__(name='BatchWriter', daemon=True)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.saved = 0
+        self._queue = queue.Queue()
+
+    def put(self, phone):
+        ''' Queues a phone (dict, as in insert_data) to be saved. '''
+        self._queue.put(phone)
+
+    def close(self):
+        ''' Saves the queued phones, and waits for the thread to finish. '''
+        self._queue.put(self._done)
+        self.join()
+
+    def run(self):
+        with get_pool().connection() as db_connection:
+            self._run(db_connection)
+
+    def _run(self, db_connection):
+        companies = get_companies(db_connection)
+        batch = []
+        deadline = None
+        done = False
+
+        while not done:
+            timeout = None
+            if deadline is not None:
+                timeout = max(0, deadline - time.monotonic())
             try:
-                insert_data(db_connection, phone_info)
-            except KeyError:
-                logging.exception(
-                'Unable to add all needed information to db (url: %s).' % anchor
+                phone = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                phone = None
+            if phone is self._done:
+                done = True
+            elif phone is not None:
+                batch.append(phone)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            if batch and (done or len(batch) >= self.batch_size
+                    or time.monotonic() >= deadline):
+                self.flush(db_connection, batch, companies)
+                batch = []
+                deadline = None
+
+    def flush(self, db_con, batch, companies):
+        try:
+            insert_batch(db_con, batch, companies)
+        except Exception:
+            logging.exception(
+                'Unable to add a batch of %d phones to the db.' % len(batch)
             )
+        else:
+            self.saved += len(batch)
 
-    driver.quit()
 
-  
-def get_phone_info(url, driver, db_con):
+def get_phone_info(url, driver, known_models):
     '''
     Finds several details about a phone, from a given gsm arena url, after 
     checking the model does not exist in the db.
@@ -222,7 +840,7 @@ def get_phone_info(url, driver, db_con):
     Requires: 
         - url (str): gsm arena link with info about a phone;
         - driver (obj): driver object from the selenium library;
-        - db_con (MyDatabase): database connection details.
+        - known_models (set): models already saved to the db.
     Ensures:
         Returns a dictionary with a phone's details:
             model (str);
@@ -232,7 +850,8 @@ def get_phone_info(url, driver, db_con):
             description (str);
             specs (json) - including information about body, display, platform, 
             chipset, memory, camera(main, selfie, features), battery & features;
-            stock (int).
+            stock (int);
+            source (dict): the page's version, as returned by page_state.
         Or a string with the model, if it is already saved to the db.
     '''
     driver.get(url)
@@ -240,15 +859,61 @@ def get_phone_info(url, driver, db_con):
     model = driver.find_element_by_class_name('specs-phone-name-title').text
     
     # If model is already in database, skip it
-    query = "SELECT id FROM phones_phone WHERE model=%s;" 
-    db_con.query(query, (model,))
-    if db_con.fetch_one() is not None:
+    if model in known_models:
         return model 
 
+    source = page_state(url, driver)
+    phone_info = parse_phone(model, driver)
+    phone_info['source'] = source
+    return phone_info
+
+
+def page_state(url, driver):
+    '''
+    Identifies the version of the gsm arena page of a phone, loaded in a
+    driver.
+
+    Requires:
+        - url (str): the link the page was loaded from;
+        - driver (obj): driver object from the selenium library (or an
+        HttpDriver), with the page loaded.
+    Ensures:
+        Returns a dictionary with the url, the page's HTTP validators (etag 
+        and last_modified, empty if unknown) and content_hash: a hash of the 
+        text scraped from it (title and spec tables), so that changes 
+        elsewhere in the page (ads, scripts) are ignored.
+    '''
+    text = [driver.find_element_by_class_name('specs-phone-name-title').text]
+    text += [table.text for table in driver.find_elements_by_tag_name('table')]
+    return {
+        'url': url,
+        'etag': getattr(driver, 'etag', None) or '',
+        'last_modified': getattr(driver, 'last_modified', None) or '',
+        'content_hash': hashlib.sha256(
+            '\n'.join(text).encode('utf-8')
+        ).hexdigest(),
+    }
+
+
+def parse_phone(model, driver, image=True):
+    '''
+    Gathers the details of a phone, from its gsm arena page loaded in a 
+    driver, and from other websites.
+
+    Requires:
+        - model (str): the phone model;
+        - driver (obj): driver object from the selenium library, with the 
+        phone's gsm arena page loaded;
+        - image (bool - optional): if False, no image is searched for.
+    Ensures:
+        Returns a dictionary with a phone's details, as get_phone_info (but
+        without source, nor image if not searched for).
+    '''
     details = get_details(model, driver)
     phone_info = {}
     phone_info['model'] = model
-    phone_info['image'] = get_img(model, driver)
+    if image:
+        phone_info['image'] = get_img(model, driver)
     phone_info['manufacturer'] = details['manufacturer']
     phone_info['price'] = math.floor(float(
         re
@@ -308,12 +973,22 @@ def get_details(model, driver):
         'manufacturer', 'priceusd', 'description', 'rearcamera', 'frontcamera'
     ]
 
-    driver.get(FONEARENA_SEARCH + model.replace(' ', '+'))
-    (driver
-        .find_element_by_class_name('gsc-resultsbox-visible')
-        .find_element_by_partial_link_text('Full Phone Specifications')
-        .click()
-    )
+    # Search results are rendered by JavaScript, so the result is followed in
+    # a browser: HttpDrivers record it, to load it over HTTP next time
+    search = FONEARENA_SEARCH + model.replace(' ', '+')
+    links = hasattr(driver, 'link_target')
+    target = driver.link_target(search) if links else None
+    if target:
+        driver.get(target)
+    else:
+        driver.get(search)
+        (driver
+            .find_element_by_class_name('gsc-resultsbox-visible')
+            .find_element_by_partial_link_text('Full Phone Specifications')
+            .click()
+        )
+        if links:
+            driver.save_link(search)
 
     summary = driver.find_element_by_id('details')
     labels = summary.find_elements_by_tag_name('label')
@@ -380,7 +1055,7 @@ def insert_data(db_con, phone):
     must not exist in the db.
 
     Requires:
-        - db_con (MyDatabase): database connection details.
+        - db_con (Database): a pooled database connection.
         - phone, a dictionary with a phone's details:
             model (str);
             image (str): path to image;
@@ -389,43 +1064,657 @@ def insert_data(db_con, phone):
             info (str);
             specs (json) - including information about body, display, platform, 
             chipset, memory, camera(main, selfie, features), battery & features;
-            stock (int).
+            stock (int);
+            source (dict - optional): the page it was scraped from, as 
+            returned by page_state.
     Ensures:
         - data is saved to database.
     '''
+    with db_con.transaction():
+        _insert_data(db_con, phone)
+        save_sources(db_con, [phone])
+    saved_phones.inc()
+    logging.info('New phone added to the db (%s)' % phone['model'])
+
+
+def get_company_id(db_con, name):
+    '''
+    Returns the id of a company, inserting it to the db if necessary.
+
+    Requires:
+        - db_con (Database): a pooled database connection;
+        - name (str): the company name.
+    '''
     # Check if company exists in the db
     query = "SELECT id FROM phones_company WHERE name=%s;" 
-    db_con.query(query, (phone['manufacturer'],))
+    db_con.query(query, (name,))
     company_key = db_con.fetch_one()
 
     if not company_key:
-        # Insert new company to db
-        query = "INSERT INTO phones_company (name) VALUES (%s) RETURNING id;" 
-        db_con.query(query, (phone['manufacturer'],))
+        # Insert new company to db, unless another worker just did
+        query = """INSERT INTO phones_company (name) VALUES (%s) 
+        ON CONFLICT (name) DO NOTHING RETURNING id;"""
+        db_con.query(query, (name,))
         company_key = db_con.fetch_one()
-        db_con.commit()
-        logging.info('New company added to db (%s)' % phone['manufacturer'])
+        if company_key:
+            logging.info('New company added to db (%s)' % name)
+        else:
+            db_con.query("SELECT id FROM phones_company WHERE name=%s;", (name,))
+            company_key = db_con.fetch_one()
+
+    return company_key[0]
 
-    company_key = company_key[0]
+
+def _insert_data(db_con, phone):
+    company_key = get_company_id(db_con, phone['manufacturer'])
     
-    # Insert new phone to db
+    # Insert new phone to db, with its full text search vector (weights and
+    # config as in phones.search)
     query = """INSERT INTO phones_phone 
-        (model, image, manufacturer_id, price, description, specs, stock)
-        VALUES (%s, %s, %s, %s, %s, %s, %s);
+        (model, image, manufacturer_id, price, description, specs, stock,
+        search_vector)
+        VALUES (%s, %s, %s, %s, %s, %s, %s,
+        setweight(to_tsvector(%s, %s), 'A') ||
+        setweight(to_tsvector(%s, %s), 'B') ||
+        setweight(to_tsvector(%s, %s), 'C'));
         """
     db_con.query(
         query, 
         (phone['model'], phone['image'], company_key, phone['price'],
-        phone['description'], phone['specs'], phone['stock'])
+        phone['description'], phone['specs'], phone['stock'],
+        SEARCH_CONFIG, phone['model'],
+        SEARCH_CONFIG, phone['manufacturer'],
+        SEARCH_CONFIG, phone['description'])
     )
-    db_con.commit()
-    logging.info('New phone added to the db (%s)' % phone['model'])
+
+
+def save_sources(db_con, phones):
+    '''
+    Saves the pages phones were scraped from (see page_state), for later 
+    incremental crawls.
+
+    Requires:
+        - db_con (Database): a pooled database connection;
+        - phones (list): dictionaries with each phone's details, as in 
+        insert_data - phones without a source are skipped.
+    Ensures:
+        The source of each phone is saved, as seen now (and changed now, if 
+        its content hash is new).
+    '''
+    rows = [
+        (phone['model'], phone['source']['url'], phone['source']['etag'],
+        phone['source']['last_modified'], phone['source']['content_hash'])
+        for phone in phones if phone.get('source')
+    ]
+    if not rows:
+        return
+    db_con.query_values(
+        """INSERT INTO phones_phonesource
+        (phone_id, url, etag, last_modified, content_hash, last_seen,
+        last_changed)
+        SELECT phones_phone.id, v.url, v.etag, v.last_modified, 
+        v.content_hash, now(), now()
+        FROM (VALUES %s) AS v (model, url, etag, last_modified, content_hash)
+        JOIN phones_phone ON phones_phone.model = v.model
+        ON CONFLICT (phone_id) DO UPDATE SET
+            url = EXCLUDED.url, etag = EXCLUDED.etag, 
+            last_modified = EXCLUDED.last_modified,
+            content_hash = EXCLUDED.content_hash, 
+            last_seen = EXCLUDED.last_seen,
+            last_changed = CASE 
+                WHEN phones_phonesource.content_hash = EXCLUDED.content_hash
+                THEN phones_phonesource.last_changed
+                ELSE EXCLUDED.last_changed END;""",
+        rows
+    )
+
+
+def get_sources(db_con):
+    '''
+    Reads the pages all phones were scraped from.
+
+    Requires: db_con (Database): a pooled database connection.
+    Ensures: Returns a dictionary with the source of each phone (dict with 
+    phone_id, etag, last_modified and content_hash), by url.
+    '''
+    rows = db_con.stream(
+        """SELECT url, phone_id, etag, last_modified, content_hash 
+        FROM phones_phonesource;""", ()
+    )
+    return {row['url']: dict(row) for row in rows}
+
+
+def get_source(db_con, url):
+    '''
+    Reads the page a phone was scraped from, by url, as in get_sources, or 
+    None if no phone was scraped from it.
+    '''
+    with db_con.transaction():
+        db_con.query(
+            """SELECT url, phone_id, etag, last_modified, content_hash 
+            FROM phones_phonesource WHERE url = %s;""",
+            (url,)
+        )
+        row = db_con.fetch_one()
+    return dict(row) if row else None
+
+
+def get_phone(db_con, model):
+    '''
+    Reads the scraped details of a phone (the ones an incremental crawl can 
+    update), or None if it is not in the db.
+    '''
+    # Ended right away, as pages are loaded next: the connection must not
+    # be left idle in a transaction meanwhile
+    with db_con.transaction():
+        db_con.query(
+            """SELECT phones_phone.id, model, 
+            phones_company.name AS manufacturer, price, description, specs 
+            FROM phones_phone 
+            JOIN phones_company ON phones_company.id = manufacturer_id
+            WHERE model = %s;""",
+            (model,)
+        )
+        row = db_con.fetch_one()
+    return dict(row) if row else None
+
+
+def update_phone(db_con, current, phone):
+    '''
+    Updates the columns of a phone that changed, and only those: stock and 
+    image are never overwritten.
+
+    Requires:
+        - db_con (Database): a pooled database connection;
+        - current (dict): the phone in the db, as returned by get_phone;
+        - phone (dict): the phone's details just scraped, as in insert_data.
+    Ensures:
+        Returns the names of the columns updated (list, empty if none).
+    '''
+    changes = {}
+    if phone['manufacturer'] != current['manufacturer']:
+        changes['manufacturer_id'] = get_company_id(
+            db_con, phone['manufacturer']
+        )
+    if phone['price'] != current['price']:
+        changes['price'] = phone['price']
+    if phone['description'] != current['description']:
+        changes['description'] = phone['description']
+    if json.loads(phone['specs']) != current['specs']:
+        changes['specs'] = phone['specs']
+    if not changes:
+        return []
+
+    columns = sorted(changes)
+    assignments = ['%s = %%s' % column for column in columns]
+    params = [changes[column] for column in columns]
+    if 'manufacturer_id' in changes or 'description' in changes:
+        # Search vector as in insert_data
+        assignments.append("""search_vector = 
+            setweight(to_tsvector(%s, %s), 'A') ||
+            setweight(to_tsvector(%s, %s), 'B') ||
+            setweight(to_tsvector(%s, %s), 'C')""")
+        params += [
+            SEARCH_CONFIG, phone['model'],
+            SEARCH_CONFIG, phone['manufacturer'],
+            SEARCH_CONFIG, phone['description']
+        ]
+    db_con.query(
+        'UPDATE phones_phone SET %s WHERE id = %%s;' % ', '.join(assignments),
+        params + [current['id']]
+    )
+    return columns
+
+
+def refresh_data(url, limit=1, make_driver=None):
+    '''
+    Incremental crawl: like fetch_data, but phones already in the database 
+    are refreshed, at little cost when their pages did not change. Pages 
+    saved from previous crawls are requested conditionally (If-None-Match, 
+    If-Modified-Since), and only parsed if their content hash changed; then,
+    only the columns that changed are updated.
+
+    Requires: 
+        - url (str): must be a link with a search results list of phones;
+        - limit (int - optional): maximum number of phones checked;
+        - make_driver (callable - optional): starts the driver used to load
+        pages (default: new_http_driver, revalidating cached pages).
+    Ensures:
+        Phones are added or updated, and their sources saved. Returns the 
+        number of phones (dict) unchanged, updated, added and failed.
+    '''
+    start = datetime.now()
+    counts = {'unchanged': 0, 'updated': 0, 'added': 0, 'failed': 0}
+    # Cached pages may be out of date: ask the websites about each one
+    driver = make_driver() if make_driver else new_http_driver(ttl=0)
+    try:
+        with get_pool().connection() as db_connection:
+            sources = get_sources(db_connection)
+            for anchor in get_results(url, driver, limit):
+                try:
+                    result = refresh_phone(
+                        anchor, driver, db_connection, sources.get(anchor)
+                    )
+                except Exception:
+                    logging.exception(
+                        'Unable to refresh phone information (url: %s).' 
+                        % anchor
+                    )
+                    result = 'failed'
+                counts[result] += 1
+                crawled_pages.labels(result).inc()
+    finally:
+        driver.quit()
+
+    seconds = (datetime.now() - start).total_seconds()
+    logging.info(
+        'Incremental crawl in %.2fs: %d unchanged, %d updated, %d added, '
+        '%d failed.' % (
+            seconds, counts['unchanged'], counts['updated'], counts['added'],
+            counts['failed']
+        )
+    )
+    return counts
+
+
+def refresh_phone(url, driver, db_con, source=None):
+    '''
+    Adds or updates a phone from its gsm arena page, unless the page did not 
+    change since it was last seen.
+
+    Requires:
+        - url (str): gsm arena link with info about a phone;
+        - driver (obj): an HttpDriver (or a selenium driver, without
+        conditional requests);
+        - db_con (Database): a pooled database connection;
+        - source (dict - optional): the phone's page when last seen, as 
+        returned by get_sources.
+    Ensures:
+        Returns 'unchanged', 'updated' or 'added'.
+    '''
+    if source and hasattr(driver, 'not_modified'):
+        driver.get(
+            url, etag=source['etag'] or None, 
+            last_modified=source['last_modified'] or None
+        )
+    else:
+        driver.get(url)
+
+    if getattr(driver, 'not_modified', False):
+        seen = dict(source, url=url)
+    else:
+        model = driver.find_element_by_class_name('specs-phone-name-title').text
+        seen = page_state(url, driver)
+        if not source or seen['content_hash'] != source['content_hash']:
+            return _save_phone(model, driver, db_con, seen)
+
+    with db_con.transaction():
+        db_con.query(
+            """UPDATE phones_phonesource 
+            SET last_seen = now(), etag = %s, last_modified = %s 
+            WHERE phone_id = %s;""",
+            (getattr(driver, 'etag', None) or seen['etag'],
+            getattr(driver, 'last_modified', None) or seen['last_modified'],
+            source['phone_id'])
+        )
+    return 'unchanged'
+
+
+def _save_phone(model, driver, db_con, source):
+    # A changed or new page: parse it, and save the phone
+    current = get_phone(db_con, model)
+    phone = parse_phone(model, driver, image=current is None)
+    phone['source'] = source
+    if current is None:
+        insert_data(db_con, phone)
+        return 'added'
+
+    with db_con.transaction():
+        columns = update_phone(db_con, current, phone)
+        save_sources(db_con, [phone])
+    if columns:
+        logging.info(
+            'Phone updated in the db (%s: %s)' % (model, ', '.join(columns))
+        )
+    return 'updated' if columns else 'unchanged'
+
+
+def crawl(worker_id=None, max_jobs=None, make_driver=None):
+    '''
+    Crawls the pages of the crawl frontier (phones_crawljob, filled by 
+    enqueue), along with any other worker processes, on this host or others:
+    each page is claimed by a single worker at a time, for LEASE_TIME 
+    seconds. Results pages add their phone pages to the frontier; phone 
+    pages are added or refreshed as in refresh_data. Failed pages are 
+    retried after RETRY_DELAY seconds (doubled on each attempt), up to 
+    MAX_ATTEMPTS times. Pages whose worker stopped (e.g. crashed) are 
+    claimed again once their lease expires, so a crawl can be resumed by 
+    starting workers again.
+
+    Requires:
+        - worker_id (str - optional): name of the worker, saved with the 
+        pages it claims (default: host name and process id);
+        - max_jobs (int - optional): maximum number of pages crawled;
+        - make_driver (callable - optional): starts the driver used to load
+        pages (default: new_http_driver, revalidating cached pages).
+    Ensures:
+        Pages are crawled until none is left to crawl (pages leased by other
+        workers, or waiting for a retry, are waited for), or max_jobs were.
+        Returns the number of pages (dict) by result: expanded (results 
+        pages), added, updated, unchanged, retried, failed and lost (failed 
+        after another worker claimed them again).
+    '''
+    worker_id = worker_id or '%s:%d' % (socket.gethostname(), os.getpid())
+    counts = dict.fromkeys(
+        ['expanded', 'added', 'updated', 'unchanged', 'retried', 'failed',
+        'lost'], 0
+    )
+    start = datetime.now()
+    crawled = 0
+    driver = make_driver() if make_driver else new_http_driver(ttl=0)
+    try:
+        with get_pool().connection() as db_connection:
+            while max_jobs is None or crawled < max_jobs:
+                job = claim_job(db_connection, worker_id)
+                if job is None:
+                    if not has_pending_jobs(db_connection):
+                        break
+                    time.sleep(POLL_INTERVAL)
+                    continue
+                result = crawl_job(job, driver, db_connection)
+                counts[result] += 1
+                if job['kind'] == 'phone':
+                    crawled_pages.labels(
+                        'failed' if result == 'retried' else result
+                    ).inc()
+                crawled += 1
+    finally:
+        driver.quit()
+
+    seconds = (datetime.now() - start).total_seconds()
+    logging.info('Crawled %d pages in %.2fs (%s): %s.' % (
+        crawled, seconds, worker_id, ', '.join(
+            '%d %s' % (count, result) for result, count in counts.items()
+        )
+    ))
+    return counts
+
+
+def crawl_job(job, driver, db_con):
+    '''
+    Crawls a page claimed from the frontier, and records the outcome.
+
+    Requires:
+        - job (dict): the page, as returned by claim_job;
+        - driver (obj): an HttpDriver (or a selenium driver);
+        - db_con (Database): a pooled database connection.
+    Ensures:
+        Returns 'expanded' for results pages, the result of refresh_phone for 
+        phone pages, or 'retried' or 'failed' if the page could not be 
+        crawled - 'lost' if it was claimed again meanwhile (its outcome is 
+        then left to the other worker).
+    '''
+    try:
+        with LeaseKeeper(job):
+            if job['kind'] == 'results':
+                enqueue(db_con, get_results(job['url'], driver, limit=None))
+                result = 'expanded'
+            else:
+                result = refresh_phone(
+                    job['url'], driver, db_con, get_source(db_con, job['url'])
+                )
+    except Exception as error:
+        logging.exception('Unable to crawl page (url: %s, attempt %d).' % (
+            job['url'], job['attempts']
+        ))
+        db_con.rollback()
+        state = finish_job(db_con, job, '%s: %s' % (
+            type(error).__name__, error
+        ))
+        return state or 'lost'
+    finish_job(db_con, job)
+    return result
+
+
+def enqueue(db_con, urls, kind='phone'):
+    '''
+    Adds pages to the crawl frontier. Pages already in it are queued again 
+    if they were done or failed, and left as they are otherwise.
+
+    Requires:
+        - db_con (Database): a pooled database connection;
+        - urls (list): links of the pages;
+        - kind (str - optional): 'results' (a GSM Arena results page) or 
+        'phone' (a GSM Arena phone page).
+    Ensures:
+        Returns the number of pages queued.
+    '''
+    rows = [(url, kind) for url in dict.fromkeys(urls)]
+    if not rows:
+        return 0
+    with db_con.transaction():
+        db_con.query_values(
+            """INSERT INTO phones_crawljob 
+            (url, kind, state, attempts, available_at, claimed_by, last_error,
+            updated_at)
+            VALUES %s
+            ON CONFLICT (url) DO UPDATE SET 
+                state = 'pending', attempts = 0, available_at = now(), 
+                lease_until = NULL, last_error = '', updated_at = now()
+            WHERE phones_crawljob.state IN ('done', 'failed')
+            RETURNING id;""",
+            rows,
+            template="(%s, %s, 'pending', 0, now(), '', '', now())"
+        )
+        return len(db_con.fetch_all())
+
+
+def claim_job(db_con, worker_id, lease=LEASE_TIME):
+    '''
+    Claims the next page to crawl from the frontier: a pending page due for 
+    a (re)try, or a page whose lease expired. Pages locked by other workers 
+    are skipped, without waiting for them (SKIP LOCKED).
+
+    Requires:
+        - db_con (Database): a pooled database connection;
+        - worker_id (str): name of the worker claiming the page;
+        - lease (float - optional): seconds the page is leased for.
+    Ensures:
+        Returns the page (dict with id, url, kind and attempts, this one 
+        included), or None if no page can be claimed. Pages whose lease 
+        expired on their last attempt are failed instead.
+    '''
+    while True:
+        with db_con.transaction():
+            db_con.query(
+                """UPDATE phones_crawljob 
+                SET state = 'running', attempts = attempts + 1, 
+                lease_until = now() + %s * interval '1 second', 
+                claimed_by = %s, updated_at = now()
+                WHERE id = (
+                    SELECT id FROM phones_crawljob 
+                    WHERE (state = 'pending' AND available_at <= now()) 
+                    OR (state = 'running' AND lease_until < now())
+                    ORDER BY available_at, id
+                    LIMIT 1
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, url, kind, attempts;""",
+                (lease, worker_id)
+            )
+            row = db_con.fetch_one()
+        if row is None:
+            return None
+        job = dict(row)
+        if job['attempts'] <= MAX_ATTEMPTS:
+            return job
+        finish_job(db_con, job, 'Lease expired.')
+        logging.warning('Page failed, its lease expired (url: %s).' % job['url'])
+
+
+def renew_lease(db_con, job, lease=LEASE_TIME):
+    '''
+    Extends the lease of a claimed page, unless it was claimed again since.
+
+    Requires:
+        - db_con (Database): a pooled database connection;
+        - job (dict): the page, as returned by claim_job;
+        - lease (float - optional): seconds the page is leased for, from now.
+    Ensures:
+        Returns whether the lease was extended.
+    '''
+    with db_con.transaction():
+        db_con.query(
+            """UPDATE phones_crawljob 
+            SET lease_until = now() + %s * interval '1 second'
+            WHERE id = %s AND attempts = %s AND state = 'running'
+            RETURNING id;""",
+            (lease, job['id'], job['attempts'])
+        )
+        return db_con.fetch_one() is not None
+
+
+class LeaseKeeper(threading.Thread):
+    '''
+    A thread renewing the lease of a claimed page while it is crawled, every
+    third of the lease, so that slow pages (rate limited, or loaded in a 
+    browser) are not claimed by another worker meanwhile. Pages of a worker
+    that stopped are still claimed again once their lease expires.
+
+        with LeaseKeeper(job):
+            ...
+    '''
+
+    def __init__(self, job, lease=None):
+        '''
+        Requires:
+            - self: an object of the LeaseKeeper class;
+            - job (dict): the page, as returned by claim_job;
+            - lease (float - optional): seconds the page is leased for
+            (default: LEASE_TIME).
+        '''
+        super().__init__(name='LeaseKeeper', daemon=True)
+        self.job = job
+        self.lease = lease or LEASE_TIME
+        self._done = threading.Event()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self._done.set()
+        self.join()
+
+    def run(self):
+        while not self._done.wait(self.lease / 3):
+            try:
+                with get_pool().connection() as db_connection:
+                    if not renew_lease(db_connection, self.job, self.lease):
+                        return
+            except Exception:
+                logging.exception('Unable to renew the lease of a page '
+                    '(url: %s).' % self.job['url'])
+
+
+def finish_job(db_con, job, error=None):
+    '''
+    Records the outcome of a claimed page: done, or if it failed, pending 
+    again after a backoff, or failed after MAX_ATTEMPTS attempts. Nothing is 
+    recorded if the page was claimed again since (its lease expired).
+
+    Requires:
+        - db_con (Database): a pooled database connection;
+        - job (dict): the page, as returned by claim_job;
+        - error (str - optional): why the page could not be crawled.
+    Ensures:
+        Returns the new state of the page ('done', 'retried' - pending 
+        again, or 'failed'), or None if it was claimed again.
+    '''
+    if error is None:
+        state, delay = 'done', 0
+    elif job['attempts'] >= MAX_ATTEMPTS:
+        state, delay = 'failed', 0
+    else:
+        state, delay = 'pending', RETRY_DELAY * 2 ** (job['attempts'] - 1)
+    with db_con.transaction():
+        db_con.query(
+            """UPDATE phones_crawljob 
+            SET state = %s, available_at = now() + %s * interval '1 second', 
+            lease_until = NULL, last_error = %s, updated_at = now()
+            WHERE id = %s AND attempts = %s AND state = 'running'
+            RETURNING id;""",
+            (state, delay, error or '', job['id'], job['attempts'])
+        )
+        if db_con.fetch_one() is None:
+            return None
+    return 'retried' if state == 'pending' else state
+
+
+def has_pending_jobs(db_con):
+    ''' Returns whether any page of the frontier is pending or running. '''
+    with db_con.transaction():
+        db_con.query(
+            """SELECT EXISTS (
+                SELECT 1 FROM phones_crawljob 
+                WHERE state IN ('pending', 'running')
+            );""", ()
+        )
+        return db_con.fetch_one()[0]
+
+
+def retry_failed(db_con):
+    '''
+    Queues the failed pages of the frontier again, with their attempts reset.
+
+    Requires: db_con (Database): a pooled database connection.
+    Ensures: Returns the number of pages queued.
+    '''
+    with db_con.transaction():
+        db_con.query(
+            """UPDATE phones_crawljob 
+            SET state = 'pending', attempts = 0, available_at = now(), 
+            updated_at = now()
+            WHERE state = 'failed'
+            RETURNING id;""", ()
+        )
+        return len(db_con.fetch_all())
+
+
+def frontier_status(db_con):
+    '''
+    Reads the progress of the crawl frontier.
+
+    Requires: db_con (Database): a pooled database connection.
+    Ensures: Returns a dictionary with the number of pages in each state 
+    (dict, by state), and the running and failed pages (lists of dict with 
+    url, attempts, claimed_by, lease_until and last_error).
+    '''
+    with db_con.transaction():
+        db_con.query(
+            "SELECT state, count(*) FROM phones_crawljob GROUP BY state;", ()
+        )
+        counts = dict.fromkeys(['pending', 'running', 'done', 'failed'], 0)
+        counts.update(db_con.fetch_all())
+        pages = {}
+        for state in ['running', 'failed']:
+            db_con.query(
+                """SELECT url, attempts, claimed_by, lease_until, last_error 
+                FROM phones_crawljob WHERE state = %s 
+                ORDER BY updated_at;""", (state,)
+            )
+            pages[state] = [dict(row) for row in db_con.fetch_all()]
+    return {
+        'counts': counts, 'running': pages['running'], 
+        'failed': pages['failed']
+    }
 
 
 def get_img(model, driver):
     '''
     Searches for an image (dimensions: 600x415) for the given phone model, saves
-    it locally and returns the image path.
+    it locally with its thumbnail and WebP variants (see phones.images) and
+    returns the image path.
 
     Requires:
         - model (str): a phone model;
@@ -448,36 +1737,181 @@ def get_img(model, driver):
     first_img = img_window.find_elements_by_tag_name("img")[0]
     img_url = first_img.get_attribute("src")
 
-    img_path = 'img/' + minify_str(model) + '.jpg'
-    file_path = os.path.join(BASE_DIR, 'media', img_path)
-    urllib.request.urlretrieve(img_url, file_path)
-
-    if env == 'PRODUCTION':
-        s3 = boto3.client('s3')
-        s3.upload_file(
-            file_path, 
-            bucket, 
-            img_path, 
-            ExtraArgs={'ContentType': 'image/jpeg'}
-        )
+    return save_images(images.build_variants(download(img_url)))
+
+
+def download(url):
+    '''
+    Downloads an image, through the HTTP cache (see IMAGE_CACHE_TTL).
+
+    Requires: url (str).
+    Ensures: Returns the content of the response (bytes).
+    '''
+    headers = {'User-Agent': USER_AGENT}
+    cache = get_http_cache()
+    if cache is None:
+        return fetch(url, headers).body
+    return cache.fetch(url, headers, ttl=IMAGE_CACHE_TTL).body
 
+
+def save_images(variants):
+    '''
+    Saves an image and its variants locally (under media/) and, in production,
+    to the S3 bucket. Names are content hashes, so existing files are skipped
+    locally, and S3 objects already in the bucket are skipped too. S3 
+    objects are served with a long-lived cache header.
+
+    Requires: variants (list): (name, content type, bytes) tuples, as returned
+    by phones.images.build_variants, the original first.
+    Ensures: Returns the name (str) of the original image. Uploads are only 
+    queued (see get_uploader), and done by the time close_uploader returns.
+    '''
+    uploader = get_uploader()
+    for name, content_type, data in variants:
+        file_path = os.path.join(BASE_DIR, 'media', name)
+        if not os.path.exists(file_path):
+            with open(file_path, 'wb') as file:
+                file.write(data)
+        if uploader is not None:
+            uploader.upload(name, data, content_type)
+    img_path = variants[0][0]
     return img_path
 
 
-def main():
+def save_metrics(seconds):
+    '''
+    Logs the crawl rates, and saves the crawl metrics (see METRICS_FILE).
+
+    Requires: seconds (float): duration of the crawl.
+    Ensures: 
+        Rates are logged, and metrics written to METRICS_FILE (replaced as a 
+        whole, so that the collector never reads it half written), if set.
+    '''
+    pages = sum(
+        metrics.get_sample_value('crawl_pages_total', {'result': result}) or 0
+        for result in PAGE_RESULTS
+    )
+    failed = metrics.get_sample_value(
+        'crawl_pages_total', {'result': 'failed'}
+    ) or 0
+    saved = metrics.get_sample_value('crawl_phones_saved_total')
+    pages_rate = pages / seconds if seconds else 0
+    inserts_rate = saved / seconds if seconds else 0
+    crawl_duration.set(seconds)
+    crawl_pages_rate.set(pages_rate)
+    crawl_inserts_rate.set(inserts_rate)
+    crawl_finished.set_to_current_time()
+    logging.info(
+        'Crawl in %.2fs: %d pages (%.2f/s, %d failed), %d phones saved '
+        '(%.2f/s).' % (seconds, pages, pages_rate, failed, saved, inserts_rate)
+    )
+    if METRICS_FILE:
+        write_to_textfile(os.path.join(BASE_DIR, METRICS_FILE), metrics)
+
+
+def parse_args(argv=None):
+    '''
+    Reads the command line arguments of the worker (see main).
+
+    Requires: argv (list - optional): the arguments (default: sys.argv).
+    Ensures: Returns an argparse.Namespace, with the command (None if not 
+    given) and its options.
+    '''
+    parser = argparse.ArgumentParser(
+        description='Fetches data about smartphones into the database.'
+    )
+    commands = parser.add_subparsers(dest='command')
+    enqueue_parser = commands.add_parser(
+        'enqueue', help='add pages to the crawl frontier'
+    )
+    enqueue_parser.add_argument('urls', nargs='+', metavar='url')
+    enqueue_parser.add_argument(
+        '--kind', choices=['results', 'phone'], default='results',
+        help='GSM Arena results pages (default), or phone pages'
+    )
+    crawl_parser = commands.add_parser(
+        'crawl', help='crawl the frontier, along with other workers'
+    )
+    crawl_parser.add_argument(
+        '--max-jobs', type=int, help='maximum number of pages crawled'
+    )
+    commands.add_parser('status', help='show the progress of the frontier')
+    commands.add_parser('retry', help='queue the failed pages again')
+    return parser.parse_args(argv)
+
+
+def print_status(status):
+    '''
+    Prints the progress of the crawl frontier.
+
+    Requires: status (dict): as returned by frontier_status.
+    '''
+    print(', '.join(
+        '%s: %d' % (state, count) for state, count in status['counts'].items()
+    ))
+    for page in status['running']:
+        print('running: %s (%s, until %s)' % (
+            page['url'], page['claimed_by'], 
+            page['lease_until'].strftime('%d-%b-%y %H:%M:%S')
+        ))
+    for page in status['failed']:
+        print('failed: %s (%d attempts): %s' % (
+            page['url'], page['attempts'], page['last_error']
+        ))
+
+
+def main(argv=None):
     '''
     Executes the main worker program to fetch data about smartphones and insert 
-    it to the database.
+    it to the database. Commands (python worker.py [command]):
+        - none: crawls GSM Arena in this process;
+        - enqueue url [url ...] [--kind phone]: adds results pages (or phone
+        pages) to the crawl frontier;
+        - crawl [--max-jobs n]: crawls the frontier, along with any other 
+        worker processes (see crawl);
+        - status: prints the progress of the frontier;
+        - retry: queues the failed pages of the frontier again.
+
+    Requires: argv (list - optional): command line arguments (default: 
+    sys.argv).
     '''
+    args = parse_args(argv)
+    if args.command in ('enqueue', 'status', 'retry'):
+        try:
+            with get_pool().connection() as db_connection:
+                if args.command == 'enqueue':
+                    count = enqueue(db_connection, args.urls, args.kind)
+                    print('%d pages queued.' % count)
+                elif args.command == 'retry':
+                    print('%d pages queued.' % retry_failed(db_connection))
+                else:
+                    print_status(frontier_status(db_connection))
+        finally:
+            close_pool()
+        return
+
     logging.basicConfig(
         format='%(asctime)s - %(levelname)s:%(name)s: %(message)s', 
         datefmt='%d-%b-%y %H:%M:%S',
         filename='debug.log',
         level=logging.INFO
     )
-    # readfile(PATH_TO_FILE) # Placeholder data
-    fetch_data(GSM_ARENA_RES, 30) # Dynamic data
+    start = time.perf_counter()
+    try:
+        if args.command == 'crawl':
+            crawl(max_jobs=args.max_jobs)
+        else:
+            # readfile(PATH_TO_FILE) # Placeholder data
+            # readfile_bulk(PATH_TO_FILE) # Placeholder data, in batches
+            fetch_data(GSM_ARENA_RES, 30) # Dynamic data
+            # refresh_data(GSM_ARENA_RES, 30) # Dynamic data, new and changed
+            # fetch_data_concurrent(GSM_ARENA_RES, 30) # Concurrently
+    finally:
+        close_uploader()
+        close_pool()
+        close_http_cache()
+        save_metrics(time.perf_counter() - start)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()